@@ -0,0 +1,41 @@
+"""3.10.1
+
+Revision ID: 7c1d2e9a4b5f
+Revises: 362040f57f17
+Create Date: 2026-10-18 16:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = '7c1d2e9a4b5f'
+down_revision = '362040f57f17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('vadmin_auth_dept', sa.Column('path', sa.String(length=255), nullable=True, comment='层级路径，由根部門至當前部門的 id 组成，如 /1/5/12/'))
+    op.create_index(op.f('ix_vadmin_auth_dept_path'), 'vadmin_auth_dept', ['path'], unique=False)
+    # 根據 parent_id 回填已有部門的层级路径
+    op.execute("""
+        UPDATE vadmin_auth_dept AS d
+        JOIN (
+            WITH RECURSIVE tree (id, path) AS (
+                SELECT id, CAST(CONCAT('/', id, '/') AS CHAR(255))
+                FROM vadmin_auth_dept WHERE parent_id IS NULL
+                UNION ALL
+                SELECT c.id, CONCAT(t.path, c.id, '/')
+                FROM vadmin_auth_dept AS c JOIN tree AS t ON c.parent_id = t.id
+            )
+            SELECT id, path FROM tree
+        ) AS p ON d.id = p.id
+        SET d.path = p.path
+    """)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_vadmin_auth_dept_path'), table_name='vadmin_auth_dept')
+    op.drop_column('vadmin_auth_dept', 'path')
@@ -0,0 +1,25 @@
+"""3.10.1
+
+Revision ID: a3f8e61c2d94
+Revises: 7c1d2e9a4b5f
+Create Date: 2026-10-18 23:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+# revision identifiers, used by Alembic.
+revision = 'a3f8e61c2d94'
+down_revision = '7c1d2e9a4b5f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # 列表頁按 rsn 批量查詢最新的 IT 需求明细
+    op.create_index(op.f('ix_Bpmin_it_detail_rsn'), 'Bpmin_it_detail', ['rsn'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_Bpmin_it_detail_rsn'), table_name='Bpmin_it_detail')
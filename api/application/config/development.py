@@ -45,6 +45,9 @@ else:
     # 設定 SQLAlchemy 連接字串
     SQLALCHEMY_DATABASE_URL = f"mysql+asyncmy://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_SERVER_IP}:{MYSQL_PORT}/{MYSQL_DB}"
 
+# 只讀從庫連接字串，設定後 DalBase 的查詢（get_data、get_datas、get_count）會使用從庫，None 為不啟用
+SQLALCHEMY_REPLICA_DATABASE_URL = None
+
 
 """
 Redis 數據庫配置
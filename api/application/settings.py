@@ -107,14 +107,6 @@ ALLOW_METHODS = ["*"]
 # 允许携带的headers，可以用来鉴别来源等作用。
 ALLOW_HEADERS = ["*"]
 
-"""
-全局事件配置
-"""
-EVENTS = [
-    "core.event.connect_mongo" if MONGO_DB_ENABLE else None,
-    "core.event.connect_redis" if REDIS_DB_ENABLE else None,
-]
-
 """
 其他項目配置
 """
@@ -124,6 +116,24 @@ DEFAULT_PASSWORD = "0"
 DEFAULT_AVATAR = "https://vv-reserve.oss-cn-hangzhou.aliyuncs.com/avatar/2023-01-27/1674820804e81e7631.png"
 # 默认登陆時最大输入密碼或驗證碼錯误次數
 DEFAULT_AUTH_ERROR_MAX_NUMBER = 5
+# 登錄接口限流：每个 IP 在時間窗口内最多請求次數，時間窗口（秒）
+LOGIN_RATE_LIMIT = 30
+LOGIN_RATE_LIMIT_WINDOW = 60
+# 發送短信驗證碼限流：每个帳號在時間窗口内最多發送次數，時間窗口（秒）
+SMS_SEND_RATE_LIMIT = 10
+SMS_SEND_RATE_LIMIT_WINDOW = 3600
+# 系统配置進程内缓存過期時間（秒），配置更新時會通過 Redis 频道立即通知清除
+SETTINGS_CACHE_TTL = 60
+# 本地 IP 段數據庫文件，用于解析登錄 IP 归属地，生成方式见 utils/ip_manage.py
+IP_DATABASE_PATH = os.path.join(BASE_DIR, "static", "ip", "ip_range.dat")
+# IP 归属地進程内缓存最大條目數
+IP_CACHE_MAXSIZE = 10000
+# 密碼 bcrypt 哈希轮數，修改后用户下次登錄時自動按新的轮數重新生成哈希密碼
+PASSWORD_BCRYPT_ROUNDS = 12
+# 密碼哈希与驗證線程池大小，即同時进行的密碼计算數量上限
+PASSWORD_HASH_MAX_WORKERS = 4
+# 密碼计算最大排隊數，超出時直接返回系统繁忙，0 為不限制
+PASSWORD_HASH_MAX_QUEUE = 200
 # 是否开启保存登錄日誌
 LOGIN_LOG_RECORD = True
 # 是否开启保存每次請求日誌到本地
@@ -134,6 +144,51 @@ OPERATION_LOG_RECORD = True
 OPERATION_RECORD_METHOD = ["POST", "PUT", "DELETE"]
 # 忽略的操作接口函數名稱，列表中的函數名稱不會被记錄到操作日誌中
 IGNORE_OPERATION_FUNCTION = ["post_dicts_details"]
+# 操作日誌记錄請求體的最大字节數，超出時只保留前面部分並记錄總大小与 sha256
+OPERATION_RECORD_BODY_LIMIT = 64 * 1024
+# 操作日誌异步批量写入：隊列最大长度
+OPERATION_RECORD_QUEUE_SIZE = 10000
+# 操作日誌异步批量写入：單次写入最大數量
+OPERATION_RECORD_BATCH_SIZE = 200
+# 操作日誌异步批量写入：最长写入間隔（秒）
+OPERATION_RECORD_FLUSH_INTERVAL = 1.0
+# 操作日誌隊列已满時的處理策略：drop_new 丢弃當前记錄，drop_oldest 丢弃最早记錄，block 等待隊列空出位置
+OPERATION_RECORD_OVERFLOW = "drop_oldest"
+# block 策略下最长等待時間（秒），超時后丢弃當前记錄
+OPERATION_RECORD_BLOCK_TIMEOUT = 0.5
+# 外部接口共享 HTTP 连接池：每个主机最大连接數
+HTTP_CLIENT_MAX_CONNECTIONS = 20
+# 外部接口共享 HTTP 连接池：每个主机最大保持空閒的连接數
+HTTP_CLIENT_MAX_KEEPALIVE = 10
+# 外部接口共享 HTTP 连接池：空閒连接保持時間（秒）
+HTTP_CLIENT_KEEPALIVE_EXPIRY = 30
+# 外部接口建立连接超時時間（秒）
+HTTP_CLIENT_CONNECT_TIMEOUT = 5.0
+# 外部接口讀取响应超時時間（秒）
+HTTP_CLIENT_READ_TIMEOUT = 60.0
+# 外部接口請求失敗最大重试次數
+HTTP_CLIENT_RETRIES = 2
+# 外部接口重试退避基準時間（秒），第 n 次重试前随机等待 0 ~ HTTP_CLIENT_BACKOFF * 2^n 秒
+HTTP_CLIENT_BACKOFF = 0.5
+# 是否开启 Prometheus 運行指標（請求耗時、连接池、隊列状態），默认关闭
+METRICS_ENABLE = False
+# 指標抓取路由，此路由不需要認證，只允许 METRICS_ALLOW_IPS 中的地址訪問
+METRICS_PATH = "/metrics"
+# 允许抓取指標的客户端 IP 或网段，如 ["127.0.0.1", "10.0.0.0/8"]，其他来源返回 403
+# 经过反向代理時，客户端地址為代理地址，請同時在反向代理中限制訪問来源
+METRICS_ALLOW_IPS = ["127.0.0.1", "::1"]
+
+"""
+全局事件配置
+"""
+EVENTS = [
+    "core.event.connect_mongo" if MONGO_DB_ENABLE else None,
+    "apps.vadmin.system.event.create_mongo_indexes" if MONGO_DB_ENABLE else None,
+    "core.event.connect_redis" if REDIS_DB_ENABLE else None,
+    "core.event.operation_record_writer" if OPERATION_LOG_RECORD and MONGO_DB_ENABLE else None,
+    "core.event.http_client",
+    "core.event.bpm_client",
+]
 
 """
 中間件配置
@@ -146,11 +201,15 @@ MIDDLEWARES = [
     "core.middleware.register_request_log_middleware" if REQUEST_LOG_RECORD else None,
     "core.middleware.register_operation_record_middleware" if OPERATION_LOG_RECORD and MONGO_DB_ENABLE else None,
     "core.middleware.register_demo_env_middleware" if DEMO else None,
-    "core.middleware.register_jwt_refresh_middleware"
+    "core.middleware.register_jwt_refresh_middleware",
+    "core.middleware.register_metrics_middleware" if METRICS_ENABLE else None,
 ]
 
 """
 定時任務配置
 """
-# 发布/订阅通道，与定時任務程序相互關聯，請勿随意更改
-SUBSCRIBE = 'kinit_queue'
+# 任務调度消息流（Redis Stream）与消费者组，与定時任務程序相互關聯，請勿随意更改
+TASK_STREAM = 'kinit_task_stream'
+TASK_STREAM_GROUP = 'kinit_task_group'
+# 消息流保留的最大消息數（近似值），已确认的历史消息超出后自動裁剪
+TASK_STREAM_MAXLEN = 10000
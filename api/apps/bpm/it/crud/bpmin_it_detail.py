@@ -7,6 +7,7 @@
 # @desc           : 資料存取層
 
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
 from core.crud import DalBase
 from .. import models, schemas
 
@@ -18,3 +19,30 @@ class BpminItDetailDal(DalBase):
         self.db = db
         self.model = models.BpminItDetail
         self.schema = schemas.BpminItDetailSimpleOut
+
+    async def get_latest_by_rsns(self, rsns: list[str]) -> dict[str, dict]:
+        """
+        批量獲取每個參照序號最新的一筆歷程記錄
+        使用 ROW_NUMBER() 窗口函數在同一條 SQL 中取出所有序號的最新記錄，查詢次數與序號數量無關
+        :param rsns: 參照序號列表
+        :return: {rsn: {"create_datetime": ..., "status": ...}}
+        """
+        rsns = list({rsn for rsn in rsns if rsn})
+        if not rsns:
+            return {}
+        row_number = func.row_number().over(
+            partition_by=self.model.rsn,
+            order_by=self.model.create_datetime.desc()
+        ).label("row_number")
+        ranked = select(
+            self.model.rsn,
+            self.model.create_datetime,
+            self.model.status,
+            row_number
+        ).where(self.model.rsn.in_(rsns)).subquery()
+        sql = select(ranked.c.rsn, ranked.c.create_datetime, ranked.c.status).where(ranked.c.row_number == 1)
+        queryset = await self.db.execute(sql)
+        return {
+            row.rsn: {"create_datetime": row.create_datetime, "status": row.status}
+            for row in queryset.all()
+        }
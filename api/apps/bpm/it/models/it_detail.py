@@ -9,7 +9,7 @@ class BpminItDetail(BaseModel):
 
  
     work_desc: Mapped[str | None] = mapped_column(String(500), comment="工作描述")
-    rsn: Mapped[str | None] = mapped_column(String(50), comment="參照序號")
+    rsn: Mapped[str | None] = mapped_column(String(50), index=True, comment="參照序號")
     status: Mapped[str | None] = mapped_column(String(50), comment="狀態")
 
     # Configuration for frontend generation
@@ -10,13 +10,12 @@ from typing import Dict, Any
 from .. import models, schemas, crud
 import re
 from datetime import datetime
-from sqlalchemy import select, desc
+from sqlalchemy import select
 from sqlalchemy.sql.selectable import Select
-from ..models.it_detail import BpminItDetail
 
 # 條件性導入 BPM WSDL 模組
 try:
-    from utils.bpm_wsdl import bpm_wsl
+    from utils.bpm_wsdl import bpm_wsl, BpmClientManager
     # 檢查 zeep 依賴是否可用
     import zeep
     BPM_AVAILABLE = True
@@ -231,23 +230,12 @@ class BpminItServices:
         return result
 
     @classmethod
-    async def _calculate_processing_days(cls, db, serial_number: str, apply_date: str) -> float:
+    def _calculate_processing_days(cls, latest_datetime: Any, apply_date: str) -> float:
         """計算處理天數: 最新歷程記錄的create_datetime - 申請日期apply_date"""
-        if not serial_number or not apply_date:
+        if not latest_datetime or not apply_date:
             return 0.0
         
         try:
-            # 查詢該序號的最新歷程記錄
-            stmt = select(BpminItDetail).where(
-                BpminItDetail.rsn == serial_number
-            ).order_by(desc(BpminItDetail.create_datetime)).limit(1)
-            
-            result = await db.execute(stmt)
-            latest_record = result.scalar_one_or_none()
-            
-            if not latest_record:
-                return 0.0
-            
             # 解析申請日期 (假設格式為 YYYY-MM-DD)
             try:
                 apply_datetime = datetime.strptime(apply_date, '%Y-%m-%d')
@@ -259,47 +247,19 @@ class BpminItServices:
                     return 0.0
             
             # 計算天數差異
-            if latest_record.create_datetime:
-                latest_datetime = latest_record.create_datetime
-                if isinstance(latest_datetime, str):
-                    try:
-                        latest_datetime = datetime.fromisoformat(latest_datetime.replace('Z', '+00:00'))
-                    except ValueError:
-                        return 0.0
-                
-                diff = latest_datetime - apply_datetime
-                return round(diff.total_seconds() / (24 * 60 * 60), 1)  # 轉換為天數，保留1位小數
+            if isinstance(latest_datetime, str):
+                try:
+                    latest_datetime = datetime.fromisoformat(latest_datetime.replace('Z', '+00:00'))
+                except ValueError:
+                    return 0.0
             
-            return 0.0
+            diff = latest_datetime - apply_datetime
+            return round(diff.total_seconds() / (24 * 60 * 60), 1)  # 轉換為天數，保留1位小數
             
         except Exception as e:
             print(f"計算處理天數時發生錯誤: {str(e)}")
             return 0.0
 
-    @classmethod
-    async def _get_latest_processing_status(cls, db, serial_number: str) -> str:
-        """獲取最新處理歷程狀態"""
-        if not serial_number:
-            return None
-        
-        try:
-            # 查詢該序號的最新歷程記錄
-            stmt = select(BpminItDetail).where(
-                BpminItDetail.rsn == serial_number
-            ).order_by(desc(BpminItDetail.create_datetime)).limit(1)
-            
-            result = await db.execute(stmt)
-            latest_record = result.scalar_one_or_none()
-            
-            if latest_record and latest_record.status:
-                return latest_record.status
-            
-            return None
-            
-        except Exception as e:
-            print(f"獲取最新處理狀態時發生錯誤: {str(e)}")
-            return None
-
     @classmethod
     def _calculate_elapsed_days(cls, apply_date: str) -> float:
         """計算經過天數: 當前時間 - 申請日期apply_date"""
@@ -447,7 +407,7 @@ class BpminItServices:
         """接受 IT 服務需求工作項目"""
         try:
             client = cls._get_bpm_client()
-            success, result = client.acceptWorkItem(work_item_oid, user_id)
+            success, result = await BpmClientManager.run(client.acceptWorkItem, work_item_oid, user_id)
             return cls._format_bmp_response(success, result, 'acceptWorkItem', 
                                           None if success else result)
         except Exception as e:
@@ -458,7 +418,7 @@ class BpminItServices:
         """取得 IT 服務需求待辦工作項目"""
         try:
             client = cls._get_bpm_client()
-            success, result = client.fetchToDoWorkItem(user_id, process_ids)
+            success, result = await BpmClientManager.run(client.fetchToDoWorkItem, user_id, process_ids)
             return cls._format_bmp_response(success, result, 'fetchToDoWorkItem',
                                           None if success else result)
         except Exception as e:
@@ -469,7 +429,7 @@ class BpminItServices:
         """檢查 IT 服務需求工作項目狀態"""
         try:
             client = cls._get_bpm_client()
-            success, result = client.checkWorkItemState(work_item_oid)
+            success, result = await BpmClientManager.run(client.checkWorkItemState, work_item_oid)
             return cls._format_bmp_response(success, result, 'checkWorkItemState',
                                           None if success else result)
         except Exception as e:
@@ -480,7 +440,7 @@ class BpminItServices:
         """完成 IT 服務需求工作項目"""
         try:
             client = cls._get_bpm_client()
-            success, result = client.completeWorkItem(work_item_oid, user_id, comment)
+            success, result = await BpmClientManager.run(client.completeWorkItem, work_item_oid, user_id, comment)
             return cls._format_bmp_response(success, result, 'completeWorkItem',
                                           None if success else result)
         except Exception as e:
@@ -491,7 +451,7 @@ class BpminItServices:
         """取得 IT 服務需求完整表單資料"""
         try:
             client = cls._get_bpm_client()
-            success, result = client.get_all_xml_form(serial_no)
+            success, result = await BpmClientManager.run(client.get_all_xml_form, serial_no)
             return cls._format_bmp_response(success, result, 'get_all_xml_form',
                                           None if success else result)
         except Exception as e:
@@ -502,7 +462,7 @@ class BpminItServices:
         """取得 IT 服務需求簡單表單資料"""
         try:
             client = cls._get_bpm_client()
-            success, result = client.fetchProcInstanceWithSerialNo(serial_no)
+            success, result = await BpmClientManager.run(client.fetchProcInstanceWithSerialNo, serial_no)
             return cls._format_bmp_response(success, result, 'fetchProcInstanceWithSerialNo',
                                           None if success else result)
         except Exception as e:
@@ -514,8 +474,9 @@ class BpminItServices:
         """IT 服務需求取回重辦"""
         try:
             client = cls._get_bpm_client()
-            success, result = client.reexecuteActivity(process_serial_no, reexecute_activity_id, 
-                                                     ask_reexecute_user_id, reexecute_comment)
+            success, result = await BpmClientManager.run(client.reexecuteActivity, process_serial_no,
+                                                         reexecute_activity_id, ask_reexecute_user_id,
+                                                         reexecute_comment)
             return cls._format_bmp_response(success, result, 'reexecuteActivity',
                                           None if success else result)
         except Exception as e:
@@ -526,7 +487,7 @@ class BpminItServices:
         """取得所有 WSDL 功能列表"""
         try:
             client = cls._get_bpm_client()
-            result = client.get_wsdl_fun_list()
+            result = await BpmClientManager.run(client.get_wsdl_fun_list)
             return cls._format_bmp_response(True, result, 'get_wsdl_fun_list')
         except Exception as e:
             return cls._format_bmp_response(False, None, 'get_wsdl_fun_list', str(e))
@@ -727,41 +688,27 @@ class BpminItServices:
             
             # 處理列表中每個項目的 apply_item、treatment 顯示值和計算處理天數、經過天數、獲取最新處理狀態
             if datas:
-                # 先計算處理天數、經過天數和獲取最新處理狀態
-                if isinstance(datas, list):
-                    for item in datas:
-                        if isinstance(item, dict) and 'serial_number' in item and 'apply_date' in item:
-                            # 計算處理天數（最新歷程記錄時間 - 申請日期）
-                            processing_days = await cls._calculate_processing_days(
-                                db, item['serial_number'], item['apply_date']
-                            )
-                            item['datediff'] = processing_days
-                            
-                            # 計算經過天數（當前時間 - 申請日期）
-                            elapsed_days = cls._calculate_elapsed_days(item['apply_date'])
-                            item['elapsed_days'] = elapsed_days
-                            
-                            # 獲取最新處理狀態
-                            latest_status = await cls._get_latest_processing_status(
-                                db, item['serial_number']
-                            )
-                            item['latest_processing_status'] = latest_status
-                elif isinstance(datas, dict) and 'serial_number' in datas and 'apply_date' in datas:
+                items = datas if isinstance(datas, list) else [datas]
+                items = [
+                    item for item in items
+                    if isinstance(item, dict) and 'serial_number' in item and 'apply_date' in item
+                ]
+                # 一次查詢出當前頁所有序號的最新歷程記錄，避免每筆資料各查詢兩次
+                latest_details = await crud.BpminItDetailDal(db).get_latest_by_rsns(
+                    [item['serial_number'] for item in items]
+                )
+                for item in items:
+                    latest = latest_details.get(item['serial_number'])
                     # 計算處理天數（最新歷程記錄時間 - 申請日期）
-                    processing_days = await cls._calculate_processing_days(
-                        db, datas['serial_number'], datas['apply_date']
+                    item['datediff'] = cls._calculate_processing_days(
+                        latest['create_datetime'] if latest else None, item['apply_date']
                     )
-                    datas['datediff'] = processing_days
                     
                     # 計算經過天數（當前時間 - 申請日期）
-                    elapsed_days = cls._calculate_elapsed_days(datas['apply_date'])
-                    datas['elapsed_days'] = elapsed_days
+                    item['elapsed_days'] = cls._calculate_elapsed_days(item['apply_date'])
                     
                     # 獲取最新處理狀態
-                    latest_status = await cls._get_latest_processing_status(
-                        db, datas['serial_number']
-                    )
-                    datas['latest_processing_status'] = latest_status
+                    item['latest_processing_status'] = latest['status'] if latest and latest['status'] else None
                 
                 # 然後處理顯示值
                 datas = cls._process_data_for_output(datas)
@@ -6,7 +6,7 @@
 # @IDE            : PyCharm
 # @desc           : IT 服務需求單視圖層
 from apps.vadmin.auth.utils.current import OpenAuth, AllUserAuth
-from core.database import db_getter
+from core.database import db_read_getter
 from fastapi import Depends, Query, APIRouter, Form
 from sqlalchemy.ext.asyncio import AsyncSession
 from apps.vadmin.auth.utils.validation.auth import Auth
@@ -146,7 +146,7 @@ async def update_case_close_status(
 
 
 @app.get("/it/{data_id}", summary="獲取 IT 服務需求單信息")
-async def get_bpmin_it(data_id: int, db: AsyncSession = Depends(db_getter)):
+async def get_bpmin_it(data_id: int, db: AsyncSession = Depends(db_read_getter)):
     try:
         result = await services.BpminItServices.get_bpmin_it(db, data_id)
         if result['success']:
@@ -356,7 +356,7 @@ async def put_bpmin_it_detail(data_id: int, data: schemas.BpminItDetail, auth: A
 
 
 @app.get("/detail/{data_id}", summary="獲取資訊需求單歷程信息")
-async def get_bpmin_it_detail(data_id: int, db: AsyncSession = Depends(db_getter)):
+async def get_bpmin_it_detail(data_id: int, db: AsyncSession = Depends(db_read_getter)):
     try:
         result = await services.BpminItDetailServices.get_bpmin_it_detail(db, data_id)
         if result['success']:
@@ -6,16 +6,17 @@
 # @IDE            : PyCharm
 # @desc           : 增删改查
 
-from typing import Any
+from typing import Any, Iterable
 from redis.asyncio import Redis
 from fastapi import UploadFile
 from sqlalchemy.exc import StatementError
-from sqlalchemy.orm import joinedload, aliased
+from sqlalchemy.orm import joinedload, aliased, selectinload
 from sqlalchemy.orm.strategy_options import _AbstractLoad, contains_eager
 from core.exception import CustomException
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import select, false, and_
+from sqlalchemy import select, false, and_, or_, update, func
 from core.crud import DalBase
+from core.logger import logger
 from sqlalchemy.ext.asyncio import AsyncSession
 from core.validator import vali_telephone
 from utils.file.aliyun_oss import AliyunOSS, BucketConf
@@ -27,12 +28,14 @@ from .params import UserParams
 from utils.tools import test_password, generate_string
 from . import models, schemas
 from application import settings
-from utils.excel.excel_manage import ExcelManage
 from apps.vadmin.system import crud as vadmin_system_crud
 from apps.vadmin.help import models as vadmin_help_models
 import copy
 from utils import status
 from utils.wx.oauth import WXOAuth
+from utils.principal_cache import PrincipalCache
+from utils.tree import TreeBuilder
+from utils.password import PasswordHasher
 from datetime import datetime
 
 
@@ -51,33 +54,6 @@ class UserDal(DalBase):
         self.model = models.VadminUser
         self.schema = schemas.UserSimpleOut
 
-    async def recursion_get_dept_ids(
-            self,
-            user: models.VadminUser,
-            depts: list[models.VadminDept] = None,
-            dept_ids: list[int] = None
-    ) -> list:
-        """
-        递归獲取所有關聯部門 id
-        :param user:
-        :param depts: 所有部門实例
-        :param dept_ids: 父级部門 id 列表
-        :return:
-        """
-        if not depts:
-            depts = await DeptDal(self.db).get_datas(limit=0, v_return_objs=True)
-            result = []
-            for i in user.depts:
-                result.append(i.id)
-            result.extend(await self.recursion_get_dept_ids(user, depts, result))
-            return list(set(result))
-        elif dept_ids:
-            result = [i.id for i in filter(lambda item: item.parent_id in dept_ids, depts)]
-            result.extend(await self.recursion_get_dept_ids(user, depts, result))
-            return result
-        else:
-            return []
-
     async def update_login_info(self, user: models.VadminUser, last_ip: str) -> None:
         """
         更新當前登錄信息
@@ -88,13 +64,15 @@ class UserDal(DalBase):
         user.last_ip = last_ip
         user.last_login = datetime.now()
         await self.db.flush()
+        PrincipalCache.bump_user_on_commit(self.db, user.id)
 
     async def create_data(
             self,
             data: schemas.UserIn,
             v_options: list[_AbstractLoad] = None,
             v_return_obj: bool = False,
-            v_schema: Any = None
+            v_schema: Any = None,
+            v_password_hash: str = None
     ) -> Any:
         """
         創建用户
@@ -102,13 +80,15 @@ class UserDal(DalBase):
         :param v_options:
         :param v_return_obj:
         :param v_schema:
+        :param v_password_hash: 已生成的默认哈希密碼，批量導入時预先并行生成
         :return:
         """
         unique = await self.get_data(telephone=data.telephone, v_return_none=True)
         if unique:
             raise CustomException("帳號已存在！", code=status.HTTP_ERROR)
-        password = data.telephone if settings.DEFAULT_PASSWORD == "0" else settings.DEFAULT_PASSWORD
-        data.password = self.model.get_password_hash(password)
+        if v_password_hash is None:
+            v_password_hash = await PasswordHasher.hash(self.get_default_password(data.telephone))
+        data.password = v_password_hash
         data.avatar = data.avatar if data.avatar else settings.DEFAULT_AVATAR
         obj = self.model(**data.model_dump(exclude={'role_ids', "dept_ids"}))
         if data.role_ids:
@@ -122,6 +102,15 @@ class UserDal(DalBase):
         await self.flush(obj)
         return await self.out_dict(obj, v_options, v_return_obj, v_schema)
 
+    @staticmethod
+    def get_default_password(telephone: str) -> str:
+        """
+        獲取用户默认密碼
+        :param telephone:
+        :return:
+        """
+        return telephone if settings.DEFAULT_PASSWORD == "0" else settings.DEFAULT_PASSWORD
+
     async def put_data(
             self,
             data_id: int,
@@ -160,6 +149,7 @@ class UserDal(DalBase):
                 continue
             setattr(obj, key, value)
         await self.flush(obj)
+        PrincipalCache.bump_user_on_commit(self.db, obj.id)
         return await self.out_dict(obj, None, v_return_obj, v_schema)
 
     async def reset_current_password(self, user: models.VadminUser, data: schemas.ResetPwd) -> None:
@@ -174,9 +164,10 @@ class UserDal(DalBase):
         result = test_password(data.password)
         if isinstance(result, str):
             raise CustomException(msg=result, code=400)
-        user.password = self.model.get_password_hash(data.password)
+        user.password = await PasswordHasher.hash(data.password)
         user.is_reset_password = True
         await self.flush(user)
+        PrincipalCache.bump_user_on_commit(self.db, user.id)
 
     async def update_current_info(self, user: models.VadminUser, data: schemas.UserUpdateBaseInfo) -> Any:
         """
@@ -195,28 +186,24 @@ class UserDal(DalBase):
         user.nickname = data.nickname
         user.gender = data.gender
         await self.flush(user)
+        PrincipalCache.bump_user_on_commit(self.db, user.id)
         return await self.out_dict(user)
 
     async def export_query_list(self, header: list, params: UserParams) -> dict:
         """
         导出用户查詢列表為 excel
+        按游標分批讀取並以常量内存模式写入，内存占用与导出行數無關
         :param header:
         :param params:
         :return:
         """
-        datas = await self.get_datas(
-            **params.dict(),
-            v_return_objs=True,
-            v_options=[joinedload(self.model.depts), joinedload(self.model.roles)]
-        )
-        # 獲取表头
-        row = list(map(lambda i: i.get("label"), header))
-        rows = []
         options = await self.get_export_headers_options()
-        for user in datas:
+        gender_labels = {i["value"]: i["label"] for i in options["gender_options"]}
+        fields = [item.get("field") for item in header]
+
+        def converter(user: models.VadminUser) -> list:
             data = []
-            for item in header:
-                field = item.get("field")
+            for field in fields:
                 # 通過反射獲取對应的属性值
                 value = getattr(user, field, "")
                 if field == "is_active":
@@ -224,20 +211,25 @@ class UserDal(DalBase):
                 elif field == "is_staff":
                     value = "是" if value else "否"
                 elif field == "gender":
-                    result = list(filter(lambda i: i["value"] == value, options["gender_options"]))
-                    value = result[0]["label"] if result else ""
+                    value = gender_labels.get(value, "")
                 elif field == "roles":
                     value = ",".join([i.name for i in value])
                 elif field == "depts":
                     value = ",".join([i.name for i in value])
                 data.append(value)
-            rows.append(data)
-        em = ExcelManage()
-        em.create_excel("用户列表")
-        em.write_list(rows, row)
-        remote_file_url = em.save_excel().get("remote_path")
-        em.close()
-        return {"url": remote_file_url, "filename": "用户列表.xlsx"}
+            return data
+
+        chunks = self.stream_datas(
+            **params.dict(),
+            v_options=[selectinload(self.model.depts), selectinload(self.model.roles)]
+        )
+        em = WriteXlsx()
+        em.create_excel(sheet_name="用户列表", save_static=True, constant_memory=True)
+        try:
+            await em.write_stream([item.get("label") for item in header], chunks, converter)
+        finally:
+            em.close()
+        return {"url": em.get_file_url(), "filename": "用户列表.xlsx"}
 
     async def get_export_headers_options(self, include: list[str] = None) -> dict[str, list]:
         """
@@ -294,11 +286,17 @@ class UserDal(DalBase):
         im = ImportManage(file, copy.deepcopy(self.import_headers))
         await im.get_table_data()
         im.check_table_data()
+        rows = []
         for item in im.success:
             old_data_list = item.pop("old_data_list")
-            data = schemas.UserIn(**item)
+            rows.append((old_data_list, schemas.UserIn(**item)))
+        # 密碼哈希耗時较长，预先在線程池中并行生成
+        password_hashes = await PasswordHasher.hash_many(
+            [self.get_default_password(data.telephone) for _, data in rows]
+        )
+        for (old_data_list, data), password_hash in zip(rows, password_hashes):
             try:
-                await self.create_data(data)
+                await self.create_data(data, v_password_hash=password_hash)
             except ValueError as e:
                 old_data_list.append(e.__str__())
                 im.add_error_data(old_data_list)
@@ -319,18 +317,20 @@ class UserDal(DalBase):
         :return:
         """
         users = await self.get_datas(limit=0, id=("in", ids), v_return_objs=True)
+        passwords = [generate_string(6) for _ in users]
+        password_hashes = await PasswordHasher.hash_many(passwords)
         result = []
-        for user in users:
+        for user, password, password_hash in zip(users, passwords, password_hashes):
             # 重置密碼
             data = {"id": user.id, "telephone": user.telephone, "name": user.name, "email": user.email}
-            password = generate_string(6)
-            user.password = self.model.get_password_hash(password)
+            user.password = password_hash
             user.is_reset_password = False
             self.db.add(user)
             data["reset_password_status"] = True
             data["password"] = password
             result.append(data)
         await self.db.flush()
+        PrincipalCache.bump_user_on_commit(self.db, *[i["id"] for i in result])
         return result
 
     async def init_password_send_sms(self, ids: list[int], rd: Redis) -> list:
@@ -400,6 +400,7 @@ class UserDal(DalBase):
         result = await AliyunOSS(BucketConf(**settings.ALIYUN_OSS)).upload_image("avatar", file)
         user.avatar = result
         await self.flush(user)
+        PrincipalCache.bump_user_on_commit(self.db, user.id)
         return result
 
     async def update_wx_server_openid(self, code: str, user: models.VadminUser, redis: Redis) -> bool:
@@ -417,6 +418,7 @@ class UserDal(DalBase):
         user.is_wx_server_openid = True
         user.wx_server_openid = openid
         await self.flush(user)
+        PrincipalCache.bump_user_on_commit(self.db, user.id)
         return True
 
     async def delete_datas(self, ids: list[int], v_soft: bool = False, **kwargs) -> None:
@@ -432,7 +434,8 @@ class UserDal(DalBase):
         for obj in objs:
             if obj.roles:
                 obj.roles.clear()
-        return await super(UserDal, self).delete_datas(ids, v_soft, **kwargs)
+        await super(UserDal, self).delete_datas(ids, v_soft, **kwargs)
+        PrincipalCache.bump_user_on_commit(self.db, *ids)
 
 
 class RoleDal(DalBase):
@@ -508,6 +511,7 @@ class RoleDal(DalBase):
                 continue
             setattr(obj, key, value)
         await self.flush(obj)
+        PrincipalCache.bump_global_on_commit(self.db)
         return await self.out_dict(obj, None, v_return_obj, v_schema)
 
     async def get_role_menu_tree(self, role_id: int) -> list:
@@ -534,7 +538,8 @@ class RoleDal(DalBase):
         user_count = await UserDal(self.db).get_count(v_join=[["roles"]], v_where=[models.VadminRole.id.in_(ids)])
         if user_count > 0:
             raise CustomException("無法刪除存在用户關聯的角色", code=400)
-        return await super(RoleDal, self).delete_datas(ids, v_soft, **kwargs)
+        await super(RoleDal, self).delete_datas(ids, v_soft, **kwargs)
+        PrincipalCache.bump_global_on_commit(self.db)
 
 
 class MenuDal(DalBase):
@@ -545,6 +550,27 @@ class MenuDal(DalBase):
         self.model = models.VadminMenu
         self.schema = schemas.MenuSimpleOut
 
+    async def put_data(
+            self,
+            data_id: int,
+            data: Any,
+            v_options: list[_AbstractLoad] = None,
+            v_return_obj: bool = False,
+            v_schema: Any = None
+    ) -> Any:
+        """
+        更新選單，選單權限標識或禁用状態变更后需要刷新認證主體缓存
+        :param data_id:
+        :param data:
+        :param v_options:
+        :param v_return_obj:
+        :param v_schema:
+        :return:
+        """
+        result = await super(MenuDal, self).put_data(data_id, data, v_options, v_return_obj, v_schema)
+        PrincipalCache.bump_global_on_commit(self.db)
+        return result
+
     async def get_tree_list(self, mode: int) -> list:
         """
         1：獲取選單树列表
@@ -559,14 +585,12 @@ class MenuDal(DalBase):
             sql = select(self.model).where(self.model.is_delete == false())
         queryset = await self.db.scalars(sql)
         datas = list(queryset.all())
-        roots = filter(lambda i: not i.parent_id, datas)
         if mode == 1:
-            menus = self.generate_tree_list(datas, roots)
+            return self.generate_tree_list(datas)
         elif mode == 2 or mode == 3:
-            menus = self.generate_tree_options(datas, roots)
+            return self.generate_tree_options(datas)
         else:
             raise CustomException("獲取選單失敗，無可用選項", code=400)
-        return self.menus_order(menus)
 
     async def get_routers(self, user: models.VadminUser) -> list:
         """
@@ -596,81 +620,54 @@ class MenuDal(DalBase):
                     # 該路由没有被禁用，並且選單不是按钮
                     if not menu.disabled and menu.menu_type != "2":
                         datas.add(menu)
-        roots = filter(lambda i: not i.parent_id, datas)
-        menus = self.generate_router_tree(datas, roots)
-        return self.menus_order(menus)
+        return self.generate_router_tree(datas)
 
-    def generate_router_tree(self, menus: list[models.VadminMenu], nodes: filter, name: str = "") -> list:
+    @staticmethod
+    def generate_router_tree(menus: Iterable[models.VadminMenu]) -> list:
         """
-        生成路由树
+        生成路由树，每一层均按 order 排序
         :param menus: 总選單列表
-        :param nodes: 节点選單列表
-        :param name: name拼接，切记Name不能重复
         :return:
         """
-        data = []
-        for root in nodes:
-            router = schemas.RouterOut.model_validate(root)
-            router.name = name + "".join(name.capitalize() for name in router.path.split("/"))
+        def factory(menu: models.VadminMenu, parent: dict | None) -> dict:
+            router = schemas.RouterOut.model_validate(menu)
+            # name拼接，切记Name不能重复
+            name = parent["name"] if parent else ""
+            router.name = name + "".join(i.capitalize() for i in router.path.split("/"))
             router.meta = schemas.Meta(
-                title=root.title,
-                icon=root.icon,
-                hidden=root.hidden,
-                alwaysShow=root.alwaysShow,
-                noCache=root.noCache
+                title=menu.title,
+                icon=menu.icon,
+                hidden=menu.hidden,
+                alwaysShow=menu.alwaysShow,
+                noCache=menu.noCache
             )
-            if root.menu_type == "0":
-                sons = filter(lambda i: i.parent_id == root.id, menus)
-                router.children = self.generate_router_tree(menus, sons, router.name)
-            data.append(router.model_dump())
-        return data
+            return router.model_dump()
 
-    def generate_tree_list(self, menus: list[models.VadminMenu], nodes: filter) -> list:
+        return TreeBuilder(menus).build(factory, expand=lambda i: i.menu_type == "0")
+
+    @staticmethod
+    def generate_tree_list(menus: Iterable[models.VadminMenu]) -> list:
         """
-        生成選單树列表
+        生成選單树列表，每一层均按 order 排序
         :param menus: 总選單列表
-        :param nodes: 每层节点選單列表
         :return:
         """
-        data = []
-        for root in nodes:
-            router = schemas.MenuTreeListOut.model_validate(root)
-            if root.menu_type == "0" or root.menu_type == "1":
-                sons = filter(lambda i: i.parent_id == root.id, menus)
-                router.children = self.generate_tree_list(menus, sons)
-            data.append(router.model_dump())
-        return data
+        return TreeBuilder(menus).build(
+            lambda menu, parent: schemas.MenuTreeListOut.model_validate(menu).model_dump(),
+            expand=lambda i: i.menu_type == "0" or i.menu_type == "1"
+        )
 
-    def generate_tree_options(self, menus: list[models.VadminMenu], nodes: filter) -> list:
-        """
-        生成選單树選擇項
-        :param menus:总選單列表
-        :param nodes:每层节点選單列表
-        :return:
+    @staticmethod
+    def generate_tree_options(menus: Iterable[models.VadminMenu]) -> list:
         """
-        data = []
-        for root in nodes:
-            router = {"value": root.id, "label": root.title, "order": root.order}
-            if root.menu_type == "0" or root.menu_type == "1":
-                sons = filter(lambda i: i.parent_id == root.id, menus)
-                router["children"] = self.generate_tree_options(menus, sons)
-            data.append(router)
-        return data
-
-    @classmethod
-    def menus_order(cls, datas: list, order: str = "order", children: str = "children") -> list:
-        """
-        選單排序
-        :param datas:
-        :param order:
-        :param children:
+        生成選單树選擇項，每一层均按 order 排序
+        :param menus: 总選單列表
         :return:
         """
-        result = sorted(datas, key=lambda menu: menu[order])
-        for item in result:
-            if item[children]:
-                item[children] = sorted(item[children], key=lambda menu: menu[order])
-        return result
+        return TreeBuilder(menus).build(
+            lambda menu, parent: {"value": menu.id, "label": menu.title, "order": menu.order},
+            expand=lambda i: i.menu_type == "0" or i.menu_type == "1"
+        )
 
     async def delete_datas(self, ids: list[int], v_soft: bool = False, **kwargs) -> None:
         """
@@ -685,6 +682,7 @@ class MenuDal(DalBase):
         if count > 0:
             raise CustomException("無法刪除存在角色關聯的選單", code=400)
         await super(MenuDal, self).delete_datas(ids, v_soft, **kwargs)
+        PrincipalCache.bump_global_on_commit(self.db)
 
 
 class DeptDal(DalBase):
@@ -695,6 +693,155 @@ class DeptDal(DalBase):
         self.model = models.VadminDept
         self.schema = schemas.DeptSimpleOut
 
+    async def create_data(
+            self,
+            data: Any,
+            v_options: list[_AbstractLoad] = None,
+            v_return_obj: bool = False,
+            v_schema: Any = None
+    ) -> Any:
+        """
+        創建部門，部門层级变更會影响用户數據范围，需要刷新認證主體缓存
+        :param data:
+        :param v_options:
+        :param v_return_obj:
+        :param v_schema:
+        :return:
+        """
+        if isinstance(data, dict):
+            obj = self.model(**data)
+        else:
+            obj = self.model(**data.model_dump())
+        await self.flush(obj)
+        obj.path = f"{await self.get_parent_path(obj.parent_id)}{obj.id}/"
+        await self.flush(obj)
+        PrincipalCache.bump_global_on_commit(self.db)
+        return await self.out_dict(obj, v_options, v_return_obj, v_schema)
+
+    async def put_data(
+            self,
+            data_id: int,
+            data: Any,
+            v_options: list[_AbstractLoad] = None,
+            v_return_obj: bool = False,
+            v_schema: Any = None
+    ) -> Any:
+        """
+        更新部門，上级部門变更時同步更新當前部門及所有下级部門的层级路径
+        :param data_id:
+        :param data:
+        :param v_options:
+        :param v_return_obj:
+        :param v_schema:
+        :return:
+        """
+        obj = await self.get_data(data_id, v_return_none=True)
+        parent_id = obj.parent_id if obj else None
+        result = await super(DeptDal, self).put_data(data_id, data, v_options, v_return_obj, v_schema)
+        if obj and obj.parent_id != parent_id:
+            await self.move_path(obj)
+        PrincipalCache.bump_global_on_commit(self.db)
+        return result
+
+    async def delete_datas(self, ids: list[int], v_soft: bool = False, **kwargs) -> None:
+        """
+        刪除多个部門
+        :param ids: 數據集
+        :param v_soft: 是否执行软刪除
+        :param kwargs: 其他更新字段
+        :return:
+        """
+        await super(DeptDal, self).delete_datas(ids, v_soft, **kwargs)
+        PrincipalCache.bump_global_on_commit(self.db)
+
+    async def get_parent_path(self, parent_id: int | None) -> str:
+        """
+        獲取上级部門的层级路径，没有上级部門時為 /
+        :param parent_id:
+        :return:
+        """
+        if not parent_id:
+            return "/"
+        sql = select(self.model.path).where(self.model.id == parent_id)
+        path = await self.db.scalar(sql)
+        if path is None and await self.fill_missing_paths():
+            path = await self.db.scalar(sql)
+        if path is None:
+            raise CustomException("上级部門不存在", code=400)
+        return path
+
+    async def move_path(self, obj: models.VadminDept) -> None:
+        """
+        部門移動到新的上级部門后，使用一条 UPDATE 替换其自身及所有下级部門层级路径的前缀
+        :param obj: 已更新 parent_id 的部門实例
+        :return:
+        """
+        old_path = obj.path
+        new_path = f"{await self.get_parent_path(obj.parent_id)}{obj.id}/"
+        if old_path is None:
+            await self.rebuild_paths()
+            return
+        if new_path.startswith(old_path):
+            raise CustomException("不能将部門移動到自身或其下级部門下", code=400)
+        sql = update(self.model).where(self.model.path.like(f"{old_path}%")).values(
+            path=func.concat(new_path, func.substr(self.model.path, len(old_path) + 1))
+        ).execution_options(synchronize_session="fetch")
+        await self.db.execute(sql)
+        await self.flush()
+
+    async def rebuild_paths(self) -> None:
+        """
+        根據 parent_id 重新生成所有部門的层级路径，用于初始化數據或修复历史數據
+        :return:
+        """
+        parents = dict((await self.db.execute(select(self.model.id, self.model.parent_id))).all())
+        paths = {}
+
+        def get_path(dept_id: int) -> str:
+            if dept_id not in paths:
+                parent_id = parents.get(dept_id)
+                paths[dept_id] = f"{get_path(parent_id) if parent_id in parents else '/'}{dept_id}/"
+            return paths[dept_id]
+
+        datas = [{"id": dept_id, "path": get_path(dept_id)} for dept_id in parents]
+        if datas:
+            await self.db.execute(update(self.model), datas)
+        await self.flush()
+        PrincipalCache.bump_global_on_commit(self.db)
+
+    async def fill_missing_paths(self) -> bool:
+        """
+        存在层级路径為空的部門時重新生成所有部門的层级路径
+        生產环境通過 autogenerate 迁移新增 path 字段后，已有部門的层级路径為空，在首次使用時自動补全
+        :return: 是否执行了补全
+        """
+        sql = select(self.model.id).where(self.model.path.is_(None)).limit(1)
+        if await self.db.scalar(sql) is None:
+            return False
+        logger.warning("存在层级路径為空的部門，根據上级部門重新生成所有部門的层级路径")
+        await self.rebuild_paths()
+        return True
+
+    async def get_descendant_ids(self, depts: Iterable[models.VadminDept]) -> list[int]:
+        """
+        獲取部門及其所有下级部門 id，通過层级路径前缀匹配，只需一次索引查詢
+        :param depts: 部門实例
+        :return:
+        """
+        depts = list(depts)
+        result = {i.id for i in depts}
+        paths = [i.path for i in depts]
+        if not all(paths) and await self.fill_missing_paths():
+            paths = list(await self.db.scalars(select(self.model.path).where(self.model.id.in_(result))))
+        paths = [path for path in paths if path]
+        if paths:
+            sql = select(self.model.id).where(
+                or_(*[self.model.path.like(f"{path}%") for path in paths]),
+                self.model.is_delete == false()
+            )
+            result.update(await self.db.scalars(sql))
+        return list(result)
+
     async def get_tree_list(self, mode: int) -> list:
         """
         1：獲取部門树列表
@@ -709,59 +856,34 @@ class DeptDal(DalBase):
             sql = select(self.model).where(self.model.is_delete == false())
         queryset = await self.db.scalars(sql)
         datas = list(queryset.all())
-        roots = filter(lambda i: not i.parent_id, datas)
         if mode == 1:
-            menus = self.generate_tree_list(datas, roots)
+            return self.generate_tree_list(datas)
         elif mode == 2 or mode == 3:
-            menus = self.generate_tree_options(datas, roots)
+            return self.generate_tree_options(datas)
         else:
             raise CustomException("獲取部門失敗，無可用選項", code=400)
-        return self.dept_order(menus)
 
-    def generate_tree_list(self, depts: list[models.VadminDept], nodes: filter) -> list:
+    @staticmethod
+    def generate_tree_list(depts: Iterable[models.VadminDept]) -> list:
         """
-        生成部門树列表
+        生成部門树列表，每一层均按 order 排序
         :param depts: 总部門列表
-        :param nodes: 每层节点部門列表
         :return:
         """
-        data = []
-        for root in nodes:
-            router = schemas.DeptTreeListOut.model_validate(root)
-            sons = filter(lambda i: i.parent_id == root.id, depts)
-            router.children = self.generate_tree_list(depts, sons)
-            data.append(router.model_dump())
-        return data
+        return TreeBuilder(depts).build(
+            lambda dept, parent: schemas.DeptTreeListOut.model_validate(dept).model_dump()
+        )
 
-    def generate_tree_options(self, depts: list[models.VadminDept], nodes: filter) -> list:
+    @staticmethod
+    def generate_tree_options(depts: Iterable[models.VadminDept]) -> list:
         """
-        生成部門树選擇項
+        生成部門树選擇項，每一层均按 order 排序
         :param depts: 总部門列表
-        :param nodes: 每层节点部門列表
         :return:
         """
-        data = []
-        for root in nodes:
-            router = {"value": root.id, "label": root.name, "order": root.order}
-            sons = filter(lambda i: i.parent_id == root.id, depts)
-            router["children"] = self.generate_tree_options(depts, sons)
-            data.append(router)
-        return data
-
-    @classmethod
-    def dept_order(cls, datas: list, order: str = "order", children: str = "children") -> list:
-        """
-        部門排序
-        :param datas:
-        :param order:
-        :param children:
-        :return:
-        """
-        result = sorted(datas, key=lambda dept: dept[order])
-        for item in result:
-            if item[children]:
-                item[children] = sorted(item[children], key=lambda dept: dept[order])
-        return result
+        return TreeBuilder(depts).build(
+            lambda dept, parent: {"value": dept.id, "label": dept.name, "order": dept.order}
+        )
 
 
 class TestDal(DalBase):
@@ -29,3 +29,8 @@ class VadminDept(BaseModel):
         ForeignKey("vadmin_auth_dept.id", ondelete='CASCADE'),
         comment="上级部門"
     )
+    path: Mapped[str | None] = mapped_column(
+        String(255),
+        index=True,
+        comment="层级路径，由根部門至當前部門的 id 组成，如 /1/5/12/"
+    )
@@ -10,13 +10,11 @@ from datetime import datetime
 from sqlalchemy.orm import relationship, Mapped, mapped_column
 from db.db_base import BaseModel
 from sqlalchemy import String, Boolean, DateTime
-from passlib.context import CryptContext
+from utils.password import pwd_context
 from .role import VadminRole
 from .dept import VadminDept
 from .m2m import vadmin_auth_user_roles, vadmin_auth_user_depts
 
-pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto')
-
 
 class VadminUser(BaseModel):
     __tablename__ = "vadmin_auth_user"
@@ -47,7 +45,7 @@ class VadminUser(BaseModel):
     @staticmethod
     def get_password_hash(password: str) -> str:
         """
-        生成哈希密碼
+        生成哈希密碼，同步执行，异步代码中請使用 utils.password.PasswordHasher
         :param password: 原始密碼
         :return: 哈希密碼
         """
@@ -56,7 +54,7 @@ class VadminUser(BaseModel):
     @staticmethod
     def verify_password(password: str, hashed_password: str) -> bool:
         """
-        驗證原始密碼是否与哈希密碼一致
+        驗證原始密碼是否与哈希密碼一致，同步执行，异步代码中請使用 utils.password.PasswordHasher
         :param password: 原始密碼
         :param hashed_password: 哈希密碼
         :return:
@@ -17,6 +17,7 @@ from fastapi import Request, Depends
 from application import settings
 from core.database import db_getter
 from .validation.auth import Auth
+from utils.password import PasswordHasher
 
 
 class OpenAuth(AuthValidation):
@@ -64,7 +65,9 @@ class AllUserAuth(AuthValidation):
         if not settings.OAUTH_ENABLE:
             return Auth(db=db)
         telephone, password = self.validate_token(request, token)
-        user = await UserDal(db).get_data(telephone=telephone, password=password, v_return_none=True)
+        user, _ = await self.get_cached_user(telephone, password, db)
+        if user is None:
+            user = await UserDal(db).get_data(telephone=telephone, password=password, v_return_none=True)
         return await self.validate_user(request, user, db, is_all=True)
 
 
@@ -94,22 +97,11 @@ class FullAdminAuth(AuthValidation):
         if not settings.OAUTH_ENABLE:
             return Auth(db=db)
         telephone, password = self.validate_token(request, token)
-        options = [
-            joinedload(VadminUser.roles).subqueryload(VadminRole.menus),
-            joinedload(VadminUser.roles).subqueryload(VadminRole.depts),
-            joinedload(VadminUser.depts)
-        ]
-        user = await UserDal(db).get_data(
-            telephone=telephone,
-            password=password,
-            v_return_none=True,
-            v_options=options,
-            is_staff=True
-        )
-        result = await self.validate_user(request, user, db, is_all=False)
-        permissions = self.get_user_permissions(user)
-        if permissions != {'*.*.*'} and self.permissions:
-            if not (self.permissions & permissions):
+        # 用户、角色、部門以及權限列表与數據范围优先从認證主體缓存中獲取
+        user, principal = await self.get_staff_user(telephone, password, db)
+        result = await self.validate_user(request, user, db, is_all=False, principal=principal)
+        if result.permissions != {'*.*.*'} and self.permissions:
+            if not (self.permissions & result.permissions):
                 raise CustomException(msg="無權限操作", code=status.HTTP_403_FORBIDDEN)
         return result
 
@@ -136,7 +128,7 @@ class ManualVerifyAuth:
             ]
         )
 
-        if not user or not VadminUser.verify_password(data.password, user.password):
+        if not user or not await PasswordHasher.verify(data.password, user.password):
             raise CustomException(msg="帳號或密碼錯誤", code=status.HTTP_401_UNAUTHORIZED)
 
         # 整理使用者擁有的權限
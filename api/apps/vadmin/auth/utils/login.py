@@ -33,10 +33,11 @@ from .login_manage import LoginManage
 from .validation import LoginForm, WXLoginForm
 from apps.vadmin.record.models import VadminLoginRecord
 from apps.vadmin.auth.crud import MenuDal, UserDal
-from apps.vadmin.auth.models import VadminUser
 from .current import FullAdminAuth, ManualVerifyAuth
 from .validation.auth import Auth
 from utils.wx.oauth import WXOAuth
+from utils.password import PasswordHasher
+from utils.count import RateLimit
 import jwt
 
 from .. import models
@@ -54,7 +55,7 @@ async def api_login_for_access_token(
     error_code = status.HTTP_401_UNAUTHORIZED
     if not user:
         raise CustomException(status_code=error_code, code=error_code, msg="該帳號不存在")
-    result = VadminUser.verify_password(data.password, user.password)
+    result = await PasswordHasher.verify(data.password, user.password)
     if not result:
         raise CustomException(status_code=error_code, code=error_code, msg="帳號或密碼錯誤")
     if not user.is_active:
@@ -69,7 +70,12 @@ async def api_login_for_access_token(
     return resp
 
 
-@app.post("/login", summary="帳號密碼登錄", description="員工登錄通道，限制最多输錯次數，达到最大值后将is_active=False")
+@app.post(
+    "/login",
+    summary="帳號密碼登錄",
+    description="員工登錄通道，限制最多输錯次數，达到最大值后将is_active=False",
+    dependencies=[Depends(RateLimit("login", settings.LOGIN_RATE_LIMIT, settings.LOGIN_RATE_LIMIT_WINDOW))]
+)
 async def login_for_access_token(
     request: Request,
     data: LoginForm,
@@ -13,6 +13,7 @@ import jwt
 from apps.vadmin.auth import models
 from core.database import redis_getter
 from utils.sms.code import CodeSMS
+from utils.password import PasswordHasher
 from .validation import LoginValidation, LoginForm, LoginResult
 
 
@@ -24,9 +25,11 @@ class LoginManage:
     @LoginValidation
     async def password_login(self, data: LoginForm, user: models.VadminUser, **kwargs) -> LoginResult:
         """
-        驗證用户密碼
+        驗證用户密碼，哈希参數已变更時使用新的参數重新生成哈希密碼
         """
-        result = models.VadminUser.verify_password(data.password, user.password)
+        result, password_hash = await PasswordHasher.verify_and_update(data.password, user.password)
+        if password_hash:
+            user.password = password_hash
         if result:
             return LoginResult(status=True, msg="驗證成功")
         return LoginResult(status=False, msg="帳號或密碼錯誤")
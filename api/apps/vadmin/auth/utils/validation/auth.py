@@ -8,13 +8,16 @@
 from fastapi import Request
 import jwt
 from pydantic import BaseModel
+from sqlalchemy import select, true, false
+from sqlalchemy.orm import selectinload, make_transient_to_detached
 from application import settings
 from sqlalchemy.ext.asyncio import AsyncSession
-from apps.vadmin.auth.models import VadminUser
+from apps.vadmin.auth.models import VadminUser, VadminRole, VadminDept
 from core.exception import CustomException
 from utils import status
+from utils.principal_cache import PrincipalCache
 from datetime import timedelta, datetime
-from apps.vadmin.auth.crud import UserDal
+from apps.vadmin.auth.crud import DeptDal
 
 
 class Auth(BaseModel):
@@ -22,6 +25,7 @@ class Auth(BaseModel):
     db: AsyncSession
     data_range: int | None = None
     dept_ids: list | None = []
+    permissions: set | None = None
 
     class Config:
         # 接收任意類型
@@ -84,13 +88,21 @@ class AuthValidation:
         return telephone, password
 
     @classmethod
-    async def validate_user(cls, request: Request, user: VadminUser, db: AsyncSession, is_all: bool = True) -> Auth:
+    async def validate_user(
+            cls,
+            request: Request,
+            user: VadminUser,
+            db: AsyncSession,
+            is_all: bool = True,
+            principal: tuple[set, int, list] | None = None
+    ) -> Auth:
         """
         驗證用户信息
         :param request:
         :param user:
         :param db:
         :param is_all: 是否所有人訪問，不加權限
+        :param principal: 已从認證主體缓存中獲取的 權限列表，數據范围，部門 id 列表
         :return:
         """
         if user is None:
@@ -100,14 +112,112 @@ class AuthValidation:
         request.scope["telephone"] = user.telephone
         request.scope["user_id"] = user.id
         request.scope["user_name"] = user.name
-        try:
-            request.scope["body"] = await request.body()
-        except RuntimeError:
-            request.scope["body"] = "獲取失敗"
         if is_all:
             return Auth(user=user, db=db)
+        if principal is None:
+            principal = await cls.get_user_principal(user, db)
+        permissions, data_range, dept_ids = principal
+        return Auth(user=user, db=db, data_range=data_range, dept_ids=dept_ids, permissions=permissions)
+
+    @classmethod
+    async def get_cached_user(
+            cls,
+            telephone: str,
+            password: str,
+            db: AsyncSession
+    ) -> tuple[VadminUser | None, tuple[set, int, list] | None]:
+        """
+        从認證主體缓存中獲取用户与權限，命中時不查詢數據庫
+        缓存中的用户（含角色与部門）通過 merge(load=False) 加入當前會話，可以像查詢出的用户一样修改並提交
+        :param telephone: 帳號
+        :param password: token 中的哈希密碼，与缓存不一致時视為未命中
+        :param db:
+        :return: 用户，權限列表，數據范围，部門 id 列表；未命中時返回 None, None
+        """
+        cached = await PrincipalCache.get(telephone)
+        if cached is None or cached.get("password_digest") != PrincipalCache.password_digest(password):
+            return None, None
+        # 缓存中不保存密碼哈希，摘要一致即 token 中的密碼哈希与缓存时的一致
+        user = PrincipalCache.load_instance(VadminUser, {**cached["user"], "password": password})
+        user.roles = {PrincipalCache.load_instance(VadminRole, i) for i in cached["roles"]}
+        user.depts = {PrincipalCache.load_instance(VadminDept, i) for i in cached["depts"]}
+        for obj in [user, *user.roles, *user.depts]:
+            make_transient_to_detached(obj)
+        user = await db.merge(user, load=False)
+        return user, (set(cached["permissions"]), cached["data_range"], cached["dept_ids"])
+
+    @classmethod
+    async def get_staff_user(
+            cls,
+            telephone: str,
+            password: str,
+            db: AsyncSession
+    ) -> tuple[VadminUser | None, tuple[set, int, list] | None]:
+        """
+        獲取员工用户与權限，优先从認證主體缓存中獲取
+
+        未命中時先查詢用户編號並讀取缓存版本號，再加載用户、角色、部門並计算權限，
+        版本號在加載數據之前讀取，加載期间提交的变更會使本次写入的缓存立即失效。
+        :param telephone: 帳號
+        :param password: token 中的哈希密碼
+        :param db:
+        :return: 用户，權限列表，數據范围，部門 id 列表
+        """
+        user, principal = await cls.get_cached_user(telephone, password, db)
+        if user is not None:
+            if not user.is_staff:
+                return None, None
+            return user, principal
+        filters = [
+            VadminUser.telephone == telephone,
+            VadminUser.password == password,
+            VadminUser.is_staff == true(),
+            VadminUser.is_delete == false()
+        ]
+        user_id = await db.scalar(select(VadminUser.id).where(*filters))
+        if user_id is None:
+            return None, None
+        versions = await PrincipalCache.get_versions(user_id)
+        sql = select(VadminUser).where(VadminUser.id == user_id, *filters).options(
+            selectinload(VadminUser.roles).selectinload(VadminRole.menus),
+            selectinload(VadminUser.roles).selectinload(VadminRole.depts),
+            selectinload(VadminUser.depts)
+        )
+        user = await db.scalar(sql)
+        if user is None:
+            return None, None
+        permissions = cls.get_user_permissions(user)
+        data_range, dept_ids = await cls.get_user_data_range(user, db)
+        if versions is not None and user.is_active:
+            await PrincipalCache.set(telephone, versions, {
+                "user": PrincipalCache.dump_instance(user),
+                "password_digest": PrincipalCache.password_digest(user.password),
+                "roles": [PrincipalCache.dump_instance(i) for i in user.roles],
+                "depts": [PrincipalCache.dump_instance(i) for i in user.depts],
+                "permissions": list(permissions),
+                "data_range": data_range,
+                "dept_ids": dept_ids
+            })
+        return user, (permissions, data_range, dept_ids)
+
+    @classmethod
+    async def get_user_principal(cls, user: VadminUser, db: AsyncSession) -> tuple[set, int, list]:
+        """
+        加載角色關聯的選單与部門並计算權限列表与數據范围
+        :param user: 已加載 roles 与 depts 的用户实例
+        :param db:
+        :return: 權限列表，數據范围，部門 id 列表
+        """
+        if user.roles:
+            # 角色已在會話中，此处只補充加載角色關聯的選單与部門
+            sql = select(VadminRole).where(VadminRole.id.in_([i.id for i in user.roles])).options(
+                selectinload(VadminRole.menus),
+                selectinload(VadminRole.depts)
+            )
+            await db.scalars(sql)
+        permissions = cls.get_user_permissions(user)
         data_range, dept_ids = await cls.get_user_data_range(user, db)
-        return Auth(user=user, db=db, data_range=data_range, dept_ids=dept_ids)
+        return permissions, data_range, dept_ids
 
     @classmethod
     def get_user_permissions(cls, user: VadminUser) -> set:
@@ -148,8 +258,8 @@ class AuthValidation:
             for dept in user.depts:
                 dept_ids.add(dept.id)
         elif data_range == 2:
-            # 递归獲取部門列表
-            dept_ids = await UserDal(db).recursion_get_dept_ids(user)
+            # 通過部門层级路径獲取本部門及以下部門列表
+            dept_ids = await DeptDal(db).get_descendant_ids(user.depts)
         elif data_range == 3:
             for role_obj in user.roles:
                 for dept in role_obj.depts:
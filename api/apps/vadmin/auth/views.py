@@ -101,7 +101,7 @@ async def post_user_current_update_avatar(file: UploadFile, auth: Auth = Depends
 @app.get("/user/admin/current/info", summary="獲取當前管理员信息")
 async def get_user_admin_current_info(auth: Auth = Depends(FullAdminAuth())):
     result = schemas.UserOut.model_validate(auth.user).model_dump()
-    result["permissions"] = list(FullAdminAuth.get_user_permissions(auth.user))
+    result["permissions"] = list(auth.permissions)
     return SuccessResponse(result)
 
 
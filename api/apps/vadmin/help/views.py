@@ -9,7 +9,7 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
-from core.database import db_getter
+from core.database import db_getter, db_read_getter
 from utils.response import SuccessResponse
 from . import schemas, crud, params, models
 from core.dependencies import IdList
@@ -66,7 +66,7 @@ async def get_issue_category(data_id: int, auth: Auth = Depends(AllUserAuth())):
 
 
 @app.get("/issue/categorys/platform/{platform}", summary="獲取平台中的常见問题类别列表")
-async def get_issue_category_platform(platform: str, db: AsyncSession = Depends(db_getter)):
+async def get_issue_category_platform(platform: str, db: AsyncSession = Depends(db_read_getter)):
     model = models.VadminIssueCategory
     options = [joinedload(model.issues)]
     schema = schemas.IssueCategoryPlatformOut
@@ -115,7 +115,7 @@ async def put_issue(data_id: int, data: schemas.Issue, auth: Auth = Depends(AllU
 
 
 @app.get("/issues/{data_id}", summary="獲取問题信息")
-async def get_issue(data_id: int, db: AsyncSession = Depends(db_getter)):
+async def get_issue(data_id: int, db: AsyncSession = Depends(db_read_getter)):
     schema = schemas.IssueSimpleOut
     return SuccessResponse(await crud.IssueDal(db).get_data(data_id, v_schema=schema))
 
@@ -6,15 +6,17 @@
 # @IDE            : PyCharm
 # @desc           : 登錄记錄模型
 import json
+from functools import partial
 
 from sqlalchemy.orm import Mapped, mapped_column
 
 from application.settings import LOGIN_LOG_RECORD
 from apps.vadmin.auth.utils.validation import LoginForm, WXLoginForm
-from utils.ip_manage import IPManage
+from core.database import session_factory
+from utils.ip_manage import IPManage, IPLocationOut
 from sqlalchemy.ext.asyncio import AsyncSession
 from db.db_base import BaseModel
-from sqlalchemy import String, Boolean, Text
+from sqlalchemy import String, Boolean, Text, update
 from fastapi import Request
 from starlette.requests import Request as StarletteRequest
 from user_agents import parse
@@ -84,3 +86,21 @@ class VadminLoginRecord(BaseModel):
         )
         db.add(obj)
         await db.flush()
+        if location.address is None:
+            # 本地未解析到归属地時在后台查詢，完成后补充到登錄记錄中
+            ip.parse_in_background(partial(cls.update_location, obj.id))
+
+    @classmethod
+    async def update_location(cls, record_id: int, location: IPLocationOut) -> None:
+        """
+        更新登錄记錄的 IP 归属地
+        登錄請求的事务提交前该 UPDATE 會等待行锁，提交后再写入
+        :param record_id:
+        :param location:
+        :return:
+        """
+        async with session_factory() as db:
+            await db.execute(
+                update(cls).where(cls.id == record_id).values(**location.model_dump(exclude={"ip"}))
+            )
+            await db.commit()
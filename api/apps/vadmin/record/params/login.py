@@ -24,8 +24,12 @@ class LoginParams(QueryParams):
             telephone: str = None,
             status: bool = None,
             platform: str = None,
+            cursor: str = None,
             params: Paging = Depends()
     ):
+        """
+        :param cursor: 游標分頁，傳入空字符串獲取第一頁，之后傳入上一頁返回的 next_cursor，不再使用 page 参數
+        """
         super().__init__(params)
         self.ip = ("like", ip)
         self.telephone = ("like", telephone)
@@ -33,3 +37,5 @@ class LoginParams(QueryParams):
         self.status = status
         self.platform = platform
         self.v_order = "desc"
+        self.v_keyset = cursor is not None
+        self.v_cursor = cursor or None
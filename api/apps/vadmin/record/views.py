@@ -22,7 +22,17 @@ app = APIRouter()
 ###########################################################
 @app.get("/logins", summary="獲取登錄日誌列表")
 async def get_record_login(p: LoginParams = Depends(), auth: Auth = Depends(AllUserAuth())):
-    datas, count = await crud.LoginRecordDal(auth.db).get_datas(**p.dict(), v_return_count=True)
+    # 登錄日誌數據量大，未過滤時使用表统计信息中的近似总數，過滤時缓存总數
+    # 傳入 cursor 時使用游標分頁，翻到靠后的頁碼不再需要 OFFSET 扫描前面的所有行
+    result = await crud.LoginRecordDal(auth.db).get_datas(
+        **p.dict(),
+        v_return_count=True,
+        v_count_strategy="estimate"
+    )
+    if p.v_keyset:
+        datas, count, next_cursor = result
+        return SuccessResponse(datas, count=count, next_cursor=next_cursor)
+    datas, count = result
     return SuccessResponse(datas, count=count)
 
 
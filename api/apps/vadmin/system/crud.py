@@ -19,13 +19,14 @@ from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import joinedload
 
-from application.settings import STATIC_ROOT, SUBSCRIBE, REDIS_DB_ENABLE
+from application.settings import STATIC_ROOT, REDIS_DB_ENABLE, TASK_STREAM, TASK_STREAM_MAXLEN
 from core.crud import DalBase
-from core.database import redis_getter
+from core.database import redis_getter, add_commit_callback
 from core.exception import CustomException
 from core.mongo_manage import MongoManage
 from utils import status
 from utils.file.file_manage import FileManage
+from utils.cache import Cache
 from . import models, schemas
 
 
@@ -116,12 +117,15 @@ class SettingsDal(DalBase):
             else:
                 sql = update(self.model).where(self.model.config_key == str(key)).values(config_value=value)
                 await self.db.execute(sql)
-        if "wx_server_app_id" in datas and REDIS_DB_ENABLE:
-            rd = redis_getter(request)
-            await rd.client().set("wx_server", json.dumps(datas))
-        elif "sms_access_key" in datas and REDIS_DB_ENABLE:
-            rd = redis_getter(request)
-            await rd.client().set('aliyun_sms', json.dumps(datas))
+        if REDIS_DB_ENABLE:
+            # 事務提交后重新讀取配置写入 Redis，並通知所有進程清除進程内缓存
+            # 提交前写入時，其他進程可能重新加載到尚未提交的旧配置，提交失敗時 Redis 中又已经是未生效的配置
+            sql = select(models.VadminSystemSettingsTab.tab_name).join(models.VadminSystemSettings).where(
+                models.VadminSystemSettings.config_key.in_([str(key) for key in datas.keys()])
+            ).distinct()
+            tab_names = list((await self.db.scalars(sql)).all())
+            if tab_names:
+                add_commit_callback(self.db, Cache(redis_getter(request)).cache_tab_names, tab_names)
 
     async def get_base_config(self) -> dict:
         """
@@ -192,32 +196,31 @@ class TaskDal(MongoManage):
     class JobOperation(Enum):
         add = "add_job"
 
+    # 由關聯查詢得到的临時字段，按这些字段過滤或排序時需要先關聯再分頁
+    COMPUTED_FIELDS = ("is_active", "last_run_datetime")
+
     def __init__(self, db: AsyncIOMotorDatabase):
         super(TaskDal, self).__init__(db, "vadmin_system_task", schemas.TaskSimpleOut)
 
-    async def get_task(
-            self,
-            _id: str = None,
-            v_return_none: bool = False,
-            v_schema: Any = None,
-            **kwargs
-    ) -> dict | None:
+    @staticmethod
+    async def create_indexes(db: AsyncIOMotorDatabase) -> None:
         """
-        獲取單個數據，默认使用 ID 查詢，否则使用关键词查詢
-
-        包括临時字段 last_run_datetime，is_active
-        is_active: 只有在 scheduler_task_jobs 任務运行表中存在相同 _id 才表示任務添加成功，任務状態才為 True
-        last_run_datetime: 在 scheduler_task_record 中獲取該任務最近一次执行完成的時間
+        創建任務列表查詢使用的索引，在 MongoDB 连接事件中調用，索引已存在時不會重复創建
+        :param db:
+        :return:
+        """
+        await db["vadmin_system_task"].create_index([("create_datetime", -1)])
+        # 關聯查詢每个任務最近一次执行记錄
+        await db["scheduler_task_record"].create_index([("job_id", 1), ("create_datetime", -1)])
 
-        :param _id: 數據 ID
-        :param v_return_none: 是否返回空 None，否则抛出异常，默认抛出异常
-        :param v_schema: 指定使用的序列化對象
+    @classmethod
+    def lookup_stages(cls) -> list[dict]:
         """
-        if _id:
-            kwargs["_id"] = ("ObjectId", _id)
+        關聯任務运行表与执行记錄表，生成临時字段 is_active，last_run_datetime
 
-        params = self.filter_condition(**kwargs)
-        pipeline = [
+        使用关联子查詢，只返回需要的字段，执行记錄只取最近一条，耗時与执行记錄總數無关
+        """
+        return [
             {
                 '$addFields': {
                     'str_id': {'$toString': '$_id'}
@@ -226,31 +229,34 @@ class TaskDal(MongoManage):
             {
                 '$lookup': {
                     'from': 'scheduler_task_jobs',
-                    'localField': 'str_id',
-                    'foreignField': '_id',
+                    'let': {'str_id': '$str_id'},
+                    'pipeline': [
+                        {'$match': {'$expr': {'$eq': ['$_id', '$$str_id']}}},
+                        {'$limit': 1},
+                        {'$project': {'_id': 1}}
+                    ],
                     'as': 'matched_jobs'
                 }
             },
             {
                 '$lookup': {
                     'from': 'scheduler_task_record',
-                    'localField': 'str_id',
-                    'foreignField': 'job_id',
+                    'let': {'str_id': '$str_id'},
+                    'pipeline': [
+                        {'$match': {'$expr': {'$eq': ['$job_id', '$$str_id']}}},
+                        {'$sort': {'create_datetime': -1}},
+                        {'$limit': 1},
+                        {'$project': {'_id': 0, 'create_datetime': 1}}
+                    ],
                     'as': 'matched_records'
                 }
             },
             {
                 '$addFields': {
-                    'is_active': {
-                        '$cond': {
-                            'if': {'$ne': ['$matched_jobs', []]},
-                            'then': True,
-                            'else': False
-                        }
-                    },
+                    'is_active': {'$ne': ['$matched_jobs', []]},
                     'last_run_datetime': {
                         '$ifNull': [
-                            {'$arrayElemAt': ['$matched_records.create_datetime', -1]},
+                            {'$arrayElemAt': ['$matched_records.create_datetime', 0]},
                             None
                         ]
                     }
@@ -261,22 +267,51 @@ class TaskDal(MongoManage):
                     'matched_records': 0,
                     'matched_jobs': 0
                 }
-            },
-            {
-                '$match': params
-            },
-            {
-                '$facet': {
-                    'documents': [
-                        {'$limit': 1},
-                    ]
-                }
             }
         ]
+
+    def split_params(self, **kwargs) -> tuple[dict, dict]:
+        """
+        将過滤條件拆分為任務表字段條件与临時字段條件
+        :return: (任務表字段條件, 临時字段條件)
+        """
+        params = self.filter_condition(**kwargs)
+        computed = {key: params.pop(key) for key in self.COMPUTED_FIELDS if key in params}
+        return params, computed
+
+    async def get_task(
+            self,
+            _id: str = None,
+            v_return_none: bool = False,
+            v_schema: Any = None,
+            **kwargs
+    ) -> dict | None:
+        """
+        獲取單個數據，默认使用 ID 查詢，否则使用关键词查詢
+
+        包括临時字段 last_run_datetime，is_active
+        is_active: 只有在 scheduler_task_jobs 任務运行表中存在相同 _id 才表示任務添加成功，任務状態才為 True
+        last_run_datetime: 在 scheduler_task_record 中獲取該任務最近一次执行完成的時間
+
+        :param _id: 數據 ID
+        :param v_return_none: 是否返回空 None，否则抛出异常，默认抛出异常
+        :param v_schema: 指定使用的序列化對象
+        """
+        if _id:
+            kwargs["_id"] = ("ObjectId", _id)
+
+        params, computed = self.split_params(**kwargs)
+        pipeline = [{'$match': params}]
+        if computed:
+            pipeline.extend(self.lookup_stages())
+            pipeline.append({'$match': computed})
+            pipeline.append({'$limit': 1})
+        else:
+            pipeline.append({'$limit': 1})
+            pipeline.extend(self.lookup_stages())
         # 执行聚合查詢
         cursor = self.collection.aggregate(pipeline)
-        result = await cursor.to_list(length=None)
-        data = result[0]['documents']
+        data = await cursor.to_list(length=1)
         if not data and v_return_none:
             return None
         elif not data:
@@ -301,66 +336,30 @@ class TaskDal(MongoManage):
         添加了两个临時字段
         is_active: 只有在 scheduler_task_jobs 任務运行表中存在相同 _id 才表示任務添加成功，任務状態才為 True
         last_run_datetime: 在 scheduler_task_record 中獲取該任務最近一次执行完成的時間
+
+        先過滤、排序、分頁，只對當前頁的任務做關聯查詢；
+        按临時字段過滤或排序時只能先關聯，此時仍先按任務表字段過滤
         """
         v_order_field = v_order_field if v_order_field else 'create_datetime'
         v_order = -1 if v_order in self.ORDER_FIELD else 1
-        params = self.filter_condition(**kwargs)
+        params, computed = self.split_params(**kwargs)
+        page_stages = [{'$sort': {v_order_field: v_order}}, {'$skip': (page - 1) * limit}]
+        if limit != 0:
+            page_stages.append({'$limit': limit})
+        if computed or v_order_field in self.COMPUTED_FIELDS:
+            documents = self.lookup_stages() + [{'$match': computed}] + page_stages
+            count = self.lookup_stages() + [{'$match': computed}, {'$count': 'total'}]
+        else:
+            documents = page_stages + self.lookup_stages()
+            count = [{'$count': 'total'}]
         pipeline = [
-            {
-                '$addFields': {
-                    'str_id': {'$toString': '$_id'}
-                }
-            },
-            {
-                '$lookup': {
-                    'from': 'scheduler_task_jobs',
-                    'localField': 'str_id',
-                    'foreignField': '_id',
-                    'as': 'matched_jobs'
-                }
-            },
-            {
-                '$lookup': {
-                    'from': 'scheduler_task_record',
-                    'localField': 'str_id',
-                    'foreignField': 'job_id',
-                    'as': 'matched_records'
-                }
-            },
-            {
-                '$addFields': {
-                    'is_active': {
-                        '$cond': {
-                            'if': {'$ne': ['$matched_jobs', []]},
-                            'then': True,
-                            'else': False
-                        }
-                    },
-                    'last_run_datetime': {
-                        '$ifNull': [
-                            {'$arrayElemAt': ['$matched_records.create_datetime', -1]},
-                            None
-                        ]
-                    }
-                }
-            },
-            {
-                '$project': {
-                    'matched_records': 0,
-                    'matched_jobs': 0
-                }
-            },
             {
                 '$match': params
             },
             {
                 '$facet': {
-                    'documents': [
-                        {'$sort': {v_order_field: v_order}},
-                        {'$limit': limit},
-                        {'$skip': (page - 1) * limit}
-                    ],
-                    'count': [{'$count': 'total'}]
+                    'documents': documents,
+                    'count': count
                 }
             }
         ]
@@ -378,15 +377,33 @@ class TaskDal(MongoManage):
             datas = [jsonable_encoder(self.schema(**data)) for data in datas]
         return datas, count
 
-    async def add_task(self, rd: Redis, data: dict) -> int:
+    @staticmethod
+    async def send_task_message(rd: Redis, message: dict) -> str:
         """
-        添加任務到消息隊列
+        發送任務消息到消息流
+
+        使用 Redis Stream 持久化消息，定時任務程序通過消费者组讀取並在處理完成后确认，
+        定時任務程序重启期間發送的消息不會丢失，至少被處理一次。
 
-        使用消息無保留策略：無保留是指當發送者向某个频道發送消息時，如果没有订阅該频道的調用方，就直接将該消息丢弃。
+        :param rd: redis 對象
+        :param message: 消息内容
+        :return: 消息 ID
+        """
+        message_id = await rd.xadd(
+            TASK_STREAM,
+            {"data": json.dumps(message).encode('utf-8')},
+            maxlen=TASK_STREAM_MAXLEN,
+            approximate=True
+        )
+        return message_id.decode() if isinstance(message_id, bytes) else message_id
+
+    async def add_task(self, rd: Redis, data: dict) -> str:
+        """
+        添加任務到消息隊列
 
         :param rd: redis 對象
         :param data: 行數據字典
-        :return: 接收到消息的订阅者數量。
+        :return: 消息 ID
         """
         exec_strategy = data.get("exec_strategy")
         job_params = {
@@ -404,7 +421,7 @@ class TaskDal(MongoManage):
                 "job_params": job_params
             }
         }
-        return await rd.publish(SUBSCRIBE, json.dumps(message).encode('utf-8'))
+        return await self.send_task_message(rd, message)
 
     async def create_task(self, rd: Redis, data: schemas.Task) -> dict:
         """
@@ -421,13 +438,13 @@ class TaskDal(MongoManage):
             await TaskGroupDal(self.db).create_data({"value": data.group})
 
         result = {
-            "subscribe_number": 0,
+            "message_id": None,
             "is_active": is_active
         }
 
         if is_active:
             # 創建任務成功后, 如果任務状態為 True，则向消息隊列中發送任務
-            result['subscribe_number'] = await self.add_task(rd, obj)
+            result['message_id'] = await self.add_task(rd, obj)
         return result
 
     async def put_task(self, rd: Redis, _id: str, data: schemas.Task) -> dict:
@@ -451,13 +468,13 @@ class TaskDal(MongoManage):
             pass
 
         result = {
-            "subscribe_number": 0,
+            "message_id": None,
             "is_active": is_active
         }
 
         if is_active:
             # 更新任務成功后, 如果任務状態為 True，则向消息隊列中發送任務
-            result['subscribe_number'] = await self.add_task(rd, obj)
+            result['message_id'] = await self.add_task(rd, obj)
         return result
 
     async def delete_task(self, _id: str) -> bool:
@@ -473,7 +490,7 @@ class TaskDal(MongoManage):
             pass
         return result
 
-    async def run_once_task(self, rd: Redis, _id: str) -> int:
+    async def run_once_task(self, rd: Redis, _id: str) -> str:
         """
         执行一次任務
         """
@@ -489,7 +506,7 @@ class TaskDal(MongoManage):
             }
         }
 
-        return await rd.publish(SUBSCRIBE, json.dumps(message).encode('utf-8'))
+        return await self.send_task_message(rd, message)
 
 
 class TaskGroupDal(MongoManage):
@@ -0,0 +1,28 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/19 12:00
+# @File           : event.py
+# @IDE            : PyCharm
+# @desc           : 系统模块全局事件
+
+from fastapi import FastAPI
+from pymongo.errors import PyMongoError
+
+from core.logger import logger
+from .crud import TaskDal
+
+
+async def create_mongo_indexes(app: FastAPI, status: bool):
+    """
+    創建定時任務列表查詢使用的 MongoDB 索引
+    依赖 core.event.connect_mongo，需要配置在其之后
+    :param app:
+    :param status:
+    :return:
+    """
+    if status:
+        try:
+            await TaskDal.create_indexes(app.state.mongo)
+        except PyMongoError as e:
+            logger.error(f"創建 MongoDB 索引失敗: {e}")
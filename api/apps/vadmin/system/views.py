@@ -9,12 +9,13 @@ from redis.asyncio import Redis
 from fastapi import APIRouter, Depends, Body, UploadFile, Form, Request
 from motor.motor_asyncio import AsyncIOMotorDatabase
 from sqlalchemy.ext.asyncio import AsyncSession
-from application.settings import ALIYUN_OSS
-from core.database import db_getter, redis_getter, mongo_getter
+from application.settings import ALIYUN_OSS, SMS_SEND_RATE_LIMIT, SMS_SEND_RATE_LIMIT_WINDOW
+from core.database import db_read_getter, redis_getter, mongo_getter
 from utils.file.aliyun_oss import AliyunOSS, BucketConf
 from utils.file.file_manage import FileManage
 from utils.response import SuccessResponse, ErrorResponse
 from utils.sms.code import CodeSMS
+from utils.count import RateLimit
 from . import schemas, crud
 from core.dependencies import IdList
 from apps.vadmin.auth.utils.current import AllUserAuth, FullAdminAuth, OpenAuth
@@ -133,7 +134,16 @@ async def upload_image_to_local(file: UploadFile, path: str = Form(...)):
 ###########################################################
 #    短信服務管理
 ###########################################################
-@app.post("/sms/send", summary="發送短信驗證碼（阿里云服務）")
+@app.post(
+    "/sms/send",
+    summary="發送短信驗證碼（阿里云服務）",
+    dependencies=[Depends(RateLimit(
+        "sms_send",
+        SMS_SEND_RATE_LIMIT,
+        SMS_SEND_RATE_LIMIT_WINDOW,
+        key_func=lambda request: request.query_params.get("telephone", "")
+    ))]
+)
 async def sms_send(telephone: str, rd: Redis = Depends(redis_getter), auth: Auth = Depends(OpenAuth())):
     user = await vadmin_auth_crud.UserDal(auth.db).get_data(telephone=telephone, v_return_none=True)
     if not user:
@@ -165,7 +175,7 @@ async def put_settings_tabs_values(
 
 
 @app.get("/settings/base/config", summary="獲取系统基礎配置", description="每次進入系统中時使用")
-async def get_setting_base_config(db: AsyncSession = Depends(db_getter)):
+async def get_setting_base_config(db: AsyncSession = Depends(db_read_getter)):
     return SuccessResponse(await crud.SettingsDal(db).get_base_config())
 
 
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 23:55
+# @File           : bpm_soap.py
+# @IDE            : PyCharm
+# @desc           : BPM WebService 調用延迟对比
+
+"""
+对比每次調用都创建 zeep.Client（下載並解析 WSDL、新建连接、在事件循環中同步执行）
+与 BpmClientManager 共用客户端（WSDL 只解析一次、连接池复用、线程池执行）的調用延迟
+
+运行：在 api 目錄下执行 python -m benchmarks.bpm_soap [調用次數] [服務端延迟毫秒]
+BPM 服務使用 tests.fake_bpm 在本地模擬
+"""
+
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+
+from zeep import Client
+
+from tests.fake_bpm import FakeBpmServer
+from utils.bpm_wsdl import BpmClientManager, bpm_wsl
+
+
+def legacy_check_work_item_state(wsdl: str, oid: str) -> int:
+    """
+    原实现：每次調用创建客户端，調用完成后关闭连接
+    """
+    client = Client(wsdl=wsdl)
+    try:
+        return int(client.service.checkWorkItemState(pWorkItemOID=oid))
+    finally:
+        client.transport.session.close()
+
+
+def pooled_client(wsdl: str) -> bpm_wsl:
+    client = bpm_wsl()
+    client.wsdl = wsdl
+    return client
+
+
+async def legacy_call(wsdl: str, oid: str) -> None:
+    # 原实现在 async 方法中直接同步調用
+    legacy_check_work_item_state(wsdl, oid)
+
+
+async def pooled_call(wsdl: str, oid: str) -> None:
+    success, result = await BpmClientManager.run(pooled_client(wsdl).checkWorkItemState, oid)
+    assert success, result
+
+
+def percentile(values: list[float], percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent))]
+
+
+async def sequential(call, wsdl: str, number: int) -> list[float]:
+    latencies = []
+    for i in range(number):
+        start = time.perf_counter()
+        await call(wsdl, f"oid-{i}")
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def concurrent(call, wsdl: str, number: int) -> float:
+    start = time.perf_counter()
+    await asyncio.gather(*[call(wsdl, f"oid-{i}") for i in range(number)])
+    return time.perf_counter() - start
+
+
+async def main(number: int, delay: float) -> None:
+    BpmClientManager.WSDL_CACHE_PATH = tempfile.mktemp(suffix=".db")
+    with FakeBpmServer(delay=delay) as server:
+        # 预热共用客户端，之后的調用不再下載 WSDL
+        await pooled_call(server.wsdl, "warm-up")
+        print(f"calls={number} server delay={delay * 1000:.0f}ms")
+        print(f"{'mode':<10}{'p50 (ms)':>10}{'p99 (ms)':>10}{'mean (ms)':>11}{f'{BpmClientManager.MAX_WORKERS} concurrent (ms)':>22}")
+        for name, call in (("legacy", legacy_call), ("pooled", pooled_call)):
+            before = server.connections, server.wsdl_requests
+            latencies = await sequential(call, server.wsdl, number)
+            total = await concurrent(call, server.wsdl, BpmClientManager.MAX_WORKERS)
+            print(
+                f"{name:<10}{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}"
+                f"{statistics.mean(latencies) * 1000:>11.1f}{total * 1000:>22.1f}"
+                f"   connections={server.connections - before[0]} wsdl_downloads={server.wsdl_requests - before[1]}"
+            )
+
+
+if __name__ == '__main__':
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.002
+    ))
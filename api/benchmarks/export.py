@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/19 00:30
+# @File           : export.py
+# @IDE            : PyCharm
+# @desc           : 用户列表导出耗時与内存对比
+
+"""
+对比原先一次加載全部用户（joinedload）並使用 openpyxl 生成文件的导出方式，
+与 UserDal.export_query_list 按游標分批讀取、xlsxwriter 常量内存模式写入的导出方式
+
+每种方式在独立子進程中运行，内存取子進程导出前后的峰值常驻内存（ru_maxrss）之差
+
+运行：在 api 目錄下执行 python -m benchmarks.export [行數 ...] [--skip-legacy]
+默认行數為 20000 200000，數據庫使用 aiosqlite 临时文件，需要安装 tests/requirements.txt 中的依赖
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.orm import joinedload
+
+from application.settings import STATIC_ROOT, STATIC_URL
+from apps.vadmin.auth import models
+from apps.vadmin.auth.crud import UserDal
+from apps.vadmin.auth.params import UserParams
+from apps.vadmin.system.models import VadminDictType, VadminDictDetails
+from core.database import Base, RoutingSession
+from core.dependencies import Paging
+from utils.excel.excel_manage import ExcelManage
+
+HEADER = [
+    {"label": "姓名", "field": "name"},
+    {"label": "帳號", "field": "telephone"},
+    {"label": "郵箱", "field": "email"},
+    {"label": "性别", "field": "gender"},
+    {"label": "是否可用", "field": "is_active"},
+    {"label": "是否為工作人員", "field": "is_staff"},
+    {"label": "角色", "field": "roles"},
+    {"label": "部門", "field": "depts"},
+    {"label": "最近登錄時間", "field": "last_login"},
+    {"label": "創建時間", "field": "create_datetime"},
+]
+
+
+async def seed(path: str, rows: int) -> None:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(VadminDictType), [{"id": 1, "dict_name": "性别", "dict_type": "sys_vadmin_gender"}])
+        await conn.execute(insert(VadminDictDetails), [
+            {"label": label, "value": str(i), "order": i, "dict_type_id": 1} for i, label in enumerate(["男", "女", "未知"])
+        ])
+        await conn.execute(insert(models.VadminRole), [
+            {"id": i, "name": f"角色{i}", "role_key": f"role{i}"} for i in range(1, 6)
+        ])
+        await conn.execute(insert(models.VadminDept), [
+            {"id": i, "name": f"部門{i}", "dept_key": f"dept{i}", "path": f"/{i}/"} for i in range(1, 11)
+        ])
+        for start in range(1, rows + 1, 10000):
+            ids = range(start, min(start + 10000, rows + 1))
+            await conn.execute(insert(models.VadminUser), [
+                {"id": i, "name": f"用户{i}", "telephone": f"1{i:010d}", "email": f"user{i}@example.com",
+                 "gender": str(i % 3), "is_active": i % 7 != 0, "is_staff": i % 5 == 0}
+                for i in ids
+            ])
+            await conn.execute(insert(models.vadmin_auth_user_roles), [
+                {"user_id": i, "role_id": i % 5 + 1} for i in ids
+            ])
+            await conn.execute(insert(models.vadmin_auth_user_depts), [
+                {"user_id": i, "dept_id": i % 10 + 1} for i in ids
+            ])
+    await engine.dispose()
+
+
+async def legacy_export(dal: UserDal, header: list, params: UserParams) -> str:
+    """
+    原实现，返回生成的文件路径
+    """
+    datas = await dal.get_datas(
+        **params.dict(),
+        v_return_objs=True,
+        v_options=[joinedload(dal.model.depts), joinedload(dal.model.roles)]
+    )
+    row = list(map(lambda i: i.get("label"), header))
+    rows = []
+    options = await dal.get_export_headers_options()
+    for user in datas:
+        data = []
+        for item in header:
+            field = item.get("field")
+            value = getattr(user, field, "")
+            if field == "is_active":
+                value = "可用" if value else "停用"
+            elif field == "is_staff":
+                value = "是" if value else "否"
+            elif field == "gender":
+                result = list(filter(lambda i: i["value"] == value, options["gender_options"]))
+                value = result[0]["label"] if result else ""
+            elif field == "roles":
+                value = ",".join([i.name for i in value])
+            elif field == "depts":
+                value = ",".join([i.name for i in value])
+            data.append(value)
+        rows.append(data)
+    em = ExcelManage()
+    em.create_excel("用户列表")
+    em.write_list(rows, row)
+    file_path = em.save_excel().get("local_path")
+    em.close()
+    return file_path
+
+
+async def stream_export(dal: UserDal, header: list, params: UserParams) -> str:
+    result = await dal.export_query_list(header, params)
+    return result["url"].replace(STATIC_URL, STATIC_ROOT, 1)
+
+
+async def run(mode: str, path: str) -> dict:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    factory = async_sessionmaker(bind=engine, class_=AsyncSession, sync_session_class=RoutingSession)
+    params = UserParams(None, None, None, None, None, params=Paging(limit=0))
+    export = legacy_export if mode == "legacy" else stream_export
+    async with factory() as db:
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        start = time.perf_counter()
+        file_path = await export(UserDal(db), HEADER, params)
+        seconds = time.perf_counter() - start
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    await engine.dispose()
+    size = os.path.getsize(file_path)
+    os.remove(file_path)
+    return {"seconds": seconds, "memory": (after - before) / 1024, "size": size / 1024 / 1024}
+
+
+def main(sizes: list[int], skip_legacy: bool) -> None:
+    modes = ["stream"] if skip_legacy else ["legacy", "stream"]
+    print(f"{'mode':<8}{'rows':>8}{'time (s)':>10}{'peak RSS +MB':>14}{'file MB':>9}")
+    for rows in sizes:
+        path = os.path.join(tempfile.mkdtemp(), "export.db")
+        asyncio.run(seed(path, rows))
+        for mode in modes:
+            output = subprocess.run(
+                [sys.executable, "-m", "benchmarks.export", "--run", mode, "--db", path],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            print(f"{mode:<8}{rows:>8}{result['seconds']:>10.2f}{result['memory']:>14.1f}{result['size']:>9.1f}")
+        os.remove(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=[20000, 200000])
+    parser.add_argument("--skip-legacy", action="store_true")
+    parser.add_argument("--run", choices=["legacy", "stream"], help=argparse.SUPPRESS)
+    parser.add_argument("--db", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.run:
+        print(json.dumps(asyncio.run(run(args.run, args.db))))
+    else:
+        main(args.sizes, args.skip_legacy)
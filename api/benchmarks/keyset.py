@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/19 00:10
+# @File           : keyset.py
+# @IDE            : PyCharm
+# @desc           : 游標分頁与 OFFSET 分頁耗時对比
+
+"""
+按登錄日誌接口的方式（id 倒序）讀取第 1000 頁，对比 OFFSET 分頁与游標（seek）分頁的耗時
+
+运行：在 api 目錄下执行 python -m benchmarks.keyset [--rows 行數] [--page 頁碼] [--limit 每頁數量]
+數據庫使用 aiosqlite 临时文件，需要安装 tests/requirements.txt 中的依赖
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+from apps.vadmin.record.crud import LoginRecordDal
+from apps.vadmin.record.models import VadminLoginRecord
+from core.crud import DalBase
+from core.database import Base, RoutingSession
+
+
+async def seed(engine, rows: int) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for start in range(0, rows, 10000):
+            await conn.execute(insert(VadminLoginRecord), [
+                {"telephone": f"138{i:08d}", "status": True, "platform": "0", "login_method": "0",
+                 "ip": "127.0.0.1", "browser": "Chrome", "system": "Linux"}
+                for i in range(start, min(start + 10000, rows))
+            ])
+
+
+async def timed(func, repeat: int) -> tuple[float, list[int]]:
+    times, ids = [], []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        datas = await func()
+        times.append(time.perf_counter() - start)
+        ids = [i.id for i in datas]
+    return statistics.median(times), ids
+
+
+async def main(rows: int, page: int, limit: int, repeat: int) -> None:
+    path = os.path.join(tempfile.mkdtemp(), "keyset.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    factory = async_sessionmaker(bind=engine, class_=AsyncSession, sync_session_class=RoutingSession)
+    await seed(engine, rows)
+    # 第 page 頁之前最后一行的 id，等同于翻到第 page - 1 頁時返回的 next_cursor
+    cursor = DalBase.encode_cursor([rows - (page - 1) * limit + 1])
+
+    async with factory() as db:
+        dal = LoginRecordDal(db)
+
+        async def offset():
+            return await dal.get_datas(page=page, limit=limit, v_order="desc", v_return_objs=True)
+
+        async def keyset():
+            datas, _ = await dal.get_datas(
+                limit=limit, v_order="desc", v_keyset=True, v_cursor=cursor, v_return_objs=True
+            )
+            return datas
+
+        offset_time, offset_ids = await timed(offset, repeat)
+        keyset_time, keyset_ids = await timed(keyset, repeat)
+    await engine.dispose()
+    assert offset_ids == keyset_ids, "两种分頁方式结果不一致"
+
+    print(f"rows={rows} page={page} limit={limit} median of {repeat}")
+    print(f"offset: {offset_time * 1000:.2f}ms")
+    print(f"keyset: {keyset_time * 1000:.2f}ms ({offset_time / keyset_time:.1f}x)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.page, args.limit, args.repeat))
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/19 01:10
+# @File           : middleware.py
+# @IDE            : PyCharm
+# @desc           : 中間件吞吐量对比
+
+"""
+在只返回固定 JSON 的接口上，对比默认啟用的請求日誌与 JWT 刷新中間件
+使用原先 @app.middleware("http")（BaseHTTPMiddleware）实现与纯 ASGI 实现时的吞吐量，並以不加中間件作為基準
+
+直接以 ASGI 协议調用應用，不经过网络与 HTTP 客户端，日誌輸出已关闭，只测中間件本身的开销
+
+运行：在 api 目錄下执行 python -m benchmarks.middleware [請求數] [并發數]
+"""
+
+import asyncio
+import sys
+import time
+
+from fastapi import FastAPI, Request
+
+from core.logger import logger
+from core.middleware import RequestLogMiddleware, JWTRefreshMiddleware
+
+
+def legacy_write_request_log(request: Request, response) -> None:
+    http_version = f"http/{request.scope['http_version']}"
+    content_length = response.raw_headers[0][1]
+    process_time = response.headers["X-Process-Time"]
+    content = f"basehttp.log_message: '{request.method} {request.url} {http_version}' {response.status_code}" \
+              f"{response.charset} {content_length} {process_time}"
+    logger.info(content)
+
+
+def register_legacy_middlewares(app: FastAPI) -> None:
+    """
+    原实现，注册顺序与 settings.MIDDLEWARES 相同
+    """
+
+    @app.middleware("http")
+    async def request_log_middleware(request: Request, call_next):
+        start_time = time.time()
+        response = await call_next(request)
+        process_time = time.time() - start_time
+        response.headers["X-Process-Time"] = str(process_time)
+        legacy_write_request_log(request, response)
+        return response
+
+    @app.middleware("http")
+    async def jwt_refresh_middleware(request: Request, call_next):
+        response = await call_next(request)
+        refresh = request.scope.get('if-refresh', 0)
+        response.headers["if-refresh"] = str(refresh)
+        return response
+
+
+def register_asgi_middlewares(app: FastAPI) -> None:
+    app.add_middleware(RequestLogMiddleware)
+    app.add_middleware(JWTRefreshMiddleware)
+
+
+def create_app(register=None) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/ping")
+    async def ping():
+        return {"message": "pong"}
+
+    if register:
+        register(app)
+    return app
+
+
+async def call(app: FastAPI) -> None:
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": "/ping",
+        "raw_path": b"/ping",
+        "root_path": "",
+        "query_string": b"",
+        "headers": [(b"host", b"testserver")],
+        "client": ("127.0.0.1", 50000),
+        "server": ("testserver", 80),
+    }
+    messages = []
+    received = False
+
+    async def receive():
+        nonlocal received
+        if received:
+            # 与服務器一致，請求體讀完后阻塞直到客户端断开
+            await asyncio.Future()
+        received = True
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope, receive, send)
+    assert messages[0]["status"] == 200
+
+
+async def run(app: FastAPI, number: int, concurrency: int) -> float:
+    start = time.perf_counter()
+    for _ in range(0, number, concurrency):
+        await asyncio.gather(*[call(app) for _ in range(concurrency)])
+    return number / (time.perf_counter() - start)
+
+
+async def main(number: int, concurrency: int) -> None:
+    logger.remove()
+    apps = (
+        ("none", create_app()),
+        ("legacy", create_app(register_legacy_middlewares)),
+        ("asgi", create_app(register_asgi_middlewares))
+    )
+    # 预热，构建中間件栈
+    for _, app in apps:
+        await call(app)
+    print(f"requests={number}")
+    print(f"{'mode':<10}{'sequential (req/s)':>20}{f'{concurrency} concurrent (req/s)':>24}")
+    for name, app in apps:
+        sequential = await run(app, number, 1)
+        concurrent = await run(app, number, concurrency)
+        print(f"{name:<10}{sequential:>20.0f}{concurrent:>24.0f}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    ))
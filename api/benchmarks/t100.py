@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/19 00:50
+# @File           : t100.py
+# @IDE            : PyCharm
+# @desc           : T100 接口調用延迟对比
+
+"""
+对比每次調用都创建 httpx.AsyncClient（原实现，每次新建 TCP 连接）
+与 HttpClientManager 共享连接池（长连接复用）的 T100APIClient.fetch_data 調用延迟，
+分别统计顺序調用与并發調用的 p50 / p99
+
+运行：在 api 目錄下执行 python -m benchmarks.t100 [調用次數] [并發數] [服務端延迟毫秒]
+T100 接口使用 tests.fake_t100 在本地模擬
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from core.http_client import HttpClientManager
+from core.logger import logger
+from core.t100_api import T100APIClient
+from tests.fake_t100 import FakeT100Server
+
+
+async def timed_call(client: T100APIClient) -> float:
+    start = time.perf_counter()
+    result = await client.fetch_data("bd.mes.aps_run", "get_mo_list", idempotent=True)
+    assert result.success, result
+    return time.perf_counter() - start
+
+
+async def sequential(client: T100APIClient, number: int) -> list[float]:
+    return [await timed_call(client) for _ in range(number)]
+
+
+async def concurrent(client: T100APIClient, number: int, concurrency: int) -> list[float]:
+    latencies = []
+    for _ in range(0, number, concurrency):
+        latencies.extend(await asyncio.gather(*[timed_call(client) for _ in range(concurrency)]))
+    return latencies
+
+
+def percentile(values: list[float], percent: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent))]
+
+
+async def main(number: int, concurrency: int, delay: float) -> None:
+    # 每次調用的成功日誌會写文件与控制台，只测 HTTP 部分
+    logger.remove()
+    with FakeT100Server(delay=delay) as server:
+        client = T100APIClient()
+        client.server_ip = server.host
+        print(f"calls={number} concurrency={concurrency} server delay={delay * 1000:.0f}ms")
+        print(f"{'mode':<10}{'load':<12}{'p50 (ms)':>10}{'p99 (ms)':>10}{'mean (ms)':>11}{'connections':>13}")
+        for name in ("per-call", "pooled"):
+            if name == "pooled":
+                # 与應用启動事件相同，之后的調用使用共享客户端
+                HttpClientManager.open()
+                await timed_call(client)
+            for load, run in (
+                    ("sequential", lambda: sequential(client, number)),
+                    ("concurrent", lambda: concurrent(client, number, concurrency))
+            ):
+                before = server.connections
+                latencies = await run()
+                print(
+                    f"{name:<10}{load:<12}{percentile(latencies, 0.5) * 1000:>10.2f}"
+                    f"{percentile(latencies, 0.99) * 1000:>10.2f}{statistics.mean(latencies) * 1000:>11.2f}"
+                    f"{server.connections - before:>13}"
+                )
+        await HttpClientManager.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(main(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 50,
+        float(sys.argv[3]) / 1000 if len(sys.argv) > 3 else 0.002
+    ))
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 23:30
+# @File           : tree.py
+# @IDE            : PyCharm
+# @desc           : 部門树生成耗時对比
+
+"""
+对比 TreeBuilder 与原先逐节点过滤全部列表的递归实现（O(n²)）生成部門树的耗時
+
+运行：在 api 目錄下执行 python -m benchmarks.tree [节点數 ...] [--legacy-max 节点數]
+默认节点數為 1000 10000 50000。原实现在 10000 节点時已需要约两分钟，超过 --legacy-max（默认 10000）的节点數
+不再实际运行原实现，按 O(n²) 由最近一次实测耗時推算，结果前標注 ~
+"""
+
+import datetime
+import argparse
+import random
+import sys
+import time
+from typing import Callable
+
+from apps.vadmin.auth import models, schemas
+from apps.vadmin.auth.crud import DeptDal
+
+
+def generate_depts(number: int) -> list[models.VadminDept]:
+    """
+    随机生成部門，父部門總是 id 更小的部門，同级部門按 id 顺序排序，
+    原实现只排序前两层，按 id 生成的 order 可以保证两种实现的结果一致
+    """
+    rd = random.Random(number)
+    now = datetime.datetime.now()
+    depts = []
+    for i in range(1, number + 1):
+        parent_id = rd.randint(1, i - 1) if i > 10 else None
+        depts.append(models.VadminDept(
+            id=i, name=f"部門{i}", dept_key=f"d{i}", order=i, parent_id=parent_id, disabled=False,
+            create_datetime=now, update_datetime=now
+        ))
+    return depts
+
+
+def legacy_tree_list(depts: list, nodes) -> list:
+    data = []
+    for root in nodes:
+        router = schemas.DeptTreeListOut.model_validate(root)
+        sons = filter(lambda i: i.parent_id == root.id, depts)
+        router.children = legacy_tree_list(depts, sons)
+        data.append(router.model_dump())
+    return data
+
+
+def legacy_tree_options(depts: list, nodes) -> list:
+    data = []
+    for root in nodes:
+        router = {"value": root.id, "label": root.name, "order": root.order}
+        sons = filter(lambda i: i.parent_id == root.id, depts)
+        router["children"] = legacy_tree_options(depts, sons)
+        data.append(router)
+    return data
+
+
+def legacy_order(datas: list) -> list:
+    result = sorted(datas, key=lambda dept: dept["order"])
+    for item in result:
+        if item["children"]:
+            item["children"] = sorted(item["children"], key=lambda dept: dept["order"])
+    return result
+
+
+def legacy(generate: Callable) -> Callable[[list], list]:
+    return lambda depts: legacy_order(generate(depts, filter(lambda i: not i.parent_id, depts)))
+
+
+def measure(func: Callable[[list], list], depts: list) -> tuple[float, list]:
+    start = time.perf_counter()
+    result = func(depts)
+    return time.perf_counter() - start, result
+
+
+def main(sizes: list[int], legacy_max: int) -> None:
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), 10000))
+    cases = [
+        ("list", legacy(legacy_tree_list), DeptDal.generate_tree_list),
+        ("options", legacy(legacy_tree_options), DeptDal.generate_tree_options),
+    ]
+    # mode -> (节点數, 原实现耗時)
+    measured = {}
+    print(f"{'mode':<8}{'nodes':>8}{'legacy (s)':>14}{'builder (s)':>14}{'speedup':>10}")
+    for size in sorted(sizes):
+        depts = generate_depts(size)
+        for mode, old, new in cases:
+            new_time, new_result = measure(new, depts)
+            if size <= legacy_max or mode not in measured:
+                old_time, old_result = measure(old, depts)
+                assert old_result == new_result, f"{mode} {size}: 结果不一致"
+                measured[mode] = (size, old_time)
+                prefix = ""
+            else:
+                last_size, last_time = measured[mode]
+                old_time = last_time * (size / last_size) ** 2
+                prefix = "~"
+            print(f"{mode:<8}{size:>8}{prefix + f'{old_time:.3f}':>14}{new_time:>14.3f}{old_time / new_time:>9.0f}x")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument("sizes", nargs="*", type=int, default=[1000, 10000, 50000])
+    parser.add_argument("--legacy-max", type=int, default=10000)
+    args = parser.parse_args()
+    main(args.sizes, args.legacy_max)
@@ -11,31 +11,55 @@
 # sqlalchemy 增删改操作：https://docs.sqlalchemy.org/en/20/orm/queryguide/dml.html
 # sqlalchemy 1.x 语法迁移到 2.x :https://docs.sqlalchemy.org/en/20/changelog/migration_20.html#migration-20-query-usage
 
+import base64
 import datetime
+import decimal
+import hashlib
+import json
 import uuid
 
 from fastapi import HTTPException
 from fastapi.encoders import jsonable_encoder
-from sqlalchemy import func, delete, update, BinaryExpression, ScalarResult, select, false, insert, inspect
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import func, delete, update, BinaryExpression, ScalarResult, select, false, insert, inspect, and_, \
+    or_, table, column
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm.strategy_options import _AbstractLoad
 from starlette import status
 from core.exception import CustomException
 from sqlalchemy.sql.selectable import Select as SelectType
-from typing import Any, Union
+from typing import Any, Union, AsyncGenerator
 
 from utils.response import ErrorResponse
+from core.logger import logger
 
 
 class DalBase:
     # 倒叙
     ORDER_FIELD = ["desc", "descending"]
+    # 总數统计方式
+    COUNT_STRATEGIES = ["query", "window", "cache", "estimate"]
+    # 缓存总數過期時間（秒）
+    COUNT_CACHE_EXPIRE = 30
+    # 用于缓存总數的 redis 對象，在 redis 连接事件中挂載，未挂載時 cache 方式退化為 query
+    redis: Redis | None = None
 
     def __init__(self, db: AsyncSession = None, model: Any = None, schema: Any = None):
         self.db = db
         self.model = model
         self.schema = schema
 
+    @staticmethod
+    def read_bind(v_primary: bool = False) -> dict:
+        """
+        查詢使用的數據庫，傳给會話的 bind_arguments，由 core.database.RoutingSession 選擇主庫或從庫
+        只有只讀會話（db_read_getter）才會使用從庫，db_getter 會話始终使用主庫
+        :param v_primary: 是否强制使用主庫
+        :return:
+        """
+        return {"v_replica": not v_primary}
+
     async def get_data(
             self,
             data_id: Any = None,
@@ -50,6 +74,7 @@ class DalBase:
             v_return_none: bool = False,
             v_schema: Any = None,
             v_expire_all: bool = False,
+            v_primary: bool = False,
             **kwargs
     ) -> Any:
         """
@@ -66,6 +91,7 @@ class DalBase:
         :param v_return_none: 是否返回空 None，否认 抛出异常，默认抛出异常
         :param v_schema: 指定使用的序列化對象
         :param v_expire_all: 使當前會話（Session）中所有已加載的對象過期，确保您獲取的是數據庫中的最新數據，但可能會有性能损耗，博客：https://blog.csdn.net/k_genius/article/details/135490378。
+        :param v_primary: 是否强制使用主庫查詢，只讀會話中配置了從庫時默认使用從庫
         :param kwargs: 查詢参數
         :return: 默认返回 ORM 對象，如果存在 v_schema 则會返回 v_schema 结果
         """
@@ -78,7 +104,7 @@ class DalBase:
         if data_id is not None:
             v_start_sql = v_start_sql.where(self.model.id == data_id)
 
-        queryset: ScalarResult = await self.filter_core(
+        sql: SelectType = await self.filter_core(
             v_start_sql=v_start_sql,
             v_select_from=v_select_from,
             v_join=v_join,
@@ -87,9 +113,10 @@ class DalBase:
             v_where=v_where,
             v_order=v_order,
             v_order_field=v_order_field,
-            v_return_sql=False,
+            v_return_sql=True,
             **kwargs
         )
+        queryset: ScalarResult = await self.db.scalars(sql, bind_arguments=self.read_bind(v_primary))
 
         if v_options:
             data = queryset.unique().first()
@@ -125,6 +152,10 @@ class DalBase:
             v_schema: Any = None,
             v_distinct: bool = False,
             v_expire_all: bool = False,
+            v_keyset: bool = False,
+            v_cursor: str = None,
+            v_count_strategy: str = "query",
+            v_primary: bool = False,
             **kwargs
     ) -> Union[list[Any], ScalarResult, tuple]:
         """
@@ -145,6 +176,15 @@ class DalBase:
         :param v_schema: 指定使用的序列化對象
         :param v_distinct: 是否结果去重
         :param v_expire_all: 使當前會話（Session）中所有已加載的對象過期，确保您獲取的是數據庫中的最新數據，但可能會有性能损耗，博客：https://blog.csdn.net/k_genius/article/details/135490378。
+        :param v_keyset: 是否使用游標（seek）分頁，按 排序字段 + id 定位下一頁，不再使用 OFFSET，忽略 page 参數，
+                         返回结果末尾會追加下一頁游標，没有下一頁時為 None，不支持 v_return_scalars，v_start_sql 中的排序會被清除
+        :param v_cursor: 游標分頁時上一頁返回的游標，為空時獲取第一頁
+        :param v_count_strategy: v_return_count 時总數的统计方式：
+                                 query：单独执行一次 count 查詢（默认）
+                                 window：使用 COUNT(*) OVER() 与分頁數據同一条 SQL 返回，去重、游標分頁、v_return_scalars 時退化為 query
+                                 cache：按查詢條件缓存总數到 redis，COUNT_CACHE_EXPIRE 秒内翻頁不再重复统计
+                                 estimate：MySQL 且無任何過滤條件時使用表统计信息中的近似行數，否则同 cache
+        :param v_primary: 是否强制使用主庫查詢，只讀會話中配置了從庫時默认使用從庫
         :param kwargs: 查詢参數，使用的是自定义表达式
         :return: 返回值优先级：v_return_scalars > v_return_objs > v_schema
         """
@@ -167,16 +207,33 @@ class DalBase:
         if v_distinct:
             sql = sql.distinct()
 
+        if v_count_strategy not in self.COUNT_STRATEGIES:
+            raise CustomException(f"無效的总數统计方式：{v_count_strategy}")
+
+        bind_arguments = self.read_bind(v_primary)
+
+        if v_return_count and v_count_strategy == "window" and not (v_distinct or v_keyset or v_return_scalars):
+            result, count = await self.__get_datas_window(sql, page, limit, v_options, bind_arguments)
+            if v_return_objs:
+                return result, count
+            return [await self.out_dict(i, v_schema=v_schema) for i in result], count
+
         count = 0
         if v_return_count:
-            count_sql = select(func.count()).select_from(sql.alias())
-            count_queryset = await self.db.execute(count_sql)
-            count = count_queryset.one()[0]
+            unfiltered = not (v_start_sql is not None or v_select_from or v_join or v_outer_join or v_where
+                              or self.__dict_filter(**kwargs))
+            count = await self.__get_count(sql, v_count_strategy, unfiltered, bind_arguments)
+
+        if v_keyset:
+            return await self.__get_datas_keyset(
+                sql, limit, v_cursor, v_order, v_order_field, v_options, v_return_count, count, v_return_objs,
+                v_schema, bind_arguments
+            )
 
         if limit != 0:
             sql = sql.offset((page - 1) * limit).limit(limit)
 
-        queryset = await self.db.scalars(sql)
+        queryset = await self.db.scalars(sql, bind_arguments=bind_arguments)
 
         if v_return_scalars:
             if v_return_count:
@@ -198,12 +255,284 @@ class DalBase:
             return datas, count
         return datas
 
+    async def __get_datas_window(
+            self,
+            sql: SelectType,
+            page: int,
+            limit: int,
+            v_options: list[_AbstractLoad] | None,
+            bind_arguments: dict
+    ) -> tuple[list[Any], int]:
+        """
+        使用 COUNT(*) OVER() 在同一条 SQL 中返回分頁數據与過滤后的总數
+        窗口函數在 LIMIT 之前计算，所以得到的是過滤后的总數
+        """
+        sql = sql.add_columns(func.count().over().label("v_total_count"))
+        if limit != 0:
+            sql = sql.offset((page - 1) * limit).limit(limit)
+        queryset = await self.db.execute(sql, bind_arguments=bind_arguments)
+        rows = queryset.unique().all() if v_options else queryset.all()
+        if rows:
+            return [row[0] for row in rows], rows[0][-1]
+        if page <= 1:
+            return [], 0
+        # 超出最后一頁時没有数据行，無法通過窗口函數得到总數
+        count_sql = select(func.count()).select_from(sql.limit(None).offset(None).alias())
+        count_queryset = await self.db.execute(count_sql, bind_arguments=bind_arguments)
+        return [], count_queryset.one()[0]
+
+    async def __get_count(self, sql: SelectType, strategy: str, unfiltered: bool, bind_arguments: dict) -> int:
+        """
+        獲取過滤后的总數
+        :param sql: 過滤后的 sql
+        :param strategy: 统计方式
+        :param unfiltered: 是否没有任何過滤條件
+        :param bind_arguments: 查詢使用的數據庫
+        """
+        dialect = self.db.get_bind().dialect
+        if strategy == "estimate" and unfiltered and dialect.name == "mysql":
+            # 使用 Select 而不是文本 SQL，只讀會話中同样会被路由到從庫
+            tables = table(
+                "TABLES", column("TABLE_ROWS"), column("TABLE_SCHEMA"), column("TABLE_NAME"),
+                schema="information_schema"
+            )
+            estimate_sql = select(tables.c.TABLE_ROWS).where(
+                tables.c.TABLE_SCHEMA == func.database(),
+                tables.c.TABLE_NAME == self.model.__tablename__
+            )
+            queryset = await self.db.execute(estimate_sql, bind_arguments=bind_arguments)
+            estimate = queryset.scalar()
+            if estimate is not None:
+                return int(estimate)
+        count_sql = select(func.count()).select_from(sql.alias())
+        if strategy in ("cache", "estimate") and self.redis is not None:
+            compiled = count_sql.compile(dialect=dialect)
+            signature = hashlib.sha1(f"{compiled}|{sorted(compiled.params.items(), key=str)}".encode()).hexdigest()
+            key = f"dal_count:{self.model.__tablename__}:{signature}"
+            try:
+                cache = await self.redis.get(key)
+                if cache is not None:
+                    return int(cache)
+            except RedisError as e:
+                logger.error(f"讀取总數缓存失敗：{e}")
+            count_queryset = await self.db.execute(count_sql, bind_arguments=bind_arguments)
+            count = count_queryset.one()[0]
+            try:
+                await self.redis.set(key, count, ex=self.COUNT_CACHE_EXPIRE)
+            except RedisError as e:
+                logger.error(f"写入总數缓存失敗：{e}")
+            return count
+        count_queryset = await self.db.execute(count_sql, bind_arguments=bind_arguments)
+        return count_queryset.one()[0]
+
+    async def __get_datas_keyset(
+            self,
+            sql: SelectType,
+            limit: int,
+            v_cursor: str | None,
+            v_order: str | None,
+            v_order_field: str | None,
+            v_options: list[_AbstractLoad] | None,
+            v_return_count: bool,
+            count: int,
+            v_return_objs: bool,
+            v_schema: Any,
+            bind_arguments: dict
+    ) -> tuple:
+        """
+        游標（seek）分頁，排序規則与 filter_core 保持一致：排序字段 + id
+        v_start_sql 中自带的排序會被清除，游標只能按 排序字段 + id 定位，其他排序會導致翻頁時数据重复或遗漏
+        :return: (數據列表, 下一頁游標) 或 (數據列表, 总數, 下一頁游標)
+        """
+        columns = self.__keyset_columns(v_order_field)
+        desc = v_order in self.ORDER_FIELD
+        sql = sql.order_by(None).order_by(*[column.desc() if desc else column for column in columns])
+        if v_cursor:
+            sql = sql.where(self.__keyset_condition(columns, self.decode_cursor(v_cursor), desc))
+        if limit != 0:
+            # 多查詢一条用于判断是否存在下一頁
+            sql = sql.limit(limit + 1)
+
+        queryset = await self.db.scalars(sql, bind_arguments=bind_arguments)
+        result = list(queryset.unique().all() if v_options else queryset.all())
+
+        next_cursor = None
+        if limit != 0 and len(result) > limit:
+            result = result[:limit]
+            last = result[-1]
+            next_cursor = self.encode_cursor([getattr(last, column.key) for column in columns])
+
+        if v_return_objs:
+            datas = result
+        else:
+            datas = [await self.out_dict(i, v_schema=v_schema) for i in result]
+        if v_return_count:
+            return datas, count, next_cursor
+        return datas, next_cursor
+
+    def __keyset_columns(self, v_order_field: str | None) -> list:
+        """
+        游標分頁使用的排序列，id 保证顺序唯一
+        """
+        if v_order_field and v_order_field != "id":
+            return [getattr(self.model, v_order_field), self.model.id]
+        return [self.model.id]
+
+    @staticmethod
+    def __keyset_condition(columns: list, values: list, desc: bool) -> Any:
+        """
+        生成 seek 條件，展开為 OR 形式以便使用 (排序字段, id) 上的索引
+        (a > x) OR (a = x AND id > y)，倒序時為 <
+        MySQL 中 NULL 在正序時排在最前，倒序時排在最后
+        """
+        if len(columns) != len(values):
+            raise CustomException("無效的分頁游標")
+        if len(columns) == 1:
+            return columns[0] < values[0] if desc else columns[0] > values[0]
+        column, pk = columns
+        value, pk_value = values
+        after_pk = pk < pk_value if desc else pk > pk_value
+        if value is None:
+            if desc:
+                return and_(column.is_(None), after_pk)
+            return or_(column.isnot(None), and_(column.is_(None), after_pk))
+        after_value = column < value if desc else column > value
+        condition = or_(after_value, and_(column == value, after_pk))
+        if desc:
+            condition = or_(condition, column.is_(None))
+        return condition
+
+    @staticmethod
+    def encode_cursor(values: list) -> str:
+        """
+        生成游標，時間、Decimal、UUID 類型单独標记以便还原，其他無法还原的類型不支持作為游標分頁的排序字段
+        """
+        items = []
+        for value in values:
+            if isinstance(value, datetime.datetime):
+                value = {"$dt": value.isoformat()}
+            elif isinstance(value, datetime.date):
+                value = {"$d": value.isoformat()}
+            elif isinstance(value, datetime.time):
+                value = {"$t": value.isoformat()}
+            elif isinstance(value, decimal.Decimal):
+                value = {"$dec": str(value)}
+            elif isinstance(value, uuid.UUID):
+                value = {"$uuid": str(value)}
+            elif value is not None and not isinstance(value, (str, int, float)):
+                raise CustomException(f"不支持使用 {type(value).__name__} 類型的字段進行游標分頁")
+            items.append(value)
+        return base64.urlsafe_b64encode(json.dumps(items).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str) -> list:
+        """
+        解析游標
+        """
+        try:
+            items = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (ValueError, TypeError):
+            raise CustomException("無效的分頁游標")
+        if not isinstance(items, list):
+            raise CustomException("無效的分頁游標")
+        values = []
+        try:
+            for value in items:
+                if isinstance(value, dict) and "$dt" in value:
+                    value = datetime.datetime.fromisoformat(value["$dt"])
+                elif isinstance(value, dict) and "$d" in value:
+                    value = datetime.date.fromisoformat(value["$d"])
+                elif isinstance(value, dict) and "$t" in value:
+                    value = datetime.time.fromisoformat(value["$t"])
+                elif isinstance(value, dict) and "$dec" in value:
+                    value = decimal.Decimal(value["$dec"])
+                elif isinstance(value, dict) and "$uuid" in value:
+                    value = uuid.UUID(value["$uuid"])
+                values.append(value)
+        except (ValueError, TypeError, decimal.InvalidOperation):
+            raise CustomException("無效的分頁游標")
+        return values
+
+    async def stream_datas(
+            self,
+            page: int = 1,
+            limit: int = 0,
+            chunk_size: int = 1000,
+            v_start_sql: SelectType = None,
+            v_select_from: list[Any] = None,
+            v_join: list[Any] = None,
+            v_outer_join: list[Any] = None,
+            v_options: list[_AbstractLoad] = None,
+            v_where: list[BinaryExpression] = None,
+            v_order: str = None,
+            v_order_field: str = None,
+            v_primary: bool = False,
+            **kwargs
+    ) -> AsyncGenerator[list[Any], None]:
+        """
+        按游標（排序字段 + id）分批獲取數據對象，适用于导出等大量數據场景，内存占用只与 chunk_size 有关
+        每批是一次普通的缓冲查詢，v_options 中的 selectinload 在該批查詢完成后执行，
+        不使用服務端游標：MySQL 驱動在服務端游標未讀完時不能在同一连接上執行其他查詢
+        注意：v_options 中不能使用 joinedload 加載一對多/多對多關係，請使用 selectinload；v_start_sql 中自带的排序會被清除
+        :param page: 頁碼
+        :param limit: 當前頁數據量，默认為 0 獲取全部數據
+        :param chunk_size: 每批數據量
+        :param v_start_sql: 初始 sql
+        :param v_select_from: 用于指定查詢从哪个表开始，通常与 .join() 等方法一起使用。
+        :param v_join: 創建内连接（INNER JOIN）操作，返回两个表中满足连接條件的交集。
+        :param v_outer_join: 用于創建外连接（OUTER JOIN）操作，返回两个表中满足连接條件的並集，包括未匹配的行，並用 NULL 值填充。
+        :param v_options: 用于為查詢添加附加選項，如预加載、延迟加載等。
+        :param v_where: 當前表查詢條件，原始表达式
+        :param v_order: 排序，默认正序，為 desc 是倒叙
+        :param v_order_field: 排序字段
+        :param v_primary: 是否强制使用主庫查詢，只讀會話中配置了從庫時默认使用從庫
+        :param kwargs: 查詢参數，使用的是自定义表达式
+        :return: 异步迭代，每次返回一批數據對象
+        """
+        sql: SelectType = await self.filter_core(
+            v_start_sql=v_start_sql,
+            v_select_from=v_select_from,
+            v_join=v_join,
+            v_outer_join=v_outer_join,
+            v_options=v_options,
+            v_where=v_where,
+            v_order=v_order,
+            v_order_field=v_order_field,
+            v_return_sql=True,
+            **kwargs
+        )
+        columns = self.__keyset_columns(v_order_field)
+        desc = v_order in self.ORDER_FIELD
+        sql = sql.order_by(None).order_by(*[column.desc() if desc else column for column in columns])
+        bind_arguments = self.read_bind(v_primary)
+        # 指定頁時只有第一批需要跳過前面的數據，之后按游標繼續讀取
+        offset = (page - 1) * limit if limit != 0 else 0
+        remain = limit
+        values = None
+        while True:
+            size = min(chunk_size, remain) if limit != 0 else chunk_size
+            chunk_sql = sql.limit(size)
+            if values is None:
+                chunk_sql = chunk_sql.offset(offset) if offset else chunk_sql
+            else:
+                chunk_sql = chunk_sql.where(self.__keyset_condition(columns, values, desc))
+            queryset = await self.db.scalars(chunk_sql, bind_arguments=bind_arguments)
+            chunk = list(queryset.unique().all() if v_options else queryset.all())
+            if not chunk:
+                return
+            yield chunk
+            remain -= len(chunk)
+            if len(chunk) < size or (limit != 0 and remain <= 0):
+                return
+            values = [getattr(chunk[-1], column.key) for column in columns]
+
     async def get_count(
             self,
             v_select_from: list[Any] = None,
             v_join: list[Any] = None,
             v_outer_join: list[Any] = None,
             v_where: list[BinaryExpression] = None,
+            v_primary: bool = False,
             **kwargs
     ) -> int:
         """
@@ -212,6 +541,7 @@ class DalBase:
         :param v_join: 創建内连接（INNER JOIN）操作，返回两个表中满足连接條件的交集。
         :param v_outer_join: 用于創建外连接（OUTER JOIN）操作，返回两个表中满足连接條件的並集，包括未匹配的行，並用 NULL 值填充。
         :param v_where: 當前表查詢條件，原始表达式
+        :param v_primary: 是否强制使用主庫查詢，只讀會話中配置了從庫時默认使用從庫
         :param kwargs: 查詢参數
         """
         v_start_sql = select(func.count(self.model.id))
@@ -224,7 +554,7 @@ class DalBase:
             v_return_sql=True,
             **kwargs
         )
-        queryset = await self.db.execute(sql)
+        queryset = await self.db.execute(sql, bind_arguments=self.read_bind(v_primary))
         return queryset.one()[0]
 
     async def create_data(
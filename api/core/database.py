@@ -10,13 +10,16 @@
 安装： pip install sqlalchemy[asyncio]
 官方文檔：https://docs.sqlalchemy.org/en/20/intro.html#installation
 """
-from typing import AsyncGenerator
+from typing import AsyncGenerator, Callable, Awaitable
 from redis.asyncio import Redis
+from sqlalchemy import event, Select, Insert, Update, Delete
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker, AsyncAttrs
-from sqlalchemy.orm import DeclarativeBase, declared_attr
-from application.settings import SQLALCHEMY_DATABASE_URL, REDIS_DB_ENABLE, MONGO_DB_ENABLE
+from sqlalchemy.orm import DeclarativeBase, declared_attr, Session
+from application.settings import SQLALCHEMY_DATABASE_URL, SQLALCHEMY_REPLICA_DATABASE_URL, REDIS_DB_ENABLE, \
+    MONGO_DB_ENABLE
 from fastapi import Request
 from core.exception import CustomException
+from core.logger import logger
 from motor.motor_asyncio import AsyncIOMotorDatabase
 
 # 官方文檔：https://docs.sqlalchemy.org/en/20/orm/extensions/asyncio.html#sqlalchemy.ext.asyncio.create_async_engine
@@ -54,13 +57,111 @@ async_engine = create_async_engine(
     connect_args={}
 )
 
+# 創建只讀從庫连接，未配置時所有查詢都使用主庫
+async_replica_engine = create_async_engine(
+    SQLALCHEMY_REPLICA_DATABASE_URL,
+    echo=False,
+    echo_pool=False,
+    pool_pre_ping=True,
+    pool_recycle=3600,
+    pool_size=5,
+    max_overflow=5,
+    connect_args={}
+) if SQLALCHEMY_REPLICA_DATABASE_URL else None
+
+
+class RoutingSession(Session):
+    """
+    讀写分离會話
+
+    只有只讀會話（db_read_getter）才會使用從庫，且只有在執行時通過 bind_arguments={"v_replica": True} 指定的查詢才會使用，
+    DalBase 的 get_data、get_datas、get_count 默认会指定，其他查詢不受影响。
+
+    db_getter 會話中的所有语句都使用主庫，写入前的查重、加載待修改對象等查詢不會讀到從庫中延迟的旧數據。
+    只讀會話中一旦有写入（flush 或执行 insert、update、delete 语句），之后的查詢也全部使用主庫。
+    """
+
+    def get_bind(self, mapper=None, *, clause=None, v_replica: bool = False, **kw):
+        if isinstance(clause, (Insert, Update, Delete)):
+            # 不使用 do_orm_execute 事件标记：注册了該事件后，yield_per 流式查詢无法与 selectinload 一起使用
+            self.info["v_written"] = True
+        elif (
+                v_replica
+                and async_replica_engine is not None
+                and self.info.get("v_read_only")
+                and not self.info.get("v_written")
+                and not self._flushing
+                and isinstance(clause, Select)
+        ):
+            return async_replica_engine.sync_engine
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _mark_written_after_flush(session: Session, flush_context) -> None:
+    session.info["v_written"] = True
+
+
+def add_commit_callback(session: AsyncSession, func: Callable[..., Awaitable], *args) -> None:
+    """
+    注册事務提交成功后執行的异步回调，事務回滚時丢弃
+
+    用于缓存失效、消息发布等需要与數據庫保持一致的操作：在提交前执行，其他请求可能讀到新的缓存版本却加載到尚未提交的旧數據；
+    提交失败時缓存与消息又已经生效。回调在 db_getter 中提交完成后按注册顺序依次执行。
+    :param session:
+    :param func: 异步函數
+    :param args: 調用参數
+    :return:
+    """
+    session.sync_session.info.setdefault("v_pending_callbacks", []).append((func, args))
+
+
+async def run_commit_callbacks(session: AsyncSession) -> None:
+    """
+    執行已提交事務注册的回调，回调中的異常只记錄日誌，不影响已完成的请求
+    :param session:
+    :return:
+    """
+    callbacks = session.sync_session.info.pop("v_committed_callbacks", None)
+    for func, args in callbacks or ():
+        try:
+            await func(*args)
+        except Exception as e:
+            logger.exception(f"執行事務提交回调失败：{e}")
+
+
+@event.listens_for(Session, "after_commit")
+def _commit_callbacks(session: Session) -> None:
+    callbacks = session.info.pop("v_pending_callbacks", None)
+    if callbacks:
+        session.info.setdefault("v_committed_callbacks", []).extend(callbacks)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_callbacks(session: Session, previous_transaction) -> None:
+    if not previous_transaction.nested:
+        session.info.pop("v_pending_callbacks", None)
+
+
 # 創建數據庫會話
 session_factory = async_sessionmaker(
     autocommit=False,
     autoflush=False,
     bind=async_engine,
     expire_on_commit=True,
-    class_=AsyncSession
+    class_=AsyncSession,
+    sync_session_class=RoutingSession
+)
+
+# 創建只讀數據庫會話，不自動 flush，不在提交后使對象过期，配置了從庫時查詢使用從庫
+read_session_factory = async_sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=async_engine,
+    expire_on_commit=False,
+    class_=AsyncSession,
+    sync_session_class=RoutingSession,
+    info={"v_read_only": True}
 )
 
 
@@ -100,6 +201,22 @@ async def db_getter() -> AsyncGenerator[AsyncSession, None]:
         # 創建一个新的事務，半自動 commit
         async with session.begin():
             yield session
+        await run_commit_callbacks(session)
+
+
+async def db_read_getter() -> AsyncGenerator[AsyncSession, None]:
+    """
+    獲取只讀數據庫會話
+
+    用于只查询不修改數據的接口，不開啟显式事務，也就没有请求结束時的 COMMIT。
+    會話在第一次执行查询時才从连接池獲取连接，关闭會話時归还，
+    纯讀取的请求占用连接的時間更短、与數據庫的往返次數更少。
+
+    在此會話中的修改不會被提交，会在关闭時回滚，需要写入數據的接口請使用 db_getter。
+    配置了從庫（SQLALCHEMY_REPLICA_DATABASE_URL）時，DalBase 的查詢默认使用從庫，可能讀到同步延迟的數據。
+    """
+    async with read_session_factory() as session:
+        yield session
 
 
 def redis_getter(request: Request) -> Redis:
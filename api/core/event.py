@@ -9,14 +9,22 @@
 
 from fastapi import FastAPI
 from motor.motor_asyncio import AsyncIOMotorClient
-from application.settings import REDIS_DB_URL, MONGO_DB_URL, MONGO_DB_NAME, EVENTS
+from application.settings import REDIS_DB_URL, MONGO_DB_URL, MONGO_DB_NAME, EVENTS, OPERATION_RECORD_QUEUE_SIZE, \
+    OPERATION_RECORD_BATCH_SIZE, OPERATION_RECORD_FLUSH_INTERVAL, OPERATION_RECORD_OVERFLOW, \
+    OPERATION_RECORD_BLOCK_TIMEOUT, METRICS_ENABLE
 from utils.cache import Cache
+from utils.principal_cache import PrincipalCache
+from core.crud import DalBase
 from redis import asyncio as aioredis
 from redis.exceptions import AuthenticationError, TimeoutError, RedisError
 from contextlib import asynccontextmanager
 from utils.tools import import_modules_async
 from sqlalchemy.exc import ProgrammingError
 from core.logger import logger
+from core.operation_record import OperationRecordWriter
+from core.http_client import HttpClientManager
+from utils.bpm_wsdl import BpmClientManager
+from core.metrics import MongoPoolListener
 
 
 @asynccontextmanager
@@ -26,7 +34,8 @@ async def lifespan(app: FastAPI):
 
     yield
 
-    await import_modules_async(EVENTS, "全局事件", app=app, status=False)
+    # 关闭時按相反顺序执行，确保依赖 mongo、redis 的事件先于连接关闭
+    await import_modules_async(EVENTS[::-1], "全局事件", app=app, status=False)
 
 
 async def connect_redis(app: FastAPI, status: bool):
@@ -79,6 +88,9 @@ async def connect_redis(app: FastAPI, status: bool):
             raise TimeoutError(f"Redis ＝連接超時，地址或者端口錯誤: {e}")
         except RedisError as e:
             raise RedisError(f"Redis 連接失敗: {e}")
+        PrincipalCache.init(rd)
+        DalBase.redis = rd
+        Cache.start_listener(rd)
         try:
             await Cache(app.state.redis).cache_tab_names()
         except ProgrammingError as e:
@@ -86,6 +98,9 @@ async def connect_redis(app: FastAPI, status: bool):
             print(f"sqlalchemy.exc.ProgrammingError: {e}")
     else:
         print("Redis 連接關閉")
+        await Cache.stop_listener()
+        PrincipalCache.init(None)
+        DalBase.redis = None
         await app.state.redis.close()
 
 
@@ -105,7 +120,8 @@ async def connect_mongo(app: FastAPI, status: bool):
             MONGO_DB_URL,
             maxPoolSize=10,
             minPoolSize=10,
-            serverSelectionTimeoutMS=5000
+            serverSelectionTimeoutMS=5000,
+            event_listeners=[MongoPoolListener()] if METRICS_ENABLE else []
         )
         app.state.mongo_client = client
         app.state.mongo = client[MONGO_DB_NAME]
@@ -119,3 +135,53 @@ async def connect_mongo(app: FastAPI, status: bool):
     else:
         print("MongoDB 連接關閉")
         app.state.mongo_client.close()
+
+
+async def operation_record_writer(app: FastAPI, status: bool):
+    """
+    启動操作日誌异步批量写入任務，關閉時写入隊列中剩余的记錄
+    依赖 connect_mongo，需要配置在其之后
+    :param app:
+    :param status:
+    :return:
+    """
+    if status:
+        writer = OperationRecordWriter(
+            app.state.mongo["operation_record"],
+            max_size=OPERATION_RECORD_QUEUE_SIZE,
+            batch_size=OPERATION_RECORD_BATCH_SIZE,
+            flush_interval=OPERATION_RECORD_FLUSH_INTERVAL,
+            overflow=OPERATION_RECORD_OVERFLOW,
+            block_timeout=OPERATION_RECORD_BLOCK_TIMEOUT
+        )
+        writer.start()
+        app.state.operation_record_writer = writer
+    else:
+        print("操作日誌寫入任務關閉")
+        await app.state.operation_record_writer.stop()
+
+
+async def http_client(app: FastAPI, status: bool):
+    """
+    启用外部接口共享 HTTP 连接池，關閉時释放所有连接
+    :param app:
+    :param status:
+    :return:
+    """
+    if status:
+        HttpClientManager.open()
+    else:
+        print("外部接口 HTTP 連接池關閉")
+        await HttpClientManager.close()
+
+
+async def bpm_client(app: FastAPI, status: bool):
+    """
+    BPM WebService 客户端在首次調用時創建，關閉時等待執行中的調用完成並释放线程池与连接
+    :param app:
+    :param status:
+    :return:
+    """
+    if not status:
+        print("BPM WebService 客户端關閉")
+        await BpmClientManager.close()
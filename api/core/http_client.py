@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 16:00
+# @File           : http_client.py
+# @IDE            : PyCharm
+# @desc           : 應用级共享 HTTP 连接池
+
+"""
+对外部系統（如 T100 ERP）的 HTTP 請求不再每次創建新的 httpx.AsyncClient，
+而是按目标主机共享一个长连接客户端，复用 TCP 连接，省去每次請求的握手耗時。
+
+客户端在 core.event.http_client 全局事件中創建，應用關閉時统一關閉。
+每个主机独立的客户端即独立的连接池，HTTP_CLIENT_MAX_CONNECTIONS 即為每个主机的连接數上限。
+
+重试策略：
+连接失敗（請求尚未發出）總是重试
+讀取超時、连接中断、502/503/504 仅在請求為幂等時重试
+重试間隔為指數退避加随机抖动，避免大量請求同時重试
+"""
+
+import asyncio
+import random
+from urllib.parse import urlsplit
+import httpx
+from application.settings import HTTP_CLIENT_MAX_CONNECTIONS, HTTP_CLIENT_MAX_KEEPALIVE, \
+    HTTP_CLIENT_KEEPALIVE_EXPIRY, HTTP_CLIENT_CONNECT_TIMEOUT, HTTP_CLIENT_READ_TIMEOUT, HTTP_CLIENT_RETRIES, \
+    HTTP_CLIENT_BACKOFF
+from core.logger import logger
+
+
+class HttpClientManager:
+
+    RETRY_STATUS = (502, 503, 504)
+
+    _clients: dict[str, httpx.AsyncClient] = {}
+    _opened = False
+
+    @classmethod
+    def open(cls) -> None:
+        """
+        允许創建共享客户端，在應用启動事件中調用
+        :return:
+        """
+        cls._opened = True
+
+    @classmethod
+    async def close(cls) -> None:
+        """
+        關閉所有共享客户端，在應用關閉事件中調用
+        :return:
+        """
+        cls._opened = False
+        clients, cls._clients = cls._clients, {}
+        for client in clients.values():
+            await client.aclose()
+
+    @classmethod
+    def get_client(cls, url: str) -> httpx.AsyncClient | None:
+        """
+        獲取目标主机的共享客户端
+        :param url: 請求地址
+        :return: 未启用時（如脚本中直接調用）返回 None
+        """
+        if not cls._opened:
+            return None
+        parts = urlsplit(url)
+        key = f"{parts.scheme}://{parts.netloc}"
+        client = cls._clients.get(key)
+        if client is None:
+            client = cls.create_client()
+            cls._clients[key] = client
+        return client
+
+    @staticmethod
+    def create_client() -> httpx.AsyncClient:
+        """
+        創建客户端，连接与讀取分别设置超時時間
+        :return:
+        """
+        return httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=HTTP_CLIENT_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_CLIENT_MAX_KEEPALIVE,
+                keepalive_expiry=HTTP_CLIENT_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                HTTP_CLIENT_READ_TIMEOUT,
+                connect=HTTP_CLIENT_CONNECT_TIMEOUT,
+                pool=HTTP_CLIENT_CONNECT_TIMEOUT
+            )
+        )
+
+    @classmethod
+    async def request(
+            cls,
+            method: str,
+            url: str,
+            idempotent: bool = False,
+            retries: int = HTTP_CLIENT_RETRIES,
+            **kwargs
+    ) -> httpx.Response:
+        """
+        使用共享客户端發送請求，失敗時按重试策略重试
+        :param method: 請求方式
+        :param url: 請求地址
+        :param idempotent: 請求是否幂等，幂等請求在讀取失敗時也會重试
+        :param retries: 最大重试次數
+        :param kwargs: httpx 請求参數
+        :return:
+        """
+        client = cls.get_client(url)
+        if client is None:
+            async with cls.create_client() as client:
+                return await cls.__request(client, method, url, idempotent, retries, **kwargs)
+        return await cls.__request(client, method, url, idempotent, retries, **kwargs)
+
+    @classmethod
+    async def __request(
+            cls,
+            client: httpx.AsyncClient,
+            method: str,
+            url: str,
+            idempotent: bool,
+            retries: int,
+            **kwargs
+    ) -> httpx.Response:
+        attempt = 0
+        while True:
+            try:
+                response = await client.request(method, url, **kwargs)
+                if not (idempotent and response.status_code in cls.RETRY_STATUS and attempt < retries):
+                    return response
+                error = f"HTTP {response.status_code}"
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                if attempt >= retries:
+                    raise
+                error = repr(e)
+            except (httpx.ReadTimeout, httpx.ReadError, httpx.RemoteProtocolError) as e:
+                if not idempotent or attempt >= retries:
+                    raise
+                error = repr(e)
+            attempt += 1
+            delay = random.uniform(0, HTTP_CLIENT_BACKOFF * 2 ** attempt)
+            logger.warning(f"{method} {url} 請求失敗：{error}，{delay:.2f} 秒后第 {attempt} 次重试")
+            await asyncio.sleep(delay)
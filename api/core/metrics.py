@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 18:00
+# @File           : metrics.py
+# @IDE            : PyCharm
+# @desc           : Prometheus 運行指標
+
+"""
+依赖安装：pip install prometheus-client
+官方文檔：https://prometheus.github.io/client_python/
+
+請求耗時与并发數在 core.middleware.MetricsMiddleware 中记錄，路由標签使用路由模板（如 /vadmin/auth/users/{data_id}），
+状態碼按 2xx、4xx 等分類，標签组合數量有限，每个標签组合的指標對象創建后缓存复用。
+
+连接池、隊列等状態在每次抓取時即時读取，不在請求中额外记錄：
+MySQL：core.database 主庫与從庫连接池的已检出、溢出连接數
+Redis：app.state.redis 连接池的已創建、使用中连接數
+MongoDB：通過 pymongo 连接池事件监听统计的连接數，需要在創建客户端時傳入 MongoPoolListener
+后台隊列：操作日誌写入隊列、密碼计算線程池
+
+使用多進程（如 gunicorn 多 worker）部署時，每个進程单独统计，抓取到的是處理該請求的進程的數據。
+"""
+
+from fastapi import FastAPI
+from prometheus_client import CollectorRegistry, Histogram, Gauge, Counter, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client.core import GaugeMetricFamily, CounterMetricFamily
+from pymongo import monitoring
+from core.database import async_engine, async_replica_engine
+from utils.password import PasswordHasher
+
+REGISTRY = CollectorRegistry()
+
+REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "請求處理耗時（秒）",
+    ["method", "route", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+    registry=REGISTRY
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "正在處理的請求數",
+    registry=REGISTRY
+)
+MONGO_POOL_CONNECTIONS = Gauge(
+    "mongo_pool_connections",
+    "MongoDB 连接池已創建的连接數",
+    ["address"],
+    registry=REGISTRY
+)
+MONGO_POOL_CHECKED_OUT = Gauge(
+    "mongo_pool_checked_out_connections",
+    "MongoDB 连接池使用中的连接數",
+    ["address"],
+    registry=REGISTRY
+)
+MONGO_POOL_CHECKOUT_FAILED = Counter(
+    "mongo_pool_checkout_failed",
+    "MongoDB 连接池獲取连接失敗次數",
+    ["address", "reason"],
+    registry=REGISTRY
+)
+
+CONTENT_TYPE = CONTENT_TYPE_LATEST
+
+
+def generate() -> bytes:
+    """
+    生成 Prometheus 文本格式的指標數據
+    :return:
+    """
+    return generate_latest(REGISTRY)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """
+    MongoDB 连接池事件监听，pymongo 没有提供连接池使用情况的查询接口，只能通過事件统计
+    """
+
+    @staticmethod
+    def address(event) -> str:
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self.address(event)).inc()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        MONGO_POOL_CONNECTIONS.labels(self.address(event)).dec()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        MONGO_POOL_CHECKOUT_FAILED.labels(self.address(event), str(event.reason)).inc()
+
+    def connection_checked_out(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(self.address(event)).inc()
+
+    def connection_checked_in(self, event):
+        MONGO_POOL_CHECKED_OUT.labels(self.address(event)).dec()
+
+
+class RuntimeCollector:
+    """
+    抓取時即時读取连接池与后台隊列状態
+    """
+
+    def __init__(self, app: FastAPI):
+        self.app = app
+
+    def collect(self):
+        yield from self.collect_database()
+        yield from self.collect_redis()
+        yield from self.collect_queues()
+
+    @staticmethod
+    def collect_database():
+        engines = [("primary", async_engine)]
+        if async_replica_engine is not None:
+            engines.append(("replica", async_replica_engine))
+        size = GaugeMetricFamily("db_pool_size", "MySQL 连接池常驻连接數", labels=["engine"])
+        checked_out = GaugeMetricFamily(
+            "db_pool_checked_out_connections", "MySQL 连接池使用中的连接數", labels=["engine"]
+        )
+        checked_in = GaugeMetricFamily("db_pool_checked_in_connections", "MySQL 连接池空閒的连接數", labels=["engine"])
+        overflow = GaugeMetricFamily(
+            "db_pool_overflow_connections", "MySQL 连接池超出常驻连接數的连接數", labels=["engine"]
+        )
+        for name, engine in engines:
+            pool = engine.pool
+            size.add_metric([name], pool.size())
+            checked_out.add_metric([name], pool.checkedout())
+            checked_in.add_metric([name], pool.checkedin())
+            # 未使用溢出连接時 overflow() 為负數（常驻连接中尚未創建的數量）
+            overflow.add_metric([name], max(pool.overflow(), 0))
+        yield from (size, checked_out, checked_in, overflow)
+
+    def collect_redis(self):
+        rd = getattr(self.app.state, "redis", None)
+        if rd is None:
+            return
+        pool = rd.connection_pool
+        # redis.asyncio.ConnectionPool 没有已創建连接數的计數，由空閒与使用中的连接數相加得到
+        created = GaugeMetricFamily("redis_pool_connections", "Redis 连接池已創建的连接數")
+        created.add_metric([], len(pool._available_connections) + len(pool._in_use_connections))
+        yield created
+        in_use = GaugeMetricFamily("redis_pool_in_use_connections", "Redis 连接池使用中的连接數")
+        in_use.add_metric([], len(pool._in_use_connections))
+        yield in_use
+        max_connections = GaugeMetricFamily("redis_pool_max_connections", "Redis 连接池最大连接數")
+        max_connections.add_metric([], pool.max_connections)
+        yield max_connections
+
+    def collect_queues(self):
+        writer = getattr(self.app.state, "operation_record_writer", None)
+        if writer is not None:
+            depth = GaugeMetricFamily("operation_record_queue_depth", "操作日誌写入隊列长度")
+            depth.add_metric([], writer.qsize())
+            yield depth
+            dropped = CounterMetricFamily("operation_record_dropped", "操作日誌因隊列已满丢弃的记錄數")
+            dropped.add_metric([], writer.dropped)
+            yield dropped
+            failed = CounterMetricFamily("operation_record_failed", "操作日誌写入失敗的记錄數")
+            failed.add_metric([], writer.failed)
+            yield failed
+        stats = PasswordHasher.stats()
+        in_flight = GaugeMetricFamily("password_hasher_in_flight", "密碼计算已提交未完成的任務數")
+        in_flight.add_metric([], stats["in_flight"])
+        yield in_flight
+        queued = GaugeMetricFamily("password_hasher_queued", "密碼计算排隊等待的任務數")
+        queued.add_metric([], stats["queued"])
+        yield queued
+        completed = CounterMetricFamily("password_hasher_completed", "密碼计算已完成的任務數")
+        completed.add_metric([], stats["completed"])
+        yield completed
+        rejected = CounterMetricFamily("password_hasher_rejected", "密碼计算因排隊已满被拒绝的任務數")
+        rejected.add_metric([], stats["rejected"])
+        yield rejected
+
+
+def register_runtime_collector(app: FastAPI) -> RuntimeCollector:
+    """
+    注册连接池与后台隊列状態采集
+    :param app:
+    :return:
+    """
+    collector = RuntimeCollector(app)
+    REGISTRY.register(collector)
+    return collector
@@ -8,94 +8,181 @@
 """
 官方文檔——中間件：https://fastapi.tiangolo.com/tutorial/middleware/
 官方文檔——高级中間件：https://fastapi.tiangolo.com/advanced/middleware/
+纯 ASGI 中間件：https://www.starlette.io/middleware/#pure-asgi-middleware
+
+中間件均实现為纯 ASGI 中間件，只观察 receive/send 消息，不缓存请求体与响应体，
+避免 @app.middleware("http")（BaseHTTPMiddleware）每层额外創建任務、複製响应流的开销，同時支持流式响应。
 """
 import datetime
+import hashlib
+import ipaddress
 import json
 import time
-from fastapi import Request, Response
+from fastapi import Request
 from core.logger import logger
 from fastapi import FastAPI
 from fastapi.routing import APIRoute
+from starlette.datastructures import MutableHeaders, Headers
+from starlette.types import ASGIApp, Scope, Receive, Send, Message
 from user_agents import parse
 from application.settings import OPERATION_RECORD_METHOD, MONGO_DB_ENABLE, IGNORE_OPERATION_FUNCTION, \
-    DEMO_WHITE_LIST_PATH, DEMO, DEMO_BLACK_LIST_PATH
+    DEMO_WHITE_LIST_PATH, DEMO, DEMO_BLACK_LIST_PATH, OPERATION_RECORD_BODY_LIMIT, METRICS_PATH, \
+    METRICS_ALLOW_IPS
+from core import metrics
 from utils.response import ErrorResponse
-from apps.vadmin.record.crud import OperationRecordDal
-from core.database import mongo_getter
 from utils import status
 import traceback  # Polo add 2024-12-09
 
 
-def write_request_log(request: Request, response: Response):
+class BodyCapture:
+    """
+    請求體捕获
+
+    在應用讀取請求體時複制一份到有上限的缓冲区，不预先讀取、不重复讀取請求體，
+    超出上限的部分只参与计算 sha256，每个請求占用的内存不超过上限。
+    同一請求只捕获一次，保存在 scope["body_capture"] 中供多个中間件共用。
+    """
+
+    def __init__(self, limit: int = OPERATION_RECORD_BODY_LIMIT):
+        self.limit = limit
+        self.buffer = bytearray()
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    @classmethod
+    def wrap(cls, scope: Scope, receive: Receive) -> Receive:
+        """
+        為請求添加請求體捕获，已添加時直接返回原 receive
+        :param scope:
+        :param receive:
+        :return:
+        """
+        if "body_capture" in scope:
+            return receive
+        capture = cls()
+        scope["body_capture"] = capture
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if message["type"] == "http.request":
+                capture.feed(message.get("body", b""))
+            return message
+
+        return receive_wrapper
+
+    def feed(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        self.sha256.update(chunk)
+        remain = self.limit - len(self.buffer)
+        if remain > 0:
+            self.buffer.extend(chunk[:remain])
+
+    def get_body(self) -> str | dict | list:
+        """
+        獲取捕获的請求體，JSON 格式時返回解析后的數據
+        超出上限時返回 {"truncated": True, "size": 總大小, "sha256": 摘要, "content": 前面部分内容}
+        """
+        content = self.buffer.decode("utf-8", errors="replace")
+        if self.size > self.limit:
+            return {"truncated": True, "size": self.size, "sha256": self.sha256.hexdigest(), "content": content}
+        if content:
+            try:
+                return json.loads(content)
+            except json.JSONDecodeError:
+                pass
+        return content
+
+
+def write_request_log(request: Request, status_code: int, content_length: str, process_time: float):
     http_version = f"http/{request.scope['http_version']}"
-    content_length = response.raw_headers[0][1]
-    process_time = response.headers["X-Process-Time"]
-    content = f"basehttp.log_message: '{request.method} {request.url} {http_version}' {response.status_code}" \
-              f"{response.charset} {content_length} {process_time}"
+    content = f"basehttp.log_message: '{request.method} {request.url} {http_version}' {status_code}" \
+              f"utf-8 {content_length} {process_time}"
     logger.info(content)
 
 
+class RequestLogMiddleware:
+    """
+    记錄請求日誌中間件
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        start_time = time.time()
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                process_time = time.time() - start_time
+                headers = MutableHeaders(scope=message)
+                headers["X-Process-Time"] = str(process_time)
+                write_request_log(
+                    Request(scope),
+                    message["status"],
+                    headers.get("content-length", "-"),
+                    process_time
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+
 def register_request_log_middleware(app: FastAPI):
     """
     记錄請求日誌中間件
     :param app:
     :return:
     """
-
-    @app.middleware("http")
-    async def request_log_middleware(request: Request, call_next):
-        start_time = time.time()
-        response = await call_next(request)
-        process_time = time.time() - start_time
-        response.headers["X-Process-Time"] = str(process_time)
-        write_request_log(request, response)
-        return response
+    app.add_middleware(RequestLogMiddleware)
 
 
-def register_operation_record_middleware(app: FastAPI):
+class OperationRecordMiddleware:
     """
     操作记錄中間件
     用于将使用認證的操作全部记錄到 mongodb 數據庫中
-    :param app:
-    :return:
     """
 
-    @app.middleware("http")
-    async def operation_record_middleware(request: Request, call_next):
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not MONGO_DB_ENABLE or scope["method"] not in OPERATION_RECORD_METHOD:
+            return await self.app(scope, receive, send)
         start_time = time.time()
-        response = await call_next(request)
-        if not MONGO_DB_ENABLE:
-            return response
-        telephone = request.scope.get('telephone', None)
-        user_id = request.scope.get('user_id', None)
-        user_name = request.scope.get('user_name', None)
-        route = request.scope.get('route')
-        if not telephone:
-            return response
-        elif request.method not in OPERATION_RECORD_METHOD:
-            return response
+        response_start = {}
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                response_start.update(message)
+            await send(message)
+
+        await self.app(scope, BodyCapture.wrap(scope, receive), send_wrapper)
+
+        telephone = scope.get('telephone', None)
+        user_id = scope.get('user_id', None)
+        user_name = scope.get('user_name', None)
+        route = scope.get('route')
+        if not telephone or not response_start:
+            return
         elif route.name in IGNORE_OPERATION_FUNCTION:
-            return response
+            return
+        request = Request(scope)
         process_time = time.time() - start_time
         user_agent = parse(request.headers.get("user-agent"))
         system = f"{user_agent.os.family} {user_agent.os.version_string}"
         browser = f"{user_agent.browser.family} {user_agent.browser.version_string}"
         query_params = dict(request.query_params.multi_items())
         path_params = request.path_params
-        if isinstance(request.scope.get('body'), str):
-            body = request.scope.get('body')
-        else:
-            body = request.scope.get('body').decode()
-            if body:
-                body = json.loads(body)
         params = {
-            "body": body,
+            "body": scope["body_capture"].get_body(),
             "query_params": query_params if query_params else None,
             "path_params": path_params if path_params else None,
         }
-        content_length = response.raw_headers[0][1]
+        content_length = Headers(raw=response_start["headers"]).get("content-length")
         assert isinstance(route, APIRoute)
-        
+
         # polo add at 2024-12-19: 為未認證用戶提供預設值
         document = {
             "process_time": process_time,
@@ -112,150 +199,194 @@ def register_operation_record_middleware(app: FastAPI):
             "description": route.description,
             "tags": route.tags,
             "route_name": route.name,
-            "status_code": response.status_code,
+            "status_code": response_start["status"],
             "content_length": content_length,
             "create_datetime": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
             "params": json.dumps(params),
             "is_authenticated": bool(telephone)  # polo add at 2024-12-19: 新增欄位標記是否為認證用戶
         }
-        await OperationRecordDal(mongo_getter(request)).create_data(document)
-        return response
+        # 放入后台隊列批量写入，不等待 MongoDB 写入完成
+        await scope["app"].state.operation_record_writer.put(document)
 
 
-def register_demo_env_middleware(app: FastAPI):
+def register_operation_record_middleware(app: FastAPI):
     """
-    演示环境中間件
+    操作记錄中間件
+    用于将使用認證的操作全部记錄到 mongodb 數據庫中
     :param app:
     :return:
     """
+    app.add_middleware(OperationRecordMiddleware)
+
 
-    @app.middleware("http")
-    async def demo_env_middleware(request: Request, call_next):
-        path = request.scope.get("path")
-        if request.method != "GET":
-            print("路由：", path, request.method)
-        if DEMO and request.method != "GET":
+class DemoEnvMiddleware:
+    """
+    演示环境中間件
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] == "GET":
+            return await self.app(scope, receive, send)
+        path = scope.get("path")
+        print("路由：", path, scope["method"])
+        if DEMO:
+            response = None
             if path in DEMO_BLACK_LIST_PATH:
-                return ErrorResponse(
+                response = ErrorResponse(
                     status=status.HTTP_403_FORBIDDEN,
                     code=status.HTTP_403_FORBIDDEN,
                     msg="演示环境，禁止操作"
                 )
             elif path not in DEMO_WHITE_LIST_PATH:
-                return ErrorResponse(msg="演示環境，禁止操作")
-        return await call_next(request)
+                response = ErrorResponse(msg="演示環境，禁止操作")
+            if response is not None:
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
 
 
-def register_debug_request_middleware(app: FastAPI):  # Polo add 2024-12-09
+def register_demo_env_middleware(app: FastAPI):
     """
-    調試請求中間件 - 詳細記錄headers和payload
-    Polo add 2024-12-09: 新增調試中間件用於查看完整的headers和payload詳細資訊
+    演示环境中間件
     :param app:
     :return:
     """
+    app.add_middleware(DemoEnvMiddleware)
 
-    @app.middleware("http")
-    async def debug_request_middleware(request: Request, call_next):
-        try:
-            # Polo add 2024-12-09: 詳細記錄請求資訊的邏輯開始
-            # 記錄請求開始時間
-            start_time = time.time()
-            
-            # 獲取完整的headers
-            headers = dict(request.headers)
-            
-            # 獲取請求路徑和方法
-            path = request.url.path
-            method = request.method
-            
-            # 獲取query parameters
-            query_params = dict(request.query_params)
-            
-            # 獲取path parameters
-            path_params = request.path_params
-            
-            # 讀取request body (payload)
-            body = None
-            if method in ["POST", "PUT", "PATCH"]:
+
+class DebugRequestMiddleware:  # Polo add 2024-12-09
+    """
+    調試請求中間件 - 詳細記錄headers和payload
+    Polo add 2024-12-09: 新增調試中間件用於查看完整的headers和payload詳細資訊
+
+    payload 在應用讀取請求體時通過 BodyCapture 順帶記錄，不預先讀取請求體
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        request = Request(scope)
+        method = request.method
+        # 記錄請求開始時間
+        start_time = time.time()
+        if method in ["POST", "PUT", "PATCH"]:
+            receive = BodyCapture.wrap(scope, receive)
+
+        async def receive_wrapper() -> Message:
+            message = await receive()
+            if "body_capture" in scope and message["type"] == "http.request" and not message.get("more_body", False):
+                self.log_payload(scope["body_capture"].get_body())
+            return message
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
                 try:
-                    body_bytes = await request.body()
-                    if body_bytes:
-                        body = body_bytes.decode('utf-8')
-                        # 嘗試解析JSON
-                        try:
-                            body_json = json.loads(body)
-                            body = body_json
-                        except json.JSONDecodeError:
-                            # 如果不是JSON，保持原始字符串
-                            pass
+                    self.log_response(message, time.time() - start_time)
                 except Exception as e:
-                    body = f"無法讀取body: {str(e)}"
-            
-            # 記錄詳細的請求資訊
-            logger.info("=" * 80)
-            logger.info(f"🔍 DEBUG REQUEST - {method} {path}")
-            logger.info("=" * 80)
-            logger.info(f"📍 完整URL: {request.url}")
-            logger.info(f"🌐 客戶端IP: {request.client.host if request.client else 'Unknown'}")
-            logger.info(f"🔗 User-Agent: {headers.get('user-agent', 'Unknown')}")
-            
-            # 記錄所有headers
-            logger.info("📋 REQUEST HEADERS:")
-            for key, value in headers.items():
-                # 隱藏敏感資訊
-                if key.lower() in ['authorization', 'cookie', 'x-api-key']:
-                    value = f"{value[:10]}..." if len(value) > 10 else "***"
-                logger.info(f"   {key}: {value}")
-            
-            # 記錄query parameters
-            if query_params:
-                logger.info("🔍 QUERY PARAMETERS:")
-                for key, value in query_params.items():
-                    logger.info(f"   {key}: {value}")
-            
-            # 記錄path parameters
-            if path_params:
-                logger.info("🛤️ PATH PARAMETERS:")
-                for key, value in path_params.items():
-                    logger.info(f"   {key}: {value}")
-            
-            # 記錄request body (payload)
-            if body is not None:
-                logger.info("📦 REQUEST PAYLOAD:")
-                if isinstance(body, dict):
-                    # 美化JSON輸出
-                    logger.info(json.dumps(body, indent=2, ensure_ascii=False))
-                else:
-                    logger.info(f"   {body}")
-            
-            # 處理請求
-            response = await call_next(request)
-            
-            # 計算處理時間
-            process_time = time.time() - start_time
-            
-            # 記錄響應資訊
-            logger.info("📤 RESPONSE INFO:")
-            logger.info(f"   Status Code: {response.status_code}")
-            logger.info(f"   Process Time: {process_time:.4f}s")
-            
-            # 記錄響應headers
-            logger.info("📋 RESPONSE HEADERS:")
-            for name, value in response.headers.items():
-                logger.info(f"   {name}: {value}")
-            
-            logger.info("=" * 80)
-            logger.info("✅ DEBUG REQUEST END")
-            logger.info("=" * 80)
-            # Polo add 2024-12-09: 詳細記錄請求資訊的邏輯結束
-            
-            return response
-            
+                    logger.error(f"❌ Debug middleware error: {str(e)}")
+            await send(message)
+
+        try:
+            self.log_request(request)
         except Exception as e:
             logger.error(f"❌ Debug middleware error: {str(e)}")
             logger.error(f"❌ Traceback: {traceback.format_exc()}")
-            # 即使出錯也要繼續處理請求
-            return await call_next(request)
+        await self.app(scope, receive_wrapper, send_wrapper)
+
+    @staticmethod
+    def log_request(request: Request) -> None:
+        # 獲取完整的headers
+        headers = dict(request.headers)
+
+        # 獲取query parameters
+        query_params = dict(request.query_params)
+
+        # 記錄詳細的請求資訊
+        logger.info("=" * 80)
+        logger.info(f"🔍 DEBUG REQUEST - {request.method} {request.url.path}")
+        logger.info("=" * 80)
+        logger.info(f"📍 完整URL: {request.url}")
+        logger.info(f"🌐 客戶端IP: {request.client.host if request.client else 'Unknown'}")
+        logger.info(f"🔗 User-Agent: {headers.get('user-agent', 'Unknown')}")
+
+        # 記錄所有headers
+        logger.info("📋 REQUEST HEADERS:")
+        for key, value in headers.items():
+            # 隱藏敏感資訊
+            if key.lower() in ['authorization', 'cookie', 'x-api-key']:
+                value = f"{value[:10]}..." if len(value) > 10 else "***"
+            logger.info(f"   {key}: {value}")
+
+        # 記錄query parameters
+        if query_params:
+            logger.info("🔍 QUERY PARAMETERS:")
+            for key, value in query_params.items():
+                logger.info(f"   {key}: {value}")
+
+    @staticmethod
+    def log_payload(body: str | dict | list) -> None:
+        if not body:
+            return
+
+        # 記錄request body (payload)
+        logger.info("📦 REQUEST PAYLOAD:")
+        if isinstance(body, dict):
+            # 美化JSON輸出
+            logger.info(json.dumps(body, indent=2, ensure_ascii=False))
+        else:
+            logger.info(f"   {body}")
+
+    @staticmethod
+    def log_response(message: Message, process_time: float) -> None:
+        # 記錄響應資訊
+        logger.info("📤 RESPONSE INFO:")
+        logger.info(f"   Status Code: {message['status']}")
+        logger.info(f"   Process Time: {process_time:.4f}s")
+
+        # 記錄響應headers
+        logger.info("📋 RESPONSE HEADERS:")
+        for name, value in Headers(raw=message.get("headers", [])).items():
+            logger.info(f"   {name}: {value}")
+
+        logger.info("=" * 80)
+        logger.info("✅ DEBUG REQUEST END")
+        logger.info("=" * 80)
+
+
+def register_debug_request_middleware(app: FastAPI):  # Polo add 2024-12-09
+    """
+    調試請求中間件 - 詳細記錄headers和payload
+    Polo add 2024-12-09: 新增調試中間件用於查看完整的headers和payload詳細資訊
+    :param app:
+    :return:
+    """
+    app.add_middleware(DebugRequestMiddleware)
+
+
+class JWTRefreshMiddleware:
+    """
+    JWT刷新中間件
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                headers["if-refresh"] = str(scope.get('if-refresh', 0))
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
 
 
 def register_jwt_refresh_middleware(app: FastAPI):
@@ -264,10 +395,88 @@ def register_jwt_refresh_middleware(app: FastAPI):
     :param app:
     :return:
     """
+    app.add_middleware(JWTRefreshMiddleware)
+
 
-    @app.middleware("http")
-    async def jwt_refresh_middleware(request: Request, call_next):
-        response = await call_next(request)
-        refresh = request.scope.get('if-refresh', 0)
-        response.headers["if-refresh"] = str(refresh)
-        return response
+class MetricsMiddleware:
+    """
+    運行指標中間件
+    记錄請求耗時与正在處理的請求數，並在 METRICS_PATH 返回 Prometheus 文本格式的指標數據
+    需要注册在最外层，耗時包括其他中間件的處理時間
+    """
+
+    def __init__(self, app: ASGIApp, allow_ips: list[str] = None):
+        self.app = app
+        # 標签组合對應的指標對象缓存，避免每次請求都通過 labels() 查找
+        self.observers = {}
+        self.allow_networks = [ipaddress.ip_network(i, strict=False) for i in allow_ips or []]
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        if scope["path"] == METRICS_PATH:
+            if not self.is_allowed(scope):
+                response = ErrorResponse(
+                    status=status.HTTP_403_FORBIDDEN,
+                    code=status.HTTP_403_FORBIDDEN,
+                    msg="無權限訪問"
+                )
+                return await response(scope, receive, send)
+            return await self.metrics_response(send)
+        start_time = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        metrics.REQUESTS_IN_PROGRESS.inc()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            metrics.REQUESTS_IN_PROGRESS.dec()
+            # 未匹配到路由的請求（如 404）统一歸為一个標签，避免任意路径產生大量標签组合
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            key = (scope["method"], route, f"{status_code // 100}xx")
+            observer = self.observers.get(key)
+            if observer is None:
+                observer = self.observers[key] = metrics.REQUEST_DURATION.labels(*key)
+            observer.observe(time.perf_counter() - start_time)
+
+    def is_allowed(self, scope: Scope) -> bool:
+        """
+        客户端地址是否在允许抓取指標的 IP 或网段中
+        """
+        client = scope.get("client")
+        if not client:
+            return False
+        try:
+            address = ipaddress.ip_address(client[0])
+        except ValueError:
+            return False
+        return any(address in network for network in self.allow_networks)
+
+    @staticmethod
+    async def metrics_response(send: Send) -> None:
+        body = metrics.generate()
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [
+                (b"content-type", metrics.CONTENT_TYPE.encode()),
+                (b"content-length", str(len(body)).encode())
+            ]
+        })
+        await send({"type": "http.response.body", "body": body})
+
+
+def register_metrics_middleware(app: FastAPI):
+    """
+    運行指標中間件
+    :param app:
+    :return:
+    """
+    metrics.register_runtime_collector(app)
+    app.add_middleware(MetricsMiddleware, allow_ips=METRICS_ALLOW_IPS)
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 14:00
+# @File           : operation_record.py
+# @IDE            : PyCharm
+# @desc           : 操作日誌异步批量写入
+
+"""
+操作记錄不再在請求中直接写入 MongoDB，而是放入進程内有界隊列，
+由后台任務按批量大小或時間間隔使用 insert_many 写入，請求耗時不再受 MongoDB 写入延迟影响。
+
+隊列已满時的處理策略（OPERATION_RECORD_OVERFLOW）：
+drop_new：丢弃當前记錄，不影响請求
+drop_oldest：丢弃隊列中最早的一条记錄，保留最新的记錄
+block：等待隊列空出位置，最多等待 OPERATION_RECORD_BLOCK_TIMEOUT 秒，超時后丢弃當前记錄
+"""
+
+import asyncio
+import datetime
+from motor.motor_asyncio import AsyncIOMotorCollection
+from pymongo.errors import BulkWriteError
+from core.logger import logger
+
+
+class OperationRecordWriter:
+
+    OVERFLOW_POLICIES = ("drop_new", "drop_oldest", "block")
+
+    def __init__(
+            self,
+            collection: AsyncIOMotorCollection,
+            max_size: int = 10000,
+            batch_size: int = 200,
+            flush_interval: float = 1.0,
+            overflow: str = "drop_oldest",
+            block_timeout: float = 0.5
+    ):
+        """
+        :param collection: 操作记錄集合
+        :param max_size: 隊列最大长度
+        :param batch_size: 單次写入最大數量
+        :param flush_interval: 最长写入間隔（秒）
+        :param overflow: 隊列已满時的處理策略
+        :param block_timeout: block 策略下最长等待時間（秒）
+        """
+        if overflow not in self.OVERFLOW_POLICIES:
+            raise ValueError(f"無效的操作日誌隊列溢出策略：{overflow}")
+        self.collection = collection
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        # 因隊列已满丢弃的记錄數
+        self.dropped = 0
+        # 写入失敗的记錄數
+        self.failed = 0
+        self._task: asyncio.Task | None = None
+        self._closing = False
+
+    def start(self) -> None:
+        """
+        启動后台写入任務
+        """
+        if self._task is None:
+            self._task = asyncio.create_task(self._run(), name="operation_record_writer")
+
+    async def stop(self) -> None:
+        """
+        停止后台写入任務，並写入隊列中剩余的记錄
+        """
+        self._closing = True
+        if self._task is not None:
+            await self._task
+            self._task = None
+        while not self.queue.empty():
+            await self._flush(self._take(self.batch_size))
+
+    async def put(self, document: dict) -> bool:
+        """
+        添加一条操作记錄
+        :param document:
+        :return: 是否成功放入隊列
+        """
+        now = datetime.datetime.now()
+        document['create_datetime'] = now
+        document['update_datetime'] = now
+        try:
+            self.queue.put_nowait(document)
+            return True
+        except asyncio.QueueFull:
+            pass
+        if self.overflow == "drop_oldest":
+            self.queue.get_nowait()
+            self.dropped += 1
+            self.queue.put_nowait(document)
+            return True
+        elif self.overflow == "block":
+            try:
+                await asyncio.wait_for(self.queue.put(document), self.block_timeout)
+                return True
+            except asyncio.TimeoutError:
+                pass
+        self.dropped += 1
+        return False
+
+    def qsize(self) -> int:
+        """
+        當前隊列长度
+        """
+        return self.queue.qsize()
+
+    async def _run(self) -> None:
+        while not self._closing:
+            try:
+                await self._drain()
+            except Exception as e:
+                # 任何异常都不能结束后台任務，否则之后的记錄只會堆积在隊列中直到被丢弃
+                logger.exception(f"操作记錄写入任務异常：{e}")
+
+    async def _drain(self) -> None:
+        """
+        从隊列中取出一批记錄並写入
+        """
+        try:
+            first = await asyncio.wait_for(self.queue.get(), self.flush_interval)
+        except asyncio.TimeoutError:
+            return
+        batch = [first]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.flush_interval
+        while len(batch) < self.batch_size and not self._closing:
+            batch.extend(self._take(self.batch_size - len(batch)))
+            if len(batch) >= self.batch_size:
+                break
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        await self._flush(batch)
+
+    def _take(self, number: int) -> list[dict]:
+        batch = []
+        while len(batch) < number and not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        return batch
+
+    async def _flush(self, batch: list[dict]) -> None:
+        if not batch:
+            return
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # ordered=False 時其余记錄已写入，只丢弃写入失敗的记錄
+            number = len(e.details.get("writeErrors", [])) or len(batch)
+            self.failed += number
+            logger.error(f"批量写入操作记錄失敗，丢弃 {number} 条记錄：{e}")
+        except Exception as e:
+            # 连接异常、记錄无法编码等，丢弃整批记錄，保持后台任務继續運行
+            self.failed += len(batch)
+            logger.error(f"批量写入操作记錄失敗，丢弃 {len(batch)} 条记錄：{e}")
@@ -5,6 +5,7 @@ from typing import Dict, Any, Optional
 import httpx
 
 from application.settings import T100_IP, T100_ENV, T100_LANG, T100_SITE, T100_PROD, T100_ACCT, T100_ENT
+from core.http_client import HttpClientManager
 from core.logger import logger
 
 
@@ -66,9 +67,16 @@ class T100APIClient:
         return ApiResponse(success=True, data=data)
 
 
-    async def fetch_data(self, fun: str, action: Optional[str] = None, parameter: Dict[str, Any] = None) -> ApiResponse:
+    async def fetch_data(
+            self,
+            fun: str,
+            action: Optional[str] = None,
+            parameter: Dict[str, Any] = None,
+            idempotent: bool = False
+    ) -> ApiResponse:
         """
         調用T100 API，並處理請求及回應數據
+        使用應用共享的 HTTP 連接池，查詢類等冪等調用可設置 idempotent=True，讀取失敗時自動重試
         """
         url = f"http://{self.server_ip}/w{self.env}/ws/r/awsp920"
 
@@ -108,14 +116,14 @@ class T100APIClient:
         logger.debug(f"發送 T100 API 請求: {request_data}")
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, json=request_data, timeout=60.0)
+            response = await HttpClientManager.request("POST", url, idempotent=idempotent, json=request_data)
+            response.raise_for_status()
 
-                response_data = response.json()
-                logger.debug(f"T100 API 回應: {response_data}")
+            response_data = response.json()
+            logger.debug(f"T100 API 回應: {response_data}")
 
-                # ✅ 使用 `handle_response()` 來統一檢查 API 成功與否
-                return self.handle_response(response_data, action)
+            # ✅ 使用 `handle_response()` 來統一檢查 API 成功與否
+            return self.handle_response(response_data, action)
 
         except httpx.TimeoutException:
             logger.error("ERP API 請求超時")
@@ -136,7 +144,7 @@ if __name__ == "__main__":
         fun = "bd.mes.aps_run"
         client = T100APIClient()
         action = "get_mo_list"
-        api_response = await client.fetch_data(fun, action, parameter)
+        api_response = await client.fetch_data(fun, action, parameter, idempotent=True)
 
         if api_response.success:
             parsed_data = {}
@@ -116,6 +116,21 @@ def migrate(env: Environment = Environment.pro):
     """
     print("開始更新數據庫表")
     InitializeData.migrate_model(env)
+    asyncio.run(InitializeData.fill_dept_paths())
+
+
+@shell_app.command()
+def build_ip_db(csv_path: str):
+    """
+    由 CSV 文件生成本地 IP 段數據庫，用于解析登錄 IP 归属地
+
+    命令例子：python main.py build-ip-db ip.csv
+
+    :param csv_path: CSV 文件路径，每行：起始IP,結束IP,国家,省份,城市,区县,运营商,郵政编碼,地区区号
+    """
+    from utils.ip_manage import IPRangeDatabase
+    count = IPRangeDatabase.build(csv_path, settings.IP_DATABASE_PATH)
+    print(f"本地 IP 數據庫已生成：{settings.IP_DATABASE_PATH}，共 {count} 個 IP 段")
 
 
 @shell_app.command()
@@ -8,13 +8,14 @@
 
 from enum import Enum
 from sqlalchemy import insert
-from core.database import db_getter
+from core.database import db_getter, session_factory
 from utils.excel.excel_manage import ExcelManage
 from application.settings import BASE_DIR, VERSION
 import os
 from apps.vadmin.auth import models as auth_models
 from apps.vadmin.system import models as system_models
 from apps.vadmin.help import models as help_models
+from apps.vadmin.auth.crud import DeptDal
 import subprocess
 
 
@@ -52,6 +53,17 @@ class InitializeData:
         subprocess.check_call(['alembic', '--name', f'{env.value}', 'upgrade', 'head'], cwd=BASE_DIR)
         print(f"環境：{env}  {VERSION} 數據庫表遷移完成")
 
+    @classmethod
+    async def fill_dept_paths(cls):
+        """
+        补全部門层级路径
+        autogenerate 迁移只會新增 path 字段，不會回填已有部門的层级路径
+        """
+        async with session_factory() as db:
+            async with db.begin():
+                if await DeptDal(db).fill_missing_paths():
+                    print("vadmin_auth_dept 部門层级路径已补全")
+
     def __serializer_data(self):
         """
         序列化數據，将excel數據转為python對象
@@ -93,6 +105,11 @@ class InitializeData:
         生成部門詳情數據
         """
         await self.__generate_data("vadmin_auth_dept", auth_models.VadminDept)
+        async_session = db_getter()
+        db = await async_session.__anext__()
+        await DeptDal(db).rebuild_paths()
+        await db.commit()
+        print("vadmin_auth_dept 部門层级路径已生成")
 
     async def generate_user_dept(self):
         """
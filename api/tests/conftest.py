@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 20:00
+# @File           : conftest.py
+# @IDE            : PyCharm
+# @desc           : 测试公共夹具
+
+"""
+依赖安装：pip install -r tests/requirements.txt
+运行测试：在 api 目錄下执行 python -m pytest tests
+
+數據庫使用 aiosqlite 临时文件代替 MySQL，Redis 使用 fakeredis 代替，不需要启动任何外部服務。
+"""
+
+import os
+import sys
+
+import pytest
+import pytest_asyncio
+from fakeredis.aioredis import FakeRedis
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.database import Base, RoutingSession  # noqa: E402
+
+
+def create_sqlite_engine(path):
+    return create_async_engine(f"sqlite+aiosqlite:///{path}")
+
+
+class QueryCounter:
+    """
+    统计引擎执行的 SQL 语句數
+    """
+
+    def __init__(self, engine):
+        self.statements = []
+        event.listen(engine.sync_engine, "before_cursor_execute", self.before_cursor_execute)
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    def reset(self) -> None:
+        self.statements.clear()
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    engine = create_sqlite_engine(tmp_path / "primary.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield engine
+    await engine.dispose()
+
+
+@pytest.fixture
+def session_factory(engine):
+    return async_sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=engine,
+        expire_on_commit=True,
+        class_=AsyncSession,
+        sync_session_class=RoutingSession
+    )
+
+
+@pytest_asyncio.fixture
+async def redis():
+    rd = FakeRedis(decode_responses=True)
+    yield rd
+    await rd.flushall()
+    await rd.aclose()
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 23:45
+# @File           : fake_bpm.py
+# @IDE            : PyCharm
+# @desc           : 本地模擬 BPM WebService
+
+"""
+在本地线程中运行的 BPM SOAP 服務，提供 WSDL 与 bpm_wsl 使用到的部分操作，
+统计 WSDL 下載次數、SOAP 調用次數与 TCP 连接數，並可以為每次请求增加固定延迟模擬网络与 BPM 處理耗時。
+"""
+
+import threading
+import time
+import xml.etree.ElementTree as ET
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from xml.sax.saxutils import escape
+
+NAMESPACE = "http://webservice.services.nana.dsc.com"
+SOAP_ENV = "http://schemas.xmlsoap.org/soap/envelope/"
+
+# 操作名稱 -> 参數列表，返回值均為字符串
+OPERATIONS = {
+    "fetchToDoWorkItem": ["pProcessIds", "pUserId"],
+    "checkWorkItemState": ["pWorkItemOID"],
+    "acceptWorkItem": ["pWorkItemOID", "pUserId"],
+    "completeWorkItem": ["pWorkItemOID", "pUserId", "pComment"],
+}
+
+
+def todo_work_items(process_ids: str, user_id: str) -> str:
+    items = "".join(
+        "<com.dsc.nana.services.webservice.SimpleWorkItem>"
+        f"<processSerialNumber>{process_ids}{i:08d}</processSerialNumber>"
+        "<activityId>UserTask_1</activityId>"
+        f"<workItemOID>{user_id}-{i}</workItemOID>"
+        "</com.dsc.nana.services.webservice.SimpleWorkItem>"
+        for i in range(3)
+    )
+    return f"<list>{items}</list>"
+
+
+HANDLERS = {
+    "fetchToDoWorkItem": lambda p: todo_work_items(p["pProcessIds"], p["pUserId"]),
+    "checkWorkItemState": lambda p: "1",
+    "acceptWorkItem": lambda p: "true",
+    "completeWorkItem": lambda p: "true",
+}
+
+
+def build_wsdl(url: str) -> str:
+    elements, messages, operations, bindings = [], [], [], []
+    for name, params in OPERATIONS.items():
+        fields = "".join(f'<xsd:element name="{i}" type="xsd:string"/>' for i in params)
+        elements.append(
+            f'<xsd:element name="{name}"><xsd:complexType><xsd:sequence>{fields}'
+            f'</xsd:sequence></xsd:complexType></xsd:element>'
+            f'<xsd:element name="{name}Response"><xsd:complexType><xsd:sequence>'
+            f'<xsd:element name="{name}Return" type="xsd:string"/>'
+            f'</xsd:sequence></xsd:complexType></xsd:element>'
+        )
+        messages.append(
+            f'<wsdl:message name="{name}Request"><wsdl:part name="parameters" element="tns:{name}"/></wsdl:message>'
+            f'<wsdl:message name="{name}Response"><wsdl:part name="parameters" element="tns:{name}Response"/>'
+            f'</wsdl:message>'
+        )
+        operations.append(
+            f'<wsdl:operation name="{name}"><wsdl:input message="tns:{name}Request"/>'
+            f'<wsdl:output message="tns:{name}Response"/></wsdl:operation>'
+        )
+        bindings.append(
+            f'<wsdl:operation name="{name}"><soap:operation soapAction=""/>'
+            f'<wsdl:input><soap:body use="literal"/></wsdl:input>'
+            f'<wsdl:output><soap:body use="literal"/></wsdl:output></wsdl:operation>'
+        )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        '<wsdl:definitions xmlns:wsdl="http://schemas.xmlsoap.org/wsdl/" '
+        'xmlns:soap="http://schemas.xmlsoap.org/wsdl/soap/" '
+        f'xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:tns="{NAMESPACE}" targetNamespace="{NAMESPACE}">'
+        f'<wsdl:types><xsd:schema targetNamespace="{NAMESPACE}" elementFormDefault="qualified">'
+        f'{"".join(elements)}</xsd:schema></wsdl:types>'
+        f'{"".join(messages)}'
+        f'<wsdl:portType name="WorkflowService">{"".join(operations)}</wsdl:portType>'
+        '<wsdl:binding name="WorkflowServiceSoapBinding" type="tns:WorkflowService">'
+        '<soap:binding style="document" transport="http://schemas.xmlsoap.org/soap/http"/>'
+        f'{"".join(bindings)}</wsdl:binding>'
+        '<wsdl:service name="WorkflowServiceService">'
+        '<wsdl:port name="WorkflowService" binding="tns:WorkflowServiceSoapBinding">'
+        f'<soap:address location="{url}"/></wsdl:port></wsdl:service>'
+        '</wsdl:definitions>'
+    )
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # 响应头与响应体分开發送，不关闭 Nagle 時每次响应都會等待客户端的延迟确认
+    disable_nagle_algorithm = True
+    server: "FakeBpmServer"
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self) -> None:
+        with self.server.lock:
+            self.server.wsdl_requests += 1
+        time.sleep(self.server.delay)
+        self.reply(build_wsdl(self.server.service_url).encode())
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.soap_requests += 1
+        time.sleep(self.server.delay)
+        request = ET.fromstring(body).find(f"{{{SOAP_ENV}}}Body")[0]
+        name = request.tag.split("}")[-1]
+        params = {i.tag.split("}")[-1]: i.text or "" for i in request}
+        result = escape(HANDLERS[name](params))
+        self.reply((
+            f'<soapenv:Envelope xmlns:soapenv="{SOAP_ENV}"><soapenv:Body>'
+            f'<tns:{name}Response xmlns:tns="{NAMESPACE}"><tns:{name}Return>{result}</tns:{name}Return>'
+            f'</tns:{name}Response></soapenv:Body></soapenv:Envelope>'
+        ).encode())
+
+    def reply(self, content: bytes) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=utf-8")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class FakeBpmServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, delay: float = 0):
+        """
+        :param delay: 每次请求的延迟（秒）
+        """
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.wsdl_requests = 0
+        self.soap_requests = 0
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def service_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}/NaNaWeb/services/WorkflowService"
+
+    @property
+    def wsdl(self) -> str:
+        return f"{self.service_url}?wsdl"
+
+    def __enter__(self) -> "FakeBpmServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
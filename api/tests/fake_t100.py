@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/19 00:30
+# @File           : fake_t100.py
+# @IDE            : PyCharm
+# @desc           : 本地模擬 T100 ERP 接口
+
+"""
+在本地线程中运行的 T100 awsp920 接口，按 std_data 格式返回請求的 service 名稱与 action，
+统计請求次數与 TCP 连接數，可以為每次請求增加固定延迟，並可以讓前若干次請求返回指定狀態碼以模擬網關故障。
+"""
+
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "FakeT100Server"
+
+    def setup(self) -> None:
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        with self.server.lock:
+            self.server.requests += 1
+            status = self.server.fail_status.pop(0) if self.server.fail_status else 200
+        time.sleep(self.server.delay)
+        if status != 200:
+            self.reply(status, b"")
+            return
+        service = body["service"]
+        content = {
+            "srvcode": "000",
+            "payload": {
+                "std_data": {
+                    "execution": {"code": "0", "sql_code": "0", "description": ""},
+                    "parameter": {"name": service["name"], "action": service.get("action")}
+                }
+            }
+        }
+        self.reply(200, json.dumps(content).encode())
+
+    def reply(self, status: int, content: bytes) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class FakeT100Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # 并發基準测试时默认的 5 个排队连接不够用
+    request_queue_size = 128
+
+    def __init__(self, delay: float = 0, fail_status: list[int] = None):
+        """
+        :param delay: 每次請求的延迟（秒）
+        :param fail_status: 前若干次請求依次返回的狀態碼
+        """
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.delay = delay
+        self.fail_status = list(fail_status or [])
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = 0
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def host(self) -> str:
+        return f"127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self) -> "FakeT100Server":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 23:50
+# @File           : test_bpm_wsdl.py
+# @IDE            : PyCharm
+# @desc           : BPM WebService 客户端
+
+import asyncio
+import time
+
+import pytest
+
+from apps.bpm.it.services import bpmin_it
+from apps.bpm.it.services.bpmin_it import BpminItServices
+from tests.fake_bpm import FakeBpmServer
+from utils.bpm_wsdl import BpmClientManager, bpm_wsl
+
+
+@pytest.fixture
+def bpm(tmp_path, monkeypatch):
+    with FakeBpmServer(delay=0.2) as server:
+        monkeypatch.setattr(BpmClientManager, "WSDL_CACHE_PATH", str(tmp_path / "bpm_wsdl.db"))
+        monkeypatch.setattr(BpmClientManager, "_clients", {})
+
+        def client() -> bpm_wsl:
+            obj = bpm_wsl()
+            obj.wsdl = server.wsdl
+            return obj
+
+        monkeypatch.setattr(bpmin_it, "bpm_wsl", client)
+        yield server
+
+
+@pytest.mark.asyncio
+async def test_wsdl_parsed_once_and_connections_reused(bpm):
+    results = [await BpminItServices.check_work_item_state(f"oid-{i}") for i in range(5)]
+
+    assert [i["success"] for i in results] == [True] * 5
+    assert results[0]["data"] == 1
+    assert bpm.wsdl_requests == 1
+    assert bpm.soap_requests == 5
+    # WSDL 与所有 SOAP 調用复用同一个连接
+    assert bpm.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_wsdl_cached_on_disk(bpm, monkeypatch):
+    await BpminItServices.check_work_item_state("oid")
+    # 模擬進程重启
+    monkeypatch.setattr(BpmClientManager, "_clients", {})
+    await BpminItServices.check_work_item_state("oid")
+
+    assert bpm.wsdl_requests == 1
+
+
+@pytest.mark.asyncio
+async def test_calls_do_not_block_event_loop(bpm):
+    await BpminItServices.check_work_item_state("warm-up")
+    ticks = []
+
+    async def ticker():
+        while True:
+            ticks.append(time.perf_counter())
+            await asyncio.sleep(0.01)
+
+    task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    results = await asyncio.gather(*[BpminItServices.fetch_todo_work_item(f"user-{i}", "IT") for i in range(8)])
+    elapsed = time.perf_counter() - start
+    task.cancel()
+
+    assert all(i["success"] for i in results)
+    assert results[3]["data"][0] == {"processSerialNumber": "IT00000000", "activityId": "UserTask_1",
+                                     "workItemOID": "user-3-0"}
+    # 8 个調用在线程池中并行执行，总耗時接近单次調用，期间事件循環沒有被阻塞一个調用的時間
+    assert elapsed < 0.2 * 2
+    assert max(b - a for a, b in zip(ticks, ticks[1:])) < 0.1
+
+
+@pytest.mark.asyncio
+async def test_close_releases_executor_and_connections(bpm):
+    await BpminItServices.check_work_item_state("oid")
+    client = BpmClientManager._clients[bpm.wsdl]
+    executor = BpmClientManager._executor
+
+    await BpmClientManager.close()
+
+    assert BpmClientManager._executor is None and BpmClientManager._clients == {}
+    assert executor._shutdown
+    assert not client.transport.session.get_adapter(bpm.service_url).poolmanager.pools
+    # 關閉後再次調用時重新創建
+    assert (await BpminItServices.check_work_item_state("oid"))["success"]
+    await BpmClientManager.close()
@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 21:00
+# @File           : test_dept_path.py
+# @IDE            : PyCharm
+# @desc           : 部門层级路径
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert, select
+
+from apps.vadmin.auth import models
+from apps.vadmin.auth.crud import DeptDal
+from core.exception import CustomException
+
+
+@pytest_asyncio.fixture
+async def depts_without_path(session_factory):
+    """
+    模擬生產环境 autogenerate 迁移新增 path 字段后，已有部門的层级路径為空
+    1 -> 2 -> 3，4 為另一个根部門
+    """
+    async with session_factory() as db:
+        async with db.begin():
+            await db.execute(insert(models.VadminDept), [
+                {"id": 1, "name": "总部", "dept_key": "hq", "parent_id": None},
+                {"id": 2, "name": "研發部", "dept_key": "rd", "parent_id": 1},
+                {"id": 3, "name": "測試组", "dept_key": "qa", "parent_id": 2},
+                {"id": 4, "name": "分公司", "dept_key": "branch", "parent_id": None},
+            ])
+
+
+@pytest.mark.asyncio
+async def test_descendants_fill_missing_paths(session_factory, depts_without_path):
+    async with session_factory() as db:
+        async with db.begin():
+            dal = DeptDal(db)
+            dept = await dal.get_data(1)
+            assert sorted(await dal.get_descendant_ids([dept])) == [1, 2, 3]
+            paths = dict((await db.execute(select(models.VadminDept.id, models.VadminDept.path))).all())
+    assert paths == {1: "/1/", 2: "/1/2/", 3: "/1/2/3/", 4: "/4/"}
+
+
+@pytest.mark.asyncio
+async def test_create_under_dept_without_path(session_factory, depts_without_path):
+    async with session_factory() as db:
+        async with db.begin():
+            dal = DeptDal(db)
+            obj = await dal.create_data({"name": "前端组", "dept_key": "fe", "parent_id": 2}, v_return_obj=True)
+            assert obj.path == f"/1/2/{obj.id}/"
+
+
+@pytest.mark.asyncio
+async def test_unknown_parent_rejected(session_factory, depts_without_path):
+    async with session_factory() as db:
+        async with db.begin():
+            with pytest.raises(CustomException):
+                await DeptDal(db).get_parent_path(99)
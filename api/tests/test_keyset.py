@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 23:00
+# @File           : test_keyset.py
+# @IDE            : PyCharm
+# @desc           : 游標分頁
+
+import datetime
+import decimal
+import json
+import uuid
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert, select
+
+from apps.vadmin.auth import models
+from apps.vadmin.auth.crud import DeptDal
+from apps.vadmin.record import views
+from apps.vadmin.record.models import VadminLoginRecord
+from apps.vadmin.record.params import LoginParams
+from core.crud import DalBase
+from core.dependencies import Paging
+from core.exception import CustomException
+
+
+def test_cursor_round_trip():
+    values = [
+        datetime.datetime(2026, 10, 18, 23, 0, 1), datetime.date(2026, 10, 18), datetime.time(23, 0),
+        decimal.Decimal("12.30"), uuid.UUID(int=1), "name", 1, 1.5, None
+    ]
+    assert DalBase.decode_cursor(DalBase.encode_cursor(values)) == values
+
+
+@pytest.mark.parametrize("value", [b"bytes", object()])
+def test_cursor_rejects_unsupported_types(value):
+    with pytest.raises(CustomException):
+        DalBase.encode_cursor([value, 1])
+
+
+@pytest.mark.parametrize("cursor", ["not base64 !", "eyJhIjogMX0=", "W3siJGRlYyI6ICJ4In1d"])
+def test_invalid_cursor(cursor):
+    with pytest.raises(CustomException):
+        DalBase.decode_cursor(cursor)
+
+
+@pytest_asyncio.fixture
+async def depts(session_factory):
+    async with session_factory() as db:
+        async with db.begin():
+            await db.execute(insert(models.VadminDept), [
+                {"id": i, "name": f"dept-{i % 3}", "dept_key": f"d{i}", "order": i % 4} for i in range(1, 12)
+            ])
+
+
+@pytest.mark.asyncio
+async def test_start_sql_order_replaced(session_factory, depts):
+    start_sql = select(models.VadminDept).where(models.VadminDept.is_delete.is_(False)) \
+        .order_by(models.VadminDept.name.desc())
+    ids, cursor = [], None
+    async with session_factory() as db:
+        dal = DeptDal(db)
+        while True:
+            datas, cursor = await dal.get_datas(
+                limit=4, v_start_sql=start_sql, v_keyset=True, v_cursor=cursor, v_order_field="order",
+                v_return_objs=True
+            )
+            ids.extend(i.id for i in datas)
+            if cursor is None:
+                break
+    expected = sorted(range(1, 12), key=lambda i: (i % 4, i))
+    assert ids == expected
+
+
+@pytest.mark.asyncio
+async def test_login_records_endpoint_cursor(session_factory):
+    async with session_factory() as db:
+        async with db.begin():
+            await db.execute(insert(VadminLoginRecord), [
+                {"id": i, "telephone": f"1380000{i:04d}", "platform": "0", "login_method": "0"} for i in range(1, 8)
+            ])
+    pages, cursor = [], ""
+    async with session_factory() as db:
+        auth = SimpleNamespace(db=db)
+        while cursor is not None:
+            params = LoginParams(platform="0", cursor=cursor, params=Paging(limit=3))
+            body = json.loads((await views.get_record_login(params, auth)).body)
+            pages.append([i["id"] for i in body["data"]])
+            assert body["count"] == 7
+            cursor = body["next_cursor"]
+    assert pages == [[7, 6, 5], [4, 3, 2], [1]]
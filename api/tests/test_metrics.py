@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 22:00
+# @File           : test_metrics.py
+# @IDE            : PyCharm
+# @desc           : 運行指標抓取
+
+import httpx
+import pytest
+import pytest_asyncio
+from fastapi import FastAPI
+from redis.asyncio import Redis
+
+from core import metrics
+from core.middleware import MetricsMiddleware
+
+
+@pytest_asyncio.fixture
+async def app():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: int):
+        return {"id": item_id}
+
+    # 真实的 redis.asyncio 连接池，不需要连接即可讀取连接池状態
+    app.state.redis = Redis()
+    collector = metrics.register_runtime_collector(app)
+    app.add_middleware(MetricsMiddleware, allow_ips=["127.0.0.1"])
+    yield app
+    metrics.REGISTRY.unregister(collector)
+    await app.state.redis.aclose()
+
+
+def client(app: FastAPI, host: str) -> httpx.AsyncClient:
+    transport = httpx.ASGITransport(app=app, client=(host, 50000))
+    return httpx.AsyncClient(transport=transport, base_url="http://testserver")
+
+
+@pytest.mark.asyncio
+async def test_scrape(app):
+    async with client(app, "127.0.0.1") as c:
+        assert (await c.get("/items/1")).status_code == 200
+        response = await c.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert 'http_request_duration_seconds_count{method="GET",route="/items/{item_id}",status="2xx"} 1.0' in text
+    assert 'db_pool_checked_out_connections{engine="primary"} 0.0' in text
+    assert "redis_pool_connections 0.0" in text
+    assert "redis_pool_in_use_connections 0.0" in text
+    assert "password_hasher_in_flight 0.0" in text
+
+
+@pytest.mark.asyncio
+async def test_scrape_rejected_from_other_hosts(app):
+    async with client(app, "10.1.2.3") as c:
+        response = await c.get("/metrics")
+    assert response.status_code == 403
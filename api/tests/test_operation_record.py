@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 22:15
+# @File           : test_operation_record.py
+# @IDE            : PyCharm
+# @desc           : 操作日誌异步批量写入
+
+import asyncio
+
+import pytest
+from bson.errors import InvalidDocument
+
+from core.operation_record import OperationRecordWriter
+
+
+class Collection:
+    """
+    記錄 insert_many 调用，document 中包含 "error" 時模擬 Motor 無法编码记錄
+    """
+
+    def __init__(self):
+        self.documents = []
+
+    async def insert_many(self, documents: list[dict], ordered: bool = True):
+        if any("error" in i for i in documents):
+            raise InvalidDocument("cannot encode object")
+        self.documents.extend(documents)
+
+
+@pytest.mark.asyncio
+async def test_writer_survives_non_mongo_errors():
+    collection = Collection()
+    writer = OperationRecordWriter(collection, batch_size=1, flush_interval=0.05)
+    writer.start()
+    await writer.put({"path": "/bad", "error": object()})
+    await writer.put({"path": "/good"})
+    await asyncio.sleep(0.2)
+    assert not writer._task.done()
+    await writer.stop()
+
+    assert writer.failed == 1
+    assert [i["path"] for i in collection.documents] == ["/good"]
+
+
+@pytest.mark.asyncio
+async def test_unexpected_error_keeps_drain_task_alive(monkeypatch):
+    collection = Collection()
+    writer = OperationRecordWriter(collection, flush_interval=0.05)
+    calls = []
+
+    async def flush(batch):
+        calls.append(batch)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        await OperationRecordWriter._flush(writer, batch)
+
+    monkeypatch.setattr(writer, "_flush", flush)
+    writer.start()
+    await writer.put({"path": "/1"})
+    while not calls:
+        await asyncio.sleep(0.01)
+    await writer.put({"path": "/2"})
+    await asyncio.sleep(0.2)
+    assert not writer._task.done()
+    await writer.stop()
+
+    assert [i["path"] for i in collection.documents] == ["/2"]
@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 20:00
+# @File           : test_principal_cache.py
+# @IDE            : PyCharm
+# @desc           : 認證主體缓存
+
+import json
+
+import pytest
+import pytest_asyncio
+
+from apps.vadmin.auth import models
+from apps.vadmin.auth.crud import UserDal
+from apps.vadmin.auth.schemas import UserUpdateBaseInfo
+from apps.vadmin.auth.utils.validation.auth import AuthValidation
+from core.database import add_commit_callback, run_commit_callbacks
+from utils.principal_cache import PrincipalCache
+from tests.conftest import QueryCounter
+
+TELEPHONE = "13800000000"
+PASSWORD = "hashed-password"
+
+
+@pytest_asyncio.fixture
+async def principal_cache(redis):
+    PrincipalCache.init(redis)
+    yield PrincipalCache
+    PrincipalCache.init(None)
+
+
+@pytest_asyncio.fixture
+async def staff_user(session_factory):
+    async with session_factory() as db:
+        async with db.begin():
+            menu = models.VadminMenu(title="用户列表", menu_type="2", order=1, perms="auth.user.list")
+            dept = models.VadminDept(name="研發部", dept_key="rd", path=None)
+            role = models.VadminRole(name="管理员", role_key="manager", data_range=1, menus={menu})
+            user = models.VadminUser(
+                telephone=TELEPHONE,
+                name="測試",
+                password=PASSWORD,
+                is_staff=True,
+                roles={role},
+                depts={dept}
+            )
+            db.add(user)
+            await db.flush()
+            ids = user.id, dept.id
+        return ids
+
+
+async def get_staff_user(session_factory):
+    async with session_factory() as db:
+        async with db.begin():
+            user, principal = await AuthValidation.get_staff_user(TELEPHONE, PASSWORD, db)
+            result = (user.id, user.name, {i.role_key for i in user.roles}, {i.id for i in user.depts}, principal)
+        await run_commit_callbacks(db)
+    return result
+
+
+@pytest.mark.asyncio
+async def test_commit_callbacks_run_after_commit_only(session_factory):
+    calls = []
+
+    async def callback(value):
+        calls.append(value)
+
+    async with session_factory() as db:
+        async with db.begin():
+            add_commit_callback(db, callback, "committed")
+            assert calls == []
+        await run_commit_callbacks(db)
+    assert calls == ["committed"]
+
+    async with session_factory() as db:
+        with pytest.raises(RuntimeError):
+            async with db.begin():
+                add_commit_callback(db, callback, "rolled back")
+                raise RuntimeError()
+        await run_commit_callbacks(db)
+    assert calls == ["committed"]
+
+
+@pytest.mark.asyncio
+async def test_staff_user_served_from_cache(engine, session_factory, staff_user, principal_cache):
+    user_id, dept_id = staff_user
+    expected = (user_id, "測試", {"manager"}, {dept_id}, ({"auth.user.list"}, 1, [dept_id]))
+    assert await get_staff_user(session_factory) == expected
+
+    counter = QueryCounter(engine)
+    principal_cache._local.clear()
+    assert await get_staff_user(session_factory) == expected
+    assert await get_staff_user(session_factory) == expected
+    assert counter.count == 0
+
+
+@pytest.mark.asyncio
+async def test_cached_user_can_be_updated(session_factory, staff_user, principal_cache):
+    await get_staff_user(session_factory)
+    async with session_factory() as db:
+        async with db.begin():
+            user, _ = await AuthValidation.get_staff_user(TELEPHONE, PASSWORD, db)
+            data = UserUpdateBaseInfo(name="新名稱", telephone=TELEPHONE)
+            await UserDal(db).update_current_info(user, data)
+        await run_commit_callbacks(db)
+    assert (await get_staff_user(session_factory))[1] == "新名稱"
+
+
+@pytest.mark.asyncio
+async def test_version_bumped_after_commit(session_factory, staff_user, principal_cache):
+    user_id, _ = staff_user
+    versions = await principal_cache.get_versions(user_id)
+    await get_staff_user(session_factory)
+
+    async with session_factory() as db:
+        async with db.begin():
+            user = await UserDal(db).get_data(user_id)
+            await UserDal(db).update_login_info(user, "127.0.0.1")
+            # 提交前版本號不变，其他請求仍讀取旧版本，不會以新版本缓存尚未提交的數據
+            assert await principal_cache.get_versions(user_id) == versions
+        assert await principal_cache.get_versions(user_id) == versions
+        await run_commit_callbacks(db)
+    assert await principal_cache.get_versions(user_id) != versions
+    assert await principal_cache.get(TELEPHONE) is None
+
+
+@pytest.mark.asyncio
+async def test_rollback_keeps_version(session_factory, staff_user, principal_cache):
+    user_id, _ = staff_user
+    versions = await principal_cache.get_versions(user_id)
+    async with session_factory() as db:
+        with pytest.raises(RuntimeError):
+            async with db.begin():
+                user = await UserDal(db).get_data(user_id)
+                await UserDal(db).update_login_info(user, "127.0.0.1")
+                raise RuntimeError()
+        await run_commit_callbacks(db)
+    assert await principal_cache.get_versions(user_id) == versions
+
+
+@pytest.mark.asyncio
+async def test_password_mismatch_is_a_miss(session_factory, staff_user, principal_cache):
+    await get_staff_user(session_factory)
+    async with session_factory() as db:
+        user, principal = await AuthValidation.get_staff_user(TELEPHONE, "old-password", db)
+    assert user is None and principal is None
+
+
+@pytest.mark.asyncio
+async def test_password_not_cached(session_factory, staff_user, redis, principal_cache):
+    await get_staff_user(session_factory)
+    cached = json.loads(await redis.get(PrincipalCache.PRINCIPAL_KEY.format(telephone=TELEPHONE)))
+    assert "password" not in cached["user"]
+    assert PASSWORD not in json.dumps(cached)
+    assert "password" not in principal_cache._get_local(TELEPHONE)["user"]
+
+    async with session_factory() as db:
+        user, _ = await AuthValidation.get_cached_user(TELEPHONE, PASSWORD, db)
+        assert user.password == PASSWORD
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 20:30
+# @File           : test_replica_routing.py
+# @IDE            : PyCharm
+# @desc           : 讀写分离路由，主庫与從庫使用两个 SQLite 數據庫代替
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+from sqlalchemy.orm import selectinload
+
+import core.database
+from apps.vadmin.auth import models
+from apps.vadmin.auth.crud import DeptDal, RoleDal
+from core.database import Base, RoutingSession
+from tests.conftest import create_sqlite_engine
+
+
+async def seed(engine, name: str) -> None:
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with AsyncSession(engine) as db:
+        async with db.begin():
+            db.add(models.VadminDept(id=1, name=name, dept_key=name))
+
+
+@pytest_asyncio.fixture
+async def replica(engine, tmp_path, monkeypatch):
+    replica = create_sqlite_engine(tmp_path / "replica.db")
+    await seed(engine, "primary")
+    await seed(replica, "replica")
+    monkeypatch.setattr(core.database, "async_replica_engine", replica)
+    yield replica
+    await replica.dispose()
+
+
+@pytest.fixture
+def read_session_factory(engine):
+    return async_sessionmaker(
+        autocommit=False,
+        autoflush=False,
+        bind=engine,
+        expire_on_commit=False,
+        class_=AsyncSession,
+        sync_session_class=RoutingSession,
+        info={"v_read_only": True}
+    )
+
+
+@pytest.mark.asyncio
+async def test_read_session_uses_replica(read_session_factory, replica):
+    async with read_session_factory() as db:
+        dal = DeptDal(db)
+        assert (await dal.get_data(1)).name == "replica"
+        datas = await dal.get_datas(v_return_objs=True)
+        assert [i.name for i in datas] == ["replica"]
+        assert await dal.get_count() == 1
+
+
+@pytest.mark.asyncio
+async def test_primary_override(read_session_factory, replica):
+    async with read_session_factory() as db:
+        assert (await DeptDal(db).get_data(1, v_primary=True)).name == "primary"
+
+
+@pytest.mark.asyncio
+async def test_write_session_uses_primary(session_factory, replica):
+    async with session_factory() as db:
+        async with db.begin():
+            dal = DeptDal(db)
+            assert (await dal.get_data(1)).name == "primary"
+            datas = await dal.get_datas(v_return_objs=True)
+            assert [i.name for i in datas] == ["primary"]
+
+
+@pytest.mark.asyncio
+async def test_read_your_writes(read_session_factory, replica):
+    async with read_session_factory() as db:
+        db.add(models.VadminDept(id=2, name="new", dept_key="new"))
+        await db.flush()
+        assert (await DeptDal(db).get_data(2)).name == "new"
+        await db.rollback()
+
+
+@pytest.mark.asyncio
+async def test_statement_write_switches_to_primary(read_session_factory, replica):
+    async with read_session_factory() as db:
+        await db.execute(update(models.VadminDept).where(models.VadminDept.id == 1).values(name="updated"))
+        assert (await DeptDal(db).get_data(1)).name == "updated"
+        await db.rollback()
+
+
+@pytest.mark.asyncio
+async def test_stream_with_selectinload(session_factory, replica):
+    async with session_factory() as db:
+        async with db.begin():
+            dept = await db.get(models.VadminDept, 1)
+            db.add_all([
+                models.VadminRole(id=i, name=f"role{i}", role_key=f"role{i}", depts={dept}) for i in (1, 2)
+            ])
+        chunks = [
+            chunk async for chunk in RoleDal(db).stream_datas(
+                chunk_size=1, v_options=[selectinload(models.VadminRole.depts)]
+            )
+        ]
+    assert [[(i.name, [d.name for d in i.depts]) for i in chunk] for chunk in chunks] == [
+        [("role1", ["primary"])], [("role2", ["primary"])]
+    ]
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("v_primary, name", [(False, "replica"), (True, "primary")])
+async def test_estimate_count_falls_back_off_mysql(engine, read_session_factory, replica, v_primary, name):
+    async with AsyncSession(engine) as db:
+        async with db.begin():
+            db.add(models.VadminDept(id=2, name="primary2", dept_key="primary2"))
+    async with read_session_factory() as db:
+        # SQLite 没有 information_schema，使用精确计數並按 v_primary 路由
+        datas, count = await DeptDal(db).get_datas(
+            v_return_count=True, v_return_objs=True, v_count_strategy="estimate", v_primary=v_primary
+        )
+    assert datas[0].name == name
+    assert count == len(datas) == (2 if v_primary else 1)
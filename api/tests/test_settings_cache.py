@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 22:45
+# @File           : test_settings_cache.py
+# @IDE            : PyCharm
+# @desc           : 系统配置更新后的缓存刷新
+
+import json
+from types import SimpleNamespace
+
+import pytest
+import pytest_asyncio
+
+import core.database
+import utils.cache
+from apps.vadmin.system import crud, models
+from core.database import run_commit_callbacks
+
+
+@pytest_asyncio.fixture
+async def settings(session_factory, redis, monkeypatch):
+    monkeypatch.setattr(crud, "REDIS_DB_ENABLE", True)
+    monkeypatch.setattr(core.database, "REDIS_DB_ENABLE", True)
+    monkeypatch.setattr(utils.cache, "session_factory", session_factory)
+    async with session_factory() as db:
+        async with db.begin():
+            tab = models.VadminSystemSettingsTab(
+                title="邮箱", classify="web", tab_label="邮箱", tab_name="web_email"
+            )
+            db.add(tab)
+            await db.flush()
+            db.add(models.VadminSystemSettings(
+                config_label="邮箱服务器", config_key="email_server", config_value="smtp.old.com", tab_id=tab.id
+            ))
+    await redis.set("web_email", json.dumps({"email_server": "smtp.old.com"}))
+    return SimpleNamespace(app=SimpleNamespace(state=SimpleNamespace(redis=redis)))
+
+
+@pytest.mark.asyncio
+async def test_cache_refreshed_after_commit(session_factory, redis, settings):
+    messages = redis.pubsub()
+    await messages.subscribe(utils.cache.Cache.INVALIDATE_CHANNEL)
+    await messages.get_message(timeout=1)
+    async with session_factory() as db:
+        async with db.begin():
+            await crud.SettingsDal(db).update_datas({"email_server": "smtp.new.com"}, settings)
+            assert json.loads(await redis.get("web_email")) == {"email_server": "smtp.old.com"}
+            assert await messages.get_message(timeout=0.1) is None
+        await run_commit_callbacks(db)
+
+    assert json.loads(await redis.get("web_email")) == {"email_server": "smtp.new.com"}
+    message = await messages.get_message(timeout=1)
+    assert json.loads(message["data"]) == ["web_email"]
+    await messages.aclose()
+
+
+@pytest.mark.asyncio
+async def test_cache_untouched_on_rollback(session_factory, redis, settings):
+    async with session_factory() as db:
+        with pytest.raises(RuntimeError):
+            async with db.begin():
+                await crud.SettingsDal(db).update_datas({"email_server": "smtp.new.com"}, settings)
+                raise RuntimeError("rollback")
+        await run_commit_callbacks(db)
+
+    assert json.loads(await redis.get("web_email")) == {"email_server": "smtp.old.com"}
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/19 00:40
+# @File           : test_t100_api.py
+# @IDE            : PyCharm
+# @desc           : T100 接口共享连接池与重试
+
+import pytest
+import pytest_asyncio
+
+from core import http_client
+from core.http_client import HttpClientManager
+from core.t100_api import T100APIClient
+from tests.fake_t100 import FakeT100Server
+
+
+@pytest_asyncio.fixture
+async def pool(monkeypatch):
+    monkeypatch.setattr(http_client, "HTTP_CLIENT_BACKOFF", 0)
+    HttpClientManager.open()
+    yield
+    await HttpClientManager.close()
+
+
+def client(server: FakeT100Server) -> T100APIClient:
+    obj = T100APIClient()
+    obj.server_ip = server.host
+    return obj
+
+
+@pytest.mark.asyncio
+async def test_connections_reused(pool):
+    with FakeT100Server() as server:
+        results = [await client(server).fetch_data("bd.mes.aps_run", "get_mo_list") for _ in range(5)]
+
+    assert [i.success for i in results] == [True] * 5
+    assert results[0].data == {"name": "bd.mes.aps_run", "action": "get_mo_list"}
+    assert server.requests == 5
+    assert server.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_script_without_pool_uses_own_client():
+    with FakeT100Server() as server:
+        results = [await client(server).fetch_data("bd.mes.aps_run", "get_mo_list") for _ in range(3)]
+
+    assert [i.success for i in results] == [True] * 3
+    assert server.connections == 3
+
+
+@pytest.mark.asyncio
+async def test_idempotent_call_retried(pool):
+    with FakeT100Server(fail_status=[503, 502]) as server:
+        result = await client(server).fetch_data("bd.mes.aps_run", "get_mo_list", idempotent=True)
+
+    assert result.success
+    assert server.requests == 3
+
+
+@pytest.mark.asyncio
+async def test_non_idempotent_call_not_retried(pool):
+    with FakeT100Server(fail_status=[503]) as server:
+        result = await client(server).fetch_data("bd.mes.aps_run", "update_mo")
+
+    assert not result.success
+    assert result.error_code == "HTTP_ERROR"
+    assert server.requests == 1
@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/19 10:00
+# @File           : test_user_export.py
+# @IDE            : PyCharm
+# @desc           : 用户分批导出
+
+import datetime
+
+import openpyxl
+import pytest
+import pytest_asyncio
+from sqlalchemy.orm import selectinload
+
+from apps.vadmin.auth import models
+from apps.vadmin.auth.crud import UserDal
+from tests.conftest import QueryCounter
+from utils.excel.write_xlsx import WriteXlsx
+
+
+@pytest_asyncio.fixture
+async def users(session_factory):
+    async with session_factory() as db:
+        async with db.begin():
+            role = models.VadminRole(id=1, name="角色", role_key="role")
+            dept = models.VadminDept(id=1, name="部門", dept_key="dept")
+            db.add_all([
+                models.VadminUser(
+                    id=i, telephone=f"1380000{i:04d}", name=f"user-{i}", roles={role}, depts={dept}
+                ) for i in range(1, 6)
+            ])
+
+
+@pytest.mark.asyncio
+async def test_stream_chunks_are_buffered_queries(engine, session_factory, users):
+    counter = QueryCounter(engine)
+    options = [selectinload(models.VadminUser.roles), selectinload(models.VadminUser.depts)]
+    async with session_factory() as db:
+        chunks = []
+        async for chunk in UserDal(db).stream_datas(chunk_size=2, v_options=options):
+            # 每批數據及其关联數據在交给调用方前已全部讀取完成
+            assert counter.count == 3 * (len(chunks) + 1)
+            chunks.append([(i.id, [r.name for r in i.roles], [d.name for d in i.depts]) for i in chunk])
+
+    assert chunks == [
+        [(1, ["角色"], ["部門"]), (2, ["角色"], ["部門"])],
+        [(3, ["角色"], ["部門"]), (4, ["角色"], ["部門"])],
+        [(5, ["角色"], ["部門"])]
+    ]
+    # 最后一批不足 chunk_size 時不再多查一次
+    assert counter.count == 9
+
+
+@pytest.mark.asyncio
+async def test_stream_page(session_factory, users):
+    async with session_factory() as db:
+        chunks = [
+            [i.id for i in chunk]
+            async for chunk in UserDal(db).stream_datas(page=2, limit=3, chunk_size=2, v_order="desc")
+        ]
+    assert chunks == [[2, 1]]
+    async with session_factory() as db:
+        chunks = [[i.id for i in chunk] async for chunk in UserDal(db).stream_datas(page=1, limit=3, chunk_size=2)]
+    assert chunks == [[1, 2], [3]]
+
+
+@pytest.mark.asyncio
+async def test_write_stream_dates_readable(tmp_path):
+    async def chunks():
+        yield [["user", datetime.datetime(2024, 1, 2, 3, 4, 5), datetime.date(2024, 1, 2), datetime.time(3, 4), 1]]
+
+    em = WriteXlsx()
+    em.create_excel(str(tmp_path / "users.xlsx"), constant_memory=True)
+    try:
+        assert await em.write_stream(["姓名", "最近登錄", "日期", "時間", "數量"], chunks()) == 1
+    finally:
+        em.close()
+
+    cells = openpyxl.load_workbook(tmp_path / "users.xlsx").active[2]
+    assert cells[1].value == datetime.datetime(2024, 1, 2, 3, 4, 5)
+    assert [i.number_format for i in cells] == ["General", "yyyy-mm-dd hh:mm:ss", "yyyy-mm-dd", "hh:mm:ss", "General"]
@@ -1,8 +1,90 @@
+import asyncio
 import configparser
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from requests import Session
+from requests.adapters import HTTPAdapter
 from zeep import Client
+from zeep.cache import SqliteCache
+from zeep.transports import Transport
 import xml.etree.ElementTree as ET
 
 
+class BpmClientManager(object):
+    """
+    BPM WebService 長連接客戶端管理
+
+    WSDL 只在進程内解析一次，並以 SqliteCache 缓存到磁碟，重啟後不需要重新下載；
+    HTTP 連接通過 requests.Session 連接池複用；
+    zeep 為同步調用，統一放到有上限的線程池中執行，避免阻塞事件循環。
+    線程池與連接在 core.event.bpm_client 全局事件中於應用關閉時釋放。
+    """
+    WSDL_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "temp", "bpm_wsdl.db")
+    # WSDL 磁碟缓存有效時間（秒）
+    WSDL_CACHE_TIMEOUT = 86400
+    # 下載 WSDL 超時時間（秒）
+    TIMEOUT = 30
+    # SOAP 調用超時時間（秒）
+    OPERATION_TIMEOUT = 60
+    # 連接池大小，與線程池大小保持一致
+    MAX_WORKERS = 8
+
+    _clients: dict[str, Client] = {}
+    _lock = threading.Lock()
+    _executor: ThreadPoolExecutor | None = None
+
+    @classmethod
+    def get_client(cls, wsdl: str) -> Client:
+        """
+        獲取共用的 zeep 客戶端，首次調用時創建
+        """
+        client = cls._clients.get(wsdl)
+        if client is None:
+            with cls._lock:
+                client = cls._clients.get(wsdl)
+                if client is None:
+                    session = Session()
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=cls.MAX_WORKERS)
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    transport = Transport(
+                        session=session,
+                        cache=SqliteCache(path=cls.WSDL_CACHE_PATH, timeout=cls.WSDL_CACHE_TIMEOUT),
+                        timeout=cls.TIMEOUT,
+                        operation_timeout=cls.OPERATION_TIMEOUT
+                    )
+                    client = Client(wsdl=wsdl, transport=transport)
+                    cls._clients[wsdl] = client
+        return client
+
+    @classmethod
+    async def run(cls, func, *args, **kwargs):
+        """
+        在 BPM 線程池中執行同步調用
+        """
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(max_workers=cls.MAX_WORKERS, thread_name_prefix="bpm")
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(cls._executor, functools.partial(func, *args, **kwargs))
+
+    @classmethod
+    async def close(cls) -> None:
+        """
+        等待執行中的調用完成後關閉線程池，並關閉所有客戶端的 HTTP 連接，在應用關閉事件中調用
+        """
+        with cls._lock:
+            executor, cls._executor = cls._executor, None
+            clients, cls._clients = cls._clients, {}
+        if executor is not None:
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+        for client in clients.values():
+            client.transport.session.close()
+
+
 class bpm_wsl(object):
     def __init__(self, ):
         # 載入WSDL
@@ -13,7 +95,7 @@ class bpm_wsl(object):
 
     def __connect(self):
         try:
-            self.client = Client(wsdl=self.wsdl)
+            self.client = BpmClientManager.get_client(self.wsdl)
             return self.client
         except Exception as e:
             self.client = False
@@ -30,9 +112,6 @@ class bpm_wsl(object):
                     print(f"Operation: {operation.name}")
             except Exception as e:
                 return False, 'wsdl error:' + str(e)
-            finally:
-                # 關閉 zeep 客戶端
-                self.client.transport.session.close()
 
     # 取得完整表單資料
     def get_all_xml_form(self, pSerialNo):
@@ -206,9 +285,6 @@ class bpm_wsl(object):
                 return True, forms_info
             except Exception as e:
                 return False, 'wsdl error:' + str(e)
-            finally:
-                if self.client and hasattr(self.client, 'transport'):
-                    self.client.transport.session.close()
         else:
             return False, f'wsdl error: Failed to connect to BPM service at {self.wsdl}'
 
@@ -299,8 +375,6 @@ class bpm_wsl(object):
                 return True, response_dict
             except Exception as e:
                 return False, 'wsdl error:' + str(e)
-            finally:
-                self.client.transport.session.close()
 
     # 同意審核
     def completeWorkItem(self, pWorkItemOID, pUserId, pComment='自動審核'):
@@ -312,8 +386,6 @@ class bpm_wsl(object):
             except Exception as e:
                 print('wsdl_error:' + str(e))
                 return False, 'wsdl error:' + str(e)
-            finally:
-                self.client.transport.session.close()
 
     # 更新work item 狀態為 開始('同意審核')
     def acceptWorkItem(self, pWorkItemOID, pUserId):
@@ -324,8 +396,6 @@ class bpm_wsl(object):
             except Exception as e:
                 print('wsdl_error:' + str(e))
                 return False, 'wsdl error:' + str(e)
-            finally:
-                self.client.transport.session.close()
 
     # 取回重辦
     def reexecuteActivity(self, pProcessSerialNo, pReexecuteActivityId, pAskReexecuteUserId,
@@ -340,8 +410,6 @@ class bpm_wsl(object):
             except Exception as e:
                 print('wsdl_error:' + str(e))
                 return False, 'wsdl error:' + str(e)
-            finally:
-                self.client.transport.session.close()
 
     # 已撤銷
     def abortProcessForSerialNo(self):
@@ -383,8 +451,6 @@ class bpm_wsl(object):
                 return True, act_forms_infos_dict
         except Exception as e:
             return False, 'wsdl error:' + str(e)
-        finally:
-            self.client.transport.session.close()
 
     # 取得工作狀態
     def checkWorkItemState(self, pWorkItemOID):
@@ -395,8 +461,6 @@ class bpm_wsl(object):
                 return True, int(response)
         except Exception as e:
             return False, 'wsdl error:' + str(e)
-        finally:
-            self.client.transport.session.close()
 
     # 查詢這個表單正在處理的工作項目
     def fetchProcInstances(self, pProcessId, pProcessInitialStartTime='', pProcessInitialEndTime='',
@@ -412,8 +476,6 @@ class bpm_wsl(object):
                 return True, response
         except Exception as e:
             return False, 'wsdl error:' + str(e)
-        finally:
-            self.client.transport.session.close()
 
 
 if __name__ == '__main__':
@@ -6,16 +6,29 @@
 # @IDE            : PyCharm
 # @desc           : 缓存
 
+"""
+系统配置两级缓存：進程内缓存（SETTINGS_CACHE_TTL 秒過期） -> Redis -> MySQL
+
+系统配置更新后写入 Redis，並通過 Redis 频道通知所有進程清除進程内缓存，
+热路径上讀取系统配置只是一次内存查找。
+同一配置同時未命中時只會加載一次，其他請求等待加載结果。
+"""
+
+import asyncio
+import json
+import time
 from typing import List
 
 from sqlalchemy import false
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import joinedload
 from core.logger import logger  # 注意：報錯就在这里，如果只写 core.logger 會写入日誌報錯，很难排查
-from core.database import db_getter
+from core.database import session_factory
 from apps.vadmin.system.models import VadminSystemSettingsTab
-import json
+from application.settings import SETTINGS_CACHE_TTL
 from redis.asyncio.client import Redis
+from redis.exceptions import RedisError
 from core.exception import CustomException
 from utils import status
 
@@ -23,26 +36,40 @@ from utils import status
 class Cache:
 
     DEFAULT_TAB_NAMES = ["wx_server", "aliyun_sms", "aliyun_oss", "web_email"]
+    # 進程内缓存失效通知频道
+    INVALIDATE_CHANNEL = "settings_cache_invalidate"
+
+    # tab_name -> (過期時間, 配置)
+    _local: dict[str, tuple[float, dict]] = {}
+    # tab_name -> 正在加載的任務
+    _loading: dict[str, asyncio.Future] = {}
+    # tab_name -> 失效次數，加載期間發生失效時不写入進程内缓存
+    _versions: dict[str, int] = {}
+    _listener: asyncio.Task | None = None
 
     def __init__(self, rd: Redis):
         self.rd = rd
 
-    async def __get_tab_name_values(self, tab_names: List[str]):
+    @classmethod
+    async def __get_tab_name_values(cls, tab_names: List[str], session: AsyncSession = None) -> dict:
         """
         獲取系统配置標籤下的標籤信息
+        :param tab_names:
+        :param session: 為空時使用新的會話，查詢完成后關閉
         """
-        async_session = db_getter()
-        session = await async_session.__anext__()
+        if session is None:
+            async with session_factory() as session:
+                return await cls.__get_tab_name_values(tab_names, session)
         model = VadminSystemSettingsTab
         v_options = [joinedload(model.settings)]
         sql = select(model).where(
             model.is_delete == false(),
             model.tab_name.in_(tab_names),
             model.disabled == false()
-            ).options(*[load for load in v_options])
+            ).options(*[load for load in v_options]).execution_options(populate_existing=True)
         queryset = await session.execute(sql)
         datas = queryset.scalars().unique().all()
-        return self.__generate_values(datas)
+        return cls.__generate_values(datas)
 
     @classmethod
     def __generate_values(cls, datas: List[VadminSystemSettingsTab]):
@@ -58,19 +85,45 @@ class Cache:
             for tab in datas
         }
 
-    async def cache_tab_names(self, tab_names: List[str] = None):
+    async def cache_tab_names(
+            self,
+            tab_names: List[str] = None,
+            session: AsyncSession = None,
+            notify: bool = True
+    ) -> dict:
         """
-        缓存系统配置
+        从數據庫重新加載系统配置写入 Redis，並通知所有進程清除進程内缓存
         如果手動修改了mysql數據庫中的配置
         那么需要在redis中将對应的tab_name刪除
+        :param tab_names:
+        :param session: 為空時使用新的會話讀取已提交的配置
+        :param notify: 是否通知清除進程内缓存，Redis 未命中回源時無需通知
+        :return:
         """
-
         if not tab_names:
             tab_names = self.DEFAULT_TAB_NAMES
-        datas = await self.__get_tab_name_values(tab_names)
+        datas = await self.__get_tab_name_values(tab_names, session)
 
-        for k, v in datas.items():
-            await self.rd.client().set(k, json.dumps(v))
+        if datas:
+            async with self.rd.pipeline(transaction=False) as pipe:
+                for k, v in datas.items():
+                    pipe.set(k, json.dumps(v))
+                await pipe.execute()
+        if notify:
+            await self.invalidate(tab_names)
+        return datas
+
+    async def invalidate(self, tab_names: List[str]) -> None:
+        """
+        清除當前進程内缓存，並通知其他進程清除
+        :param tab_names:
+        :return:
+        """
+        self.clear_local(tab_names)
+        try:
+            await self.rd.publish(self.INVALIDATE_CHANNEL, json.dumps(tab_names))
+        except RedisError as e:
+            logger.error(f"發送系统配置缓存失效通知失敗：{e}")
 
     async def get_tab_name(self, tab_name: str, retry: int = 3):
         """
@@ -78,12 +131,81 @@ class Cache:
         :param tab_name: 配置表標籤名稱
         :param retry: 重试次數
         """
+        item = self._local.get(tab_name)
+        if item and item[0] > time.monotonic():
+            return dict(item[1])
+        future = self._loading.get(tab_name)
+        if future is None:
+            future = asyncio.ensure_future(self.__load(tab_name, retry))
+            self._loading[tab_name] = future
+            future.add_done_callback(lambda _: self._loading.pop(tab_name, None))
+        # shield：等待中的請求被取消時不影响加載任務
+        return dict(await asyncio.shield(future))
+
+    async def __load(self, tab_name: str, retry: int) -> dict:
+        """
+        依次从 Redis、數據庫加載系统配置，並写入進程内缓存
+        """
+        version = self._versions.get(tab_name, 0)
         result = await self.rd.get(tab_name)
-        if not result and retry > 0:
+        while not result and retry > 0:
             logger.error(f"未從Redis中獲取到{tab_name}配置信息，正在重新更新配置信息，重試次數：{retry}。")
-            await self.cache_tab_names([tab_name])
-            return await self.get_tab_name(tab_name, retry - 1)
-        elif not result and retry == 0:
+            datas = await self.cache_tab_names([tab_name], notify=False)
+            if tab_name in datas:
+                result = json.dumps(datas[tab_name])
+            retry -= 1
+        if not result:
             raise CustomException(f"獲取{tab_name}配置信息失敗，請聯繫管理員！", code=status.HTTP_ERROR)
-        else:
-            return json.loads(result)
+        value = json.loads(result)
+        if self._versions.get(tab_name, 0) == version:
+            self._local[tab_name] = (time.monotonic() + SETTINGS_CACHE_TTL, value)
+        return value
+
+    @classmethod
+    def clear_local(cls, tab_names: List[str] = None) -> None:
+        """
+        清除進程内缓存
+        :param tab_names: 為空時清除全部
+        """
+        if tab_names is None:
+            tab_names = list(cls._local.keys() | cls._loading.keys())
+        for tab_name in tab_names:
+            cls._local.pop(tab_name, None)
+            cls._versions[tab_name] = cls._versions.get(tab_name, 0) + 1
+
+    @classmethod
+    def start_listener(cls, rd: Redis) -> None:
+        """
+        启動缓存失效通知监听任務，在 redis 连接事件中調用
+        """
+        if cls._listener is None:
+            cls._listener = asyncio.create_task(cls.__listen(rd), name="settings_cache_listener")
+
+    @classmethod
+    async def stop_listener(cls) -> None:
+        """
+        停止缓存失效通知监听任務
+        """
+        if cls._listener is not None:
+            cls._listener.cancel()
+            try:
+                await cls._listener
+            except asyncio.CancelledError:
+                pass
+            cls._listener = None
+        cls.clear_local()
+
+    @classmethod
+    async def __listen(cls, rd: Redis) -> None:
+        while True:
+            try:
+                async with rd.pubsub() as pubsub:
+                    await pubsub.subscribe(cls.INVALIDATE_CHANNEL)
+                    # 重新订阅期間可能错过通知，清除全部缓存
+                    cls.clear_local()
+                    async for message in pubsub.listen():
+                        if message["type"] == "message":
+                            cls.clear_local(json.loads(message["data"]))
+            except RedisError as e:
+                logger.error(f"系统配置缓存失效通知监听中断，1 秒后重新订阅：{e}")
+                await asyncio.sleep(1)
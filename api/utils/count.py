@@ -6,8 +6,18 @@
 # @IDE            : PyCharm
 # @desc           : 计數
 
+"""
+计數与限流均通過 Lua 脚本在 Redis 中原子执行，每次操作只需一次網絡往返，多进程并发時结果依然准确。
+Lua 脚本通過 EVALSHA 执行，Redis 中不存在時自動回退為 EVAL。
+"""
 
+import uuid
+from typing import Callable
+from fastapi import Request
 from redis.asyncio.client import Redis
+from application.settings import REDIS_DB_ENABLE
+from core.exception import CustomException
+from utils import status
 
 
 class Count:
@@ -15,17 +25,28 @@ class Count:
     计數
     """
 
+    # 增加计數並设置過期時間
+    INCR_SCRIPT = """
+    local number = redis.call('INCRBY', KEYS[1], ARGV[1])
+    if tonumber(ARGV[2]) > 0 then
+        redis.call('EXPIRE', KEYS[1], ARGV[2])
+    end
+    return number
+    """
+
     def __init__(self, rd: Redis, key):
         self.rd = rd
         self.key = key
 
+    async def incr(self, amount: int, ex: int = None) -> int:
+        script = self.rd.register_script(self.INCR_SCRIPT)
+        return int(await script(keys=[self.key], args=[amount, ex or 0]))
+
     async def add(self, ex: int = None) -> int:
-        await self.rd.set(self.key, await self.get_count() + 1, ex=ex)
-        return await self.get_count()
+        return await self.incr(1, ex)
 
     async def subtract(self, ex: int = None) -> int:
-        await self.rd.set(self.key, await self.get_count() - 1, ex=ex)
-        return await self.get_count()
+        return await self.incr(-1, ex)
 
     async def get_count(self) -> int:
         number = await self.rd.get(self.key)
@@ -38,3 +59,86 @@ class Count:
 
     async def delete(self) -> None:
         await self.rd.delete(self.key)
+
+
+class RateLimiter:
+    """
+    滑動窗口限流
+
+    使用有序集合记錄窗口内每次請求的時間，時間取自 Redis 服務器，多个进程之间不受本机時鐘影响
+    """
+
+    # 返回 {是否允许, 窗口内請求數, 需要等待的毫秒數}
+    SLIDING_WINDOW_SCRIPT = """
+    local now = redis.call('TIME')
+    local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+    local window = tonumber(ARGV[1])
+    local limit = tonumber(ARGV[2])
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], 0, now_ms - window)
+    local count = redis.call('ZCARD', KEYS[1])
+    if count < limit then
+        redis.call('ZADD', KEYS[1], now_ms, ARGV[3])
+        redis.call('PEXPIRE', KEYS[1], window)
+        return {1, count + 1, 0}
+    end
+    local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+    return {0, count, tonumber(oldest[2]) + window - now_ms}
+    """
+
+    def __init__(self, rd: Redis, key: str, limit: int, window: int):
+        """
+        :param rd:
+        :param key: 限流键
+        :param limit: 時間窗口内最大請求次數
+        :param window: 時間窗口（秒）
+        """
+        self.rd = rd
+        self.key = key
+        self.limit = limit
+        self.window = window
+
+    async def hit(self) -> tuple[bool, int, int]:
+        """
+        记錄一次請求
+        :return: 是否允许，窗口内請求數，需要等待的毫秒數
+        """
+        script = self.rd.register_script(self.SLIDING_WINDOW_SCRIPT)
+        allowed, count, retry_after = await script(
+            keys=[self.key],
+            args=[self.window * 1000, self.limit, uuid.uuid4().hex]
+        )
+        return bool(allowed), int(count), int(retry_after)
+
+
+class RateLimit:
+    """
+    接口限流依赖，默认按客户端 IP 限流
+
+    使用示例：
+    @app.post("/login", dependencies=[Depends(RateLimit("login", 30, 60))])
+    """
+
+    def __init__(self, name: str, limit: int, window: int, key_func: Callable[[Request], str] = None):
+        """
+        :param name: 限流名稱，不同接口使用不同名稱
+        :param limit: 時間窗口内最大請求次數
+        :param window: 時間窗口（秒）
+        :param key_func: 限流对象，默认為客户端 IP
+        """
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.key_func = key_func
+
+    async def __call__(self, request: Request) -> None:
+        if not REDIS_DB_ENABLE:
+            return
+        target = self.key_func(request) if self.key_func else request.client.host
+        limiter = RateLimiter(request.app.state.redis, f"rate_limit:{self.name}:{target}", self.limit, self.window)
+        allowed, _, retry_after = await limiter.hit()
+        if not allowed:
+            raise CustomException(
+                msg=f"請求過于频繁，請 {retry_after // 1000 + 1} 秒后再试",
+                code=status.HTTP_429_TOO_MANY_REQUESTS,
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS
+            )
@@ -11,9 +11,10 @@ XlsxWriter：https://github.com/jmcnamara/XlsxWriter
 博客教程：https://blog.csdn.net/lemonbit/article/details/113855768
 """
 
+import datetime
 import os.path
 import xlsxwriter
-from typing import List
+from typing import List, AsyncIterable, Callable, Any
 from application.settings import STATIC_ROOT, STATIC_URL
 from utils.file.file_base import FileBase
 from pathlib import Path
@@ -30,12 +31,19 @@ class WriteXlsx:
         self.wb = None
         self.sheet = None
 
-    def create_excel(self, file_path: str = None, sheet_name: str = "sheet1", save_static: bool = False) -> None:
+    def create_excel(
+            self,
+            file_path: str = None,
+            sheet_name: str = "sheet1",
+            save_static: bool = False,
+            constant_memory: bool = False
+    ) -> None:
         """
         創建 excel 文件
         :param file_path: 文件绝對路径或相對路径
         :param sheet_name: sheet 名稱
         :param save_static: 保存方式 static 静態资源或者临時文件
+        :param constant_memory: 常量内存模式，每写完一行即刷新到临時文件，内存占用与行數無關，但只能按行顺序写入
         :return:
         """
         if not file_path:
@@ -52,7 +60,7 @@ class WriteXlsx:
             self.file_path = file_path
         Path(self.file_path).parent.mkdir(parents=True, exist_ok=True)
         self.sheet_name = sheet_name
-        self.wb = xlsxwriter.Workbook(self.file_path)
+        self.wb = xlsxwriter.Workbook(self.file_path, {"constant_memory": constant_memory})
         self.sheet = self.wb.add_worksheet(sheet_name)
 
     def generate_template(self, headers: List[dict] = None, max_row: int = 101) -> None:
@@ -107,6 +115,58 @@ class WriteXlsx:
         # 设置行高
         self.sheet.set_default_row(25)
 
+    DATE_FORMATS = (
+        (datetime.datetime, "yyyy-mm-dd hh:mm:ss"),
+        (datetime.date, "yyyy-mm-dd"),
+        (datetime.time, "hh:mm:ss")
+    )
+
+    def get_cell_format(self, num_format: str = None) -> Any:
+        """
+        默认单元格樣式
+        :param num_format: 數字格式，時間類型的单元格需要指定，否则显示為序列号
+        """
+        font_format = {
+            'bold': False,  # 字体加粗
+            'align': 'center',  # 水平位置设置：居中
+            'valign': 'vcenter',  # 垂直位置设置，居中
+            'font_size': 11,  # '字体大小设置'
+        }
+        if num_format:
+            font_format['num_format'] = num_format
+        return self.wb.add_format(font_format)
+
+    async def write_stream(
+            self,
+            header: list,
+            chunks: AsyncIterable[list],
+            converter: Callable[[Any], list] = None
+    ) -> int:
+        """
+        流式写入 excel 文件，配合 constant_memory 使用，每次只在内存中保留一批數據
+
+        :param header: 表头
+        :param chunks: 异步迭代的分批數據
+        :param converter: 将每条數據转换為行數據，為空時數據本身即為行數據
+        :return: 写入的數據行數
+        """
+        cell_format = self.get_cell_format()
+        date_formats = [(date_type, self.get_cell_format(num_format)) for date_type, num_format in self.DATE_FORMATS]
+        self.sheet.write_row(0, 0, header, cell_format)
+        row_number = 1
+        async for chunk in chunks:
+            for item in chunk:
+                row = converter(item) if converter else item
+                for column, value in enumerate(row):
+                    value_format = next((f for t, f in date_formats if isinstance(value, t)), cell_format)
+                    self.sheet.write(row_number, column, value, value_format)
+                row_number += 1
+        # 设置列宽
+        self.sheet.set_column(0, len(header) - 1, 22)
+        # 设置行高
+        self.sheet.set_default_row(25)
+        return row_number - 1
+
     def close(self) -> None:
         """
         关闭文件
@@ -7,21 +7,35 @@
 # @desc           : 獲取IP地址归属地
 
 """
+IP 归属地解析顺序：
+1. 進程内 LRU 缓存
+2. 本地 IP 段數據庫（IP_DATABASE_PATH），進程内只加載一次，二分查找
+3. 第三方服務 ip138（IP_PARSE_ENABLE），只在后台异步查詢，結果写入缓存並通過回調返回，不影响請求耗時
+
+本地 IP 段數據庫由 CSV 文件生成：python main.py build-ip-db ip.csv
+CSV 每行格式：起始IP,結束IP,国家,省份,城市,区县,运营商,郵政编碼,地区区号
+
 文檔：https://user.ip138.com/ip/doc
 IP查詢第三方服務，有1000次的免费次數
 
 JSONP請求示例（IPv4）
 https://api.ip138.com/ip/?ip=58.16.180.3&datatype=jsonp&token=cc87f3c77747bccbaaee35006da1ebb65e0bad57
-
-aiohttp 异步請求文檔：https://docs.aiohttp.org/en/stable/client_quickstart.html
 """
-from aiohttp import TCPConnector
+import asyncio
+import csv
+import ipaddress
+import json
+import os
+import struct
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+from typing import Awaitable, Callable
 
-from application.settings import IP_PARSE_TOKEN, IP_PARSE_ENABLE
-import aiohttp
+from application.settings import IP_PARSE_TOKEN, IP_PARSE_ENABLE, IP_DATABASE_PATH, IP_CACHE_MAXSIZE
+from core.http_client import HttpClientManager
 from core.logger import logger
 from pydantic import BaseModel
-from typing import Optional
 
 
 class IPLocationOut(BaseModel):
@@ -35,37 +49,199 @@ class IPLocationOut(BaseModel):
     postal_code: str | None = None
     area_code: str | None = None
 
+    @classmethod
+    def from_fields(cls, ip: str, data: list) -> "IPLocationOut":
+        """
+        按 国家,省份,城市,区县,运营商,郵政编碼,地区区号 顺序的字段創建
+        """
+        return cls(
+            ip=ip,
+            address=f"{''.join(data[i] for i in range(0, 4))} {data[4]}",
+            country=data[0],
+            province=data[1],
+            city=data[2],
+            county=data[3],
+            operator=data[4],
+            postal_code=data[5],
+            area_code=data[6]
+        )
+
+
+class IPRangeDatabase:
+    """
+    本地 IPv4 段數據庫
+
+    文件格式（小端序）：
+    MAGIC | 段數量 uint32 | 起始IP uint32[n] | 結束IP uint32[n] | 归属地下标 uint32[n] | 归属地 JSON 列表
+    """
+
+    MAGIC = b"KIPDB1"
+
+    def __init__(self, starts: array, ends: array, indexes: array, records: list[list[str]]):
+        self.starts = starts
+        self.ends = ends
+        self.indexes = indexes
+        self.records = records
+
+    @classmethod
+    def load(cls, path: str) -> "IPRangeDatabase":
+        """
+        加載數據庫文件
+        """
+        with open(path, "rb") as f:
+            data = f.read()
+        if not data.startswith(cls.MAGIC):
+            raise ValueError(f"無效的 IP 數據庫文件：{path}")
+        offset = len(cls.MAGIC)
+        count = struct.unpack_from("<I", data, offset)[0]
+        offset += 4
+        columns = []
+        for _ in range(3):
+            column = array("I")
+            column.frombytes(data[offset:offset + count * 4])
+            if column.itemsize != 4:
+                raise ValueError("當前平台不支持 4 字节無符號整數數组")
+            columns.append(column)
+            offset += count * 4
+        records = json.loads(data[offset:].decode("utf-8"))
+        return cls(*columns, records)
+
+    @classmethod
+    def build(cls, csv_path: str, path: str) -> int:
+        """
+        由 CSV 文件生成數據庫文件，IP 段不能重叠
+        :param csv_path: CSV 文件路径，每行：起始IP,結束IP,国家,省份,城市,区县,运营商,郵政编碼,地区区号
+        :param path: 數據庫文件保存路径
+        :return: IP 段數量
+        """
+        ranges = []
+        records = []
+        record_indexes = {}
+        with open(csv_path, encoding="utf-8") as f:
+            for row in csv.reader(f):
+                if len(row) < 2:
+                    continue
+                fields = (row[2:] + [""] * 7)[:7]
+                key = tuple(fields)
+                if key not in record_indexes:
+                    record_indexes[key] = len(records)
+                    records.append(fields)
+                start = int(ipaddress.IPv4Address(row[0].strip()))
+                end = int(ipaddress.IPv4Address(row[1].strip()))
+                ranges.append((start, end, record_indexes[key]))
+        ranges.sort()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(cls.MAGIC)
+            f.write(struct.pack("<I", len(ranges)))
+            for column in range(3):
+                f.write(array("I", [item[column] for item in ranges]).tobytes())
+            f.write(json.dumps(records, ensure_ascii=False).encode("utf-8"))
+        return len(ranges)
+
+    def search(self, ip: str) -> list[str] | None:
+        """
+        查詢 IP 归属地
+        :param ip: IPv4 地址
+        :return: 未找到時返回 None
+        """
+        number = int(ipaddress.IPv4Address(ip))
+        i = bisect_right(self.starts, number) - 1
+        if i < 0 or number > self.ends[i]:
+            return None
+        return self.records[self.indexes[i]]
+
 
 class IPManage:
 
+    _database: IPRangeDatabase | None = None
+    _database_loaded = False
+    _cache: OrderedDict = OrderedDict()
+    # 后台查詢任務，保持引用避免被回收，同一 IP 同時只查詢一次
+    _remote_tasks: dict[str, asyncio.Task] = {}
+
     def __init__(self, ip: str):
         self.ip = ip
         self.url = f"https://api.ip138.com/ip/?ip={ip}&datatype=jsonp&token={IP_PARSE_TOKEN}"
 
-    async def parse(self):
+    @classmethod
+    def get_database(cls) -> IPRangeDatabase | None:
         """
-        IP 數據解析
+        獲取本地 IP 段數據庫，首次調用時加載
+        """
+        if not cls._database_loaded:
+            cls._database_loaded = True
+            if os.path.exists(IP_DATABASE_PATH):
+                try:
+                    cls._database = IPRangeDatabase.load(IP_DATABASE_PATH)
+                except (OSError, ValueError) as e:
+                    logger.error(f"加載本地 IP 數據庫失敗：{e}")
+        return cls._database
 
-        接口返回：{'ret': 'ok', 'ip': '114.222.121.253','data': ['中国', '江苏', '南京', '江宁区', '电信', '211100', '025']}
+    async def parse(self) -> IPLocationOut:
         """
-        out = IPLocationOut()
-        out.ip = self.ip
-        if not IP_PARSE_ENABLE:
-            logger.warning("未開啟IP地址數據解析，無法獲取到IP所屬地，請在application/config/production.py:IP_PARSE_ENABLE中开启！")
-            return out
-        async with aiohttp.ClientSession(connector=TCPConnector(ssl=False)) as session:
-            async with session.get(self.url) as resp:
-                body = await resp.json()
-                if body.get("ret") != 'ok':
-                    logger.error(f"獲取IP所屬地失敗：{body}")
-                    return out
-                data = body.get("data")
-                out.address = f"{''.join(data[i] for i in range(0, 4))} {data[4]}"
-                out.country = data[0]
-                out.province = data[1]
-                out.city = data[2]
-                out.county = data[3]
-                out.operator = data[4]
-                out.postal_code = data[5]
-                out.area_code = data[6]
+        IP 數據解析，只查詢缓存与本地 IP 數據庫，不會發起網絡請求
+        未解析到時可以調用 parse_in_background 在后台通過第三方服務查詢
+        """
+        out = self._cache.get(self.ip)
+        if out is not None:
+            self._cache.move_to_end(self.ip)
+            return out.model_copy()
+        out = IPLocationOut(ip=self.ip)
+        if self.is_public():
+            database = self.get_database()
+            data = database.search(self.ip) if database else None
+            if data is None:
+                # 未命中不缓存，后台查詢成功后會写入缓存
                 return out
+            out = IPLocationOut.from_fields(self.ip, data)
+        self.set_cache(out)
+        return out.model_copy()
+
+    def parse_in_background(self, callback: Callable[[IPLocationOut], Awaitable[None]] = None) -> bool:
+        """
+        在后台通過第三方服務查詢 IP 归属地，結果写入缓存
+        :param callback: 查詢成功后的回調
+        :return: 是否已創建后台任務
+        """
+        if not IP_PARSE_ENABLE or not self.is_public() or self.ip in self._remote_tasks:
+            return False
+        task = asyncio.create_task(self.__parse_remote(callback))
+        self._remote_tasks[self.ip] = task
+        task.add_done_callback(lambda _: self._remote_tasks.pop(self.ip, None))
+        return True
+
+    async def __parse_remote(self, callback: Callable[[IPLocationOut], Awaitable[None]] | None) -> None:
+        """
+        第三方服務 IP 數據解析
+
+        接口返回：{'ret': 'ok', 'ip': '114.222.121.253','data': ['中国', '江苏', '南京', '江宁区', '电信', '211100', '025']}
+        """
+        try:
+            resp = await HttpClientManager.request("GET", self.url, idempotent=True)
+            body = resp.json()
+            if body.get("ret") != 'ok':
+                logger.error(f"獲取IP所屬地失敗：{body}")
+                return
+            out = IPLocationOut.from_fields(self.ip, body.get("data"))
+            self.set_cache(out)
+            if callback:
+                await callback(out.model_copy())
+        except Exception as e:
+            logger.error(f"獲取IP所屬地失敗：{e}")
+
+    def is_public(self) -> bool:
+        """
+        是否為公網 IPv4 地址，内網地址与 IPv6 地址不查詢归属地
+        """
+        try:
+            address = ipaddress.ip_address(self.ip)
+        except ValueError:
+            return False
+        return address.version == 4 and address.is_global
+
+    def set_cache(self, out: IPLocationOut) -> None:
+        self._cache[self.ip] = out
+        self._cache.move_to_end(self.ip)
+        while len(self._cache) > IP_CACHE_MAXSIZE:
+            self._cache.popitem(last=False)
@@ -0,0 +1,125 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 17:00
+# @File           : password.py
+# @IDE            : PyCharm
+# @desc           : 密碼哈希与驗證
+
+"""
+bcrypt 哈希与驗證每次耗時约 200ms，直接在事件循环中执行會阻塞同一進程内的所有請求。
+统一放到独立的線程池中执行（bcrypt 计算時會释放 GIL，多線程可以利用多核），
+線程數即并发上限，超出的任務排隊等待，排隊數超过 PASSWORD_HASH_MAX_QUEUE 時直接拒绝，避免登錄洪峰拖垮服務。
+
+PASSWORD_BCRYPT_ROUNDS 变更后，用户下次登錄時會自動使用新的参數重新生成哈希密碼。
+"""
+
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import status
+from passlib.context import CryptContext
+from application.settings import PASSWORD_BCRYPT_ROUNDS, PASSWORD_HASH_MAX_WORKERS, PASSWORD_HASH_MAX_QUEUE
+from core.exception import CustomException
+
+pwd_context = CryptContext(schemes=['bcrypt'], deprecated='auto', bcrypt__rounds=PASSWORD_BCRYPT_ROUNDS)
+
+
+class PasswordHasher:
+
+    MAX_WORKERS = PASSWORD_HASH_MAX_WORKERS
+    # 最大排隊數，0 為不限制
+    MAX_QUEUE = PASSWORD_HASH_MAX_QUEUE
+
+    _executor: ThreadPoolExecutor | None = None
+    _lock = threading.Lock()
+    # 已提交未完成的任務數
+    in_flight = 0
+    # 已完成的任務數
+    completed = 0
+    # 因排隊已满被拒绝的任務數
+    rejected = 0
+
+    @classmethod
+    async def hash(cls, password: str) -> str:
+        """
+        生成哈希密碼
+        :param password: 原始密碼
+        :return: 哈希密碼
+        """
+        return await cls.run(pwd_context.hash, password)
+
+    @classmethod
+    async def hash_many(cls, passwords: list[str]) -> list[str]:
+        """
+        批量生成哈希密碼，每批最多占满線程池，避免批量任務挤占登錄請求的排隊名额
+        :param passwords: 原始密碼列表
+        :return: 哈希密碼列表，与原始密碼顺序一致
+        """
+        result = []
+        for i in range(0, len(passwords), cls.MAX_WORKERS):
+            batch = passwords[i:i + cls.MAX_WORKERS]
+            result.extend(await asyncio.gather(*[cls.hash(password) for password in batch]))
+        return result
+
+    @classmethod
+    async def verify(cls, password: str, hashed_password: str) -> bool:
+        """
+        驗證原始密碼是否与哈希密碼一致
+        :param password: 原始密碼
+        :param hashed_password: 哈希密碼
+        :return:
+        """
+        return await cls.run(pwd_context.verify, password, hashed_password)
+
+    @classmethod
+    async def verify_and_update(cls, password: str, hashed_password: str) -> tuple[bool, str | None]:
+        """
+        驗證密碼，哈希参數已过期時同時返回使用當前参數重新生成的哈希密碼
+        :param password: 原始密碼
+        :param hashed_password: 哈希密碼
+        :return: 是否驗證成功，新的哈希密碼（無需更新時為 None）
+        """
+        return await cls.run(pwd_context.verify_and_update, password, hashed_password)
+
+    @classmethod
+    def stats(cls) -> dict:
+        """
+        線程池运行状態
+        :return:
+        """
+        return {
+            "workers": cls.MAX_WORKERS,
+            "in_flight": cls.in_flight,
+            "queued": cls.queued(),
+            "completed": cls.completed,
+            "rejected": cls.rejected
+        }
+
+    @classmethod
+    def queued(cls) -> int:
+        """
+        當前排隊等待执行的任務數
+        """
+        return max(cls.in_flight - cls.MAX_WORKERS, 0)
+
+    @classmethod
+    async def run(cls, func, *args):
+        """
+        在密碼線程池中执行
+        """
+        if cls.MAX_QUEUE and cls.queued() >= cls.MAX_QUEUE:
+            cls.rejected += 1
+            raise CustomException("系统繁忙，請稍后再试", code=status.HTTP_503_SERVICE_UNAVAILABLE)
+        if cls._executor is None:
+            with cls._lock:
+                if cls._executor is None:
+                    cls._executor = ThreadPoolExecutor(max_workers=cls.MAX_WORKERS, thread_name_prefix="password")
+        loop = asyncio.get_running_loop()
+        cls.in_flight += 1
+        try:
+            return await loop.run_in_executor(cls._executor, functools.partial(func, *args))
+        finally:
+            cls.in_flight -= 1
+            cls.completed += 1
@@ -0,0 +1,247 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 10:00
+# @File           : principal_cache.py
+# @IDE            : PyCharm
+# @desc           : 認證主體缓存（進程内 LRU + Redis）
+
+"""
+缓存認證用户本身（含角色、部門）以及已解析好的權限集合与數據范围，
+缓存命中時不需要查詢數據庫，也不需要重新加載 角色→選單、角色→部門 並重新计算。
+
+缓存以帳號為键，缓存版本由两部分组成：
+全局版本：角色、選單、部門发生变更時遞增，所有用户的缓存同時失效
+用户版本：用户自身信息（角色、部門、状態、密碼等）发生变更時遞增，仅該用户的缓存失效
+
+每次請求只需一次 MGET 讀取版本號，版本一致時直接使用進程内 LRU，
+進程内未命中再讀取 Redis 中的缓存，最后才回源數據庫重新计算。
+
+缓存中不保存密碼哈希等敏感字段（EXCLUDE_FIELDS），只保存密碼哈希的摘要用于校驗 token 中的密碼哈希，
+命中時用户的密碼取 token 中已校驗一致的值。
+
+版本號必须在數據库事務提交之后再遞增（bump_user_on_commit、bump_global_on_commit），
+否则其他請求可能在提交前讀到新版本，又加載到尚未提交的旧數據，並以新版本缓存下来。
+回源時也必须先讀取版本號再加載數據，加載期间发生的变更會使本次写入的缓存立即失效。
+"""
+
+import datetime
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any
+from redis.asyncio import Redis
+from redis.exceptions import RedisError
+from sqlalchemy import inspect, DateTime, Date
+from sqlalchemy.ext.asyncio import AsyncSession
+from core.database import add_commit_callback
+from core.logger import logger
+
+
+class PrincipalCache:
+
+    GLOBAL_VERSION_KEY = "principal_version:global"
+    USER_VERSION_KEY = "principal_version:user:{user_id}"
+    PRINCIPAL_KEY = "principal:{telephone}"
+    # Redis 缓存過期時間（秒）
+    EXPIRE = 3600
+    # 進程内 LRU 過期時間（秒），版本號遞增失败時（如 Redis 短暂不可用）限制旧數據在進程内保留的時間
+    LOCAL_EXPIRE = 300
+    # 進程内 LRU 最大条目數
+    MAXSIZE = 1024
+    # 不写入缓存的敏感字段
+    EXCLUDE_FIELDS = ("password",)
+
+    rd: Redis | None = None
+    # 帳號 -> (過期時間, 認證主體)
+    _local: OrderedDict = OrderedDict()
+
+    @classmethod
+    def init(cls, rd: Redis | None) -> None:
+        """
+        挂載 redis 對象，在 redis 连接事件中調用
+        :param rd:
+        :return:
+        """
+        cls.rd = rd
+        cls._local.clear()
+
+    @classmethod
+    async def get_versions(cls, user_id: int) -> tuple[int, int] | None:
+        """
+        獲取當前全局版本与用户版本
+        :param user_id:
+        :return: 未启用 redis 或讀取失败時返回 None
+        """
+        if cls.rd is None:
+            return None
+        try:
+            values = await cls.rd.mget(cls.GLOBAL_VERSION_KEY, cls.USER_VERSION_KEY.format(user_id=user_id))
+        except RedisError as e:
+            logger.error(f"讀取認證缓存版本失敗：{e}")
+            return None
+        return int(values[0] or 0), int(values[1] or 0)
+
+    @classmethod
+    async def get(cls, telephone: str) -> dict | None:
+        """
+        獲取缓存的認證主體，版本不一致则视為未命中
+        :param telephone: 帳號
+        :return: 包含 user、roles、depts、permissions、data_range、dept_ids 的字典
+        """
+        if cls.rd is None:
+            return None
+        principal = cls._get_local(telephone)
+        local = principal is not None
+        if not local:
+            try:
+                result = await cls.rd.get(cls.PRINCIPAL_KEY.format(telephone=telephone))
+            except RedisError as e:
+                logger.error(f"讀取認證缓存失敗：{e}")
+                return None
+            if not result:
+                return None
+            principal = json.loads(result)
+        versions = await cls.get_versions(principal["user"]["id"])
+        if versions is None or tuple(principal["versions"]) != versions:
+            cls._local.pop(telephone, None)
+            return None
+        if local:
+            cls._local.move_to_end(telephone)
+        else:
+            cls._set_local(telephone, principal)
+        return principal
+
+    @classmethod
+    async def set(cls, telephone: str, versions: tuple[int, int], principal: dict[str, Any]) -> None:
+        """
+        写入缓存
+        :param telephone: 帳號
+        :param versions: 加載數據之前通過 get_versions 讀取的版本號
+        :param principal: 可 json 序列化的認證主體數據
+        :return:
+        """
+        principal = {**principal, "versions": list(versions)}
+        cls._set_local(telephone, principal)
+        try:
+            value = json.dumps(principal)
+            await cls.rd.set(cls.PRINCIPAL_KEY.format(telephone=telephone), value, ex=cls.EXPIRE)
+        except RedisError as e:
+            logger.error(f"写入認證缓存失敗：{e}")
+
+    @classmethod
+    async def bump_user(cls, *user_ids: int) -> None:
+        """
+        用户信息变更，遞增用户版本
+        :param user_ids:
+        :return:
+        """
+        if cls.rd is None or not user_ids:
+            return
+        try:
+            async with cls.rd.pipeline(transaction=False) as pipe:
+                for user_id in user_ids:
+                    pipe.incr(cls.USER_VERSION_KEY.format(user_id=user_id))
+                await pipe.execute()
+        except RedisError as e:
+            logger.error(f"更新認證缓存用户版本失敗：{e}")
+
+    @classmethod
+    async def bump_global(cls) -> None:
+        """
+        角色、選單、部門变更，遞增全局版本
+        :return:
+        """
+        if cls.rd is None:
+            return
+        try:
+            await cls.rd.incr(cls.GLOBAL_VERSION_KEY)
+        except RedisError as e:
+            logger.error(f"更新認證缓存全局版本失敗：{e}")
+
+    @classmethod
+    def bump_user_on_commit(cls, db: AsyncSession, *user_ids: int) -> None:
+        """
+        在當前事務提交后遞增用户版本
+        :param db:
+        :param user_ids:
+        :return:
+        """
+        if user_ids:
+            add_commit_callback(db, cls.bump_user, *user_ids)
+
+    @classmethod
+    def bump_global_on_commit(cls, db: AsyncSession) -> None:
+        """
+        在當前事務提交后遞增全局版本
+        :param db:
+        :return:
+        """
+        add_commit_callback(db, cls.bump_global)
+
+    @staticmethod
+    def password_digest(password: str | None) -> str:
+        """
+        密碼哈希的摘要，缓存中只保存摘要用于校驗 token 中的密碼哈希
+        :param password: 密碼哈希
+        :return:
+        """
+        return hashlib.sha256((password or "").encode()).hexdigest()
+
+    @classmethod
+    def dump_instance(cls, obj) -> dict:
+        """
+        将模型实例的字段转為可 json 序列化的字典，只包含字段，不包含關聯關係与 EXCLUDE_FIELDS 中的敏感字段
+        :param obj:
+        :return:
+        """
+        data = {}
+        for attr in inspect(obj).mapper.column_attrs:
+            if attr.key in cls.EXCLUDE_FIELDS:
+                continue
+            value = getattr(obj, attr.key)
+            if isinstance(value, (datetime.datetime, datetime.date)):
+                value = value.isoformat()
+            data[attr.key] = value
+        return data
+
+    @staticmethod
+    def load_instance(model, data: dict):
+        """
+        根據 dump_instance 的结果还原模型实例
+        设置好關聯關係后通過 make_transient_to_detached 转為没有待提交修改的 detached 状態，
+        即可通過 session.merge(obj, load=False) 加入會話而不查詢數據庫
+        :param model: 模型类
+        :param data:
+        :return:
+        """
+        values = {}
+        for attr in inspect(model).column_attrs:
+            value = data.get(attr.key)
+            if isinstance(value, str):
+                column_type = attr.columns[0].type
+                if isinstance(column_type, DateTime):
+                    value = datetime.datetime.fromisoformat(value)
+                elif isinstance(column_type, Date):
+                    value = datetime.date.fromisoformat(value)
+            values[attr.key] = value
+        return model(**values)
+
+    @classmethod
+    def _get_local(cls, telephone: str) -> dict | None:
+        item = cls._local.get(telephone)
+        if item is None:
+            return None
+        expire, principal = item
+        if expire < time.monotonic():
+            cls._local.pop(telephone, None)
+            return None
+        return principal
+
+    @classmethod
+    def _set_local(cls, telephone: str, principal: dict) -> None:
+        cls._local[telephone] = (time.monotonic() + cls.LOCAL_EXPIRE, principal)
+        cls._local.move_to_end(telephone)
+        while len(cls._local) > cls.MAXSIZE:
+            cls._local.popitem(last=False)
@@ -31,14 +31,20 @@ class CodeSMS(AliyunSMS):
         """
 
         send_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        if await self.rd.get(self.telephone + "_flag_"):
+        await self._get_settings_async()
+        # 原子占用發送標記，并发請求只有一个可以發送
+        if not await self.rd.set(self.telephone + "_flag_", 1, ex=self.send_interval, nx=True):
             logger.error(f'{send_time} {self.telephone} 短信發送失敗，短信發送過于频繁')
             raise CustomException(msg="短信發送频繁", code=400)
-        await self._get_settings_async()
-        result = await self._send_async(self.telephone)
+        try:
+            result = await self._send_async(self.telephone)
+        except Exception:
+            await self.rd.delete(self.telephone + "_flag_")
+            raise
         if result:
             await self.rd.set(self.telephone, self.code, self.valid_time)
-            await self.rd.set(self.telephone + "_flag_", self.code, self.send_interval)
+        else:
+            await self.rd.delete(self.telephone + "_flag_")
         return result
 
     async def main(self) -> None:
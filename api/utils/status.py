@@ -12,3 +12,4 @@ HTTP_ERROR = 400
 HTTP_401_UNAUTHORIZED = 401
 HTTP_403_FORBIDDEN = 403
 HTTP_404_NOT_FOUND = 404
+HTTP_429_TOO_MANY_REQUESTS = 429
@@ -0,0 +1,86 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 11:00
+# @File           : tree.py
+# @IDE            : PyCharm
+# @desc           : 树形结构生成工具
+
+"""
+通用树形结构生成，適用于選單、部門等通過 parent_id 關聯的自引用表
+
+一次遍歷建立 父节点 id -> 子节点列表 的索引，每个节点只會被訪問一次，
+同時在每一层按排序字段排序，不再局限于前两层。
+"""
+
+from collections import defaultdict
+from typing import Any, Callable, Iterable
+
+
+class TreeBuilder:
+
+    def __init__(
+            self,
+            nodes: Iterable[Any],
+            parent_field: str = "parent_id",
+            order_field: str | None = "order"
+    ):
+        """
+        :param nodes: 所有节点，ORM 對象或其他拥有對应属性的對象
+        :param parent_field: 父节点字段
+        :param order_field: 排序字段，為 None 時保持原有顺序
+        """
+        self.roots = []
+        self.children = defaultdict(list)
+        for node in nodes:
+            parent_id = getattr(node, parent_field)
+            if parent_id:
+                self.children[parent_id].append(node)
+            else:
+                self.roots.append(node)
+        if order_field:
+            key = self.order_key(order_field)
+            self.roots.sort(key=key)
+            for items in self.children.values():
+                items.sort(key=key)
+
+    @staticmethod
+    def order_key(order_field: str) -> Callable[[Any], tuple]:
+        """
+        排序值為空的节点排在最后
+        """
+        def key(node: Any) -> tuple:
+            value = getattr(node, order_field)
+            return value is None, value or 0
+        return key
+
+    def build(
+            self,
+            factory: Callable[[Any, dict | None], dict],
+            expand: Callable[[Any], bool] = None,
+            children: str = "children"
+    ) -> list[dict]:
+        """
+        生成树形结构
+        :param factory: 节点转换函數，参數為 當前节点 与 父节点转换后的结果（根节点為 None），返回字典
+        :param expand: 是否生成子节点，默认全部生成，返回 False 時结果中不包含 children 字段
+        :param children: 子节点字段名稱
+        :return:
+        """
+        return self.__build(self.roots, None, factory, expand, children)
+
+    def __build(
+            self,
+            nodes: list[Any],
+            parent: dict | None,
+            factory: Callable[[Any, dict | None], dict],
+            expand: Callable[[Any], bool] | None,
+            children: str
+    ) -> list[dict]:
+        data = []
+        for node in nodes:
+            item = factory(node, parent)
+            if expand is None or expand(node):
+                item[children] = self.__build(self.children.get(node.id, []), item, factory, expand, children)
+            data.append(item)
+        return data
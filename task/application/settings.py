@@ -25,11 +25,24 @@ else:
 
 
 """
-发布/订阅通道
+任务调度消息流（Redis Stream）与消费者组
 
 与接口相互关联，请勿随意更改
 """
-SUBSCRIBE = 'kinit_queue'
+TASK_STREAM = 'kinit_task_stream'
+TASK_STREAM_GROUP = 'kinit_task_group'
+# 处理消息的工作线程数量，同一任务的消息始终由同一工作线程按顺序处理
+TASK_STREAM_CONSUMERS = 4
+# 每次读取的最大消息数
+TASK_STREAM_COUNT = 10
+# 读取新消息的最长阻塞时间（毫秒）
+TASK_STREAM_BLOCK = 5000
+# 消息被读取后超过该时间（毫秒）仍未确认，视为消费者已失效，由其他消费者重新认领处理
+TASK_STREAM_CLAIM_IDLE = 60000
+# 检查未确认消息的间隔（秒）
+TASK_STREAM_CLAIM_INTERVAL = 30
+# 同一条消息的最大投递次数，超过后确认并记录失败，不再重试
+TASK_STREAM_MAX_DELIVERIES = 5
 
 
 """
@@ -43,9 +56,72 @@ SCHEDULER_TASK_RECORD = "scheduler_task_record"
 SCHEDULER_TASK_JOBS = "scheduler_task_jobs"
 # 用于存放任务信息
 SCHEDULER_TASK = "vadmin_system_task"
+# 用于存放 ERP、SRM 表同步的水位（上次成功同步的开始时间），以 同步接口:api_code 区分
+ERP_SYNC_WATERMARK = "erp_sync_watermark"
+# 任务执行记录批量写入：最长写入间隔（秒）
+SCHEDULER_RECORD_FLUSH_INTERVAL = 2.0
+# 任务执行记录批量写入：单次写入最大数量，缓冲区达到该数量时立即写入
+SCHEDULER_RECORD_BATCH_SIZE = 500
+# 任务执行记录缓冲区最大数量，超出时丢弃最早的记录
+SCHEDULER_RECORD_BUFFER_SIZE = 5000
 
 
 """
 定时任务脚本目录
 """
 TASKS_ROOT = "tasks"
+
+
+"""
+ERP 表增量同步
+"""
+# 没有水位记录时（首次同步）的开始时间
+ERP_SYNC_INITIAL_START = "20230618102000"
+# 同步开始时间向前重叠的秒数，避免同步期间提交的数据被遗漏
+ERP_SYNC_OVERLAP = 300
+# 每页数据量
+ERP_SYNC_PAGE_SIZE = 1000
+# 同步接口请求超时时间（秒）
+ERP_SYNC_TIMEOUT = 600
+
+
+"""
+T100 主机进程监控
+"""
+# 批量查询进程状态的间隔（秒）
+T100_MONITOR_INTERVAL = 5
+# SSH 连接与命令执行超时时间（秒）
+T100_SSH_TIMEOUT = 10
+
+
+"""
+定时任务执行器
+
+调度器运行在 asyncio 事件循环中，任务在执行器中执行，不会阻塞调度与消息处理
+type：thread 线程池，适合 IO 密集型任务；process 进程池，适合 CPU 密集型任务，任务类与参数需要能被 pickle
+max_workers：该执行器同时执行的任务数上限，即该类任务的并发预算
+任务类的 main 为协程函数时自动使用 asyncio 执行器，在调度器事件循环中执行
+"""
+SCHEDULER_EXECUTORS = {
+    "default": {"type": "thread", "max_workers": 10},
+    # 长耗时任务使用独立的线程池，不会占满短任务的执行器
+    "long": {"type": "thread", "max_workers": 2},
+    "process": {"type": "process", "max_workers": 2},
+}
+# 任务默认执行策略
+SCHEDULER_JOB_DEFAULTS = {
+    # 同一任务同时执行的最大实例数，上次未执行完成时跳过本次
+    "max_instances": 1,
+    # 错过多次执行时只补执行一次
+    "coalesce": True,
+    # 超过计划执行时间多少秒内仍然执行，超过则跳过本次
+    "misfire_grace_time": 60,
+}
+# 按任务类路径配置执行器与执行策略，未配置的项使用默认策略
+SCHEDULER_JOB_POLICIES = {
+    # main 為协程函数，自动使用 asyncio 执行器
+    "erp.main.T100ApsGetStat": {"misfire_grace_time": 300},
+    "erp.main.T100TableRsync": {"executor": "long", "misfire_grace_time": 300},
+    "srm.main.T100ApsGetStat": {"executor": "long", "misfire_grace_time": 300},
+    "srm.main.T100TableRsync": {"executor": "long", "misfire_grace_time": 300},
+}
@@ -1,7 +1,11 @@
+import asyncio
+import threading
 import paramiko
 import time
 import json
-from application.settings import T100_IP, T100_OS_USER, T100_OS_PASSWORD
+from typing import NamedTuple
+from application.settings import T100_IP, T100_OS_USER, T100_OS_PASSWORD, T100_MONITOR_INTERVAL, T100_SSH_TIMEOUT
+from core.logger import logger
 
 
 class RemoteProcessMonitor:
@@ -32,7 +36,8 @@ class RemoteProcessMonitor:
         processes = [p for p in processes if p]
         return processes
 
-    def parse_cmdline(self, process):
+    @staticmethod
+    def parse_cmdline(process):
         try:
             cmd_start = process.index('fglrun')
             cmd_json = process[cmd_start:].split(' ', 1)[1]
@@ -62,3 +67,153 @@ class RemoteProcessMonitor:
     def kill_process(self, pid):
         self.ssh.exec_command(f"kill {pid}")
         # print(f"Process {pid} terminated.")
+
+
+class ProcessEvent(NamedTuple):
+    """
+    進程狀態變化事件
+    state：running 運行中，exited 已結束
+    """
+    pid: str
+    state: str
+    cpu: str | None = None
+    mem: str | None = None
+
+
+class ProcessMonitorHub:
+    """
+    多進程監控，每台主機共用一個持久 SSH 連接
+
+    所有被監控的 PID 每個週期只執行一次批量 ps 查詢，進程狀態變化時通過 asyncio.Queue 通知監控方，
+    監控方在事件循環中等待事件，不佔用線程，一個執行器可以同時監控大量進程。
+    SSH 命令在線程中執行，連接斷開時下次執行命令自動重連。
+    """
+
+    _hubs: dict[str, "ProcessMonitorHub"] = {}
+
+    def __init__(self, hostname: str, username: str, password: str, interval: float = T100_MONITOR_INTERVAL):
+        self.hostname = hostname
+        self.username = username
+        self.password = password
+        self.interval = interval
+        self.ssh: paramiko.SSHClient | None = None
+        self.connect_lock = threading.Lock()
+        # pid -> 監控方隊列
+        self.watchers: dict[str, set[asyncio.Queue]] = {}
+        # pid -> 最近一次狀態
+        self.states: dict[str, str] = {}
+        self.task: asyncio.Task | None = None
+
+    @classmethod
+    def get(cls, hostname: str = T100_IP, username: str = T100_OS_USER, password: str = T100_OS_PASSWORD):
+        """
+        獲取主機對應的監控實例
+        """
+        hub = cls._hubs.get(hostname)
+        if hub is None:
+            hub = cls._hubs[hostname] = cls(hostname, username, password)
+        return hub
+
+    def get_client(self) -> paramiko.SSHClient:
+        """
+        獲取持久連接，連接已斷開時重新連接
+        """
+        with self.connect_lock:
+            transport = self.ssh.get_transport() if self.ssh else None
+            if transport is None or not transport.is_active():
+                if self.ssh:
+                    self.ssh.close()
+                self.ssh = paramiko.SSHClient()
+                self.ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                self.ssh.connect(
+                    self.hostname,
+                    username=self.username,
+                    password=self.password,
+                    timeout=T100_SSH_TIMEOUT
+                )
+                self.ssh.get_transport().set_keepalive(30)
+            return self.ssh
+
+    def exec_command(self, command: str) -> str:
+        """
+        執行命令並返回標準輸出（阻塞）
+        """
+        stdin, stdout, stderr = self.get_client().exec_command(command, timeout=T100_SSH_TIMEOUT)
+        return stdout.read().decode().strip()
+
+    async def run(self, command: str) -> str:
+        """
+        在線程中執行命令，不阻塞事件循環
+        """
+        return await asyncio.to_thread(self.exec_command, command)
+
+    async def find_processes(self, cmdline: str) -> list[str]:
+        """
+        查找命令行匹配的進程
+        :param cmdline: 命令行
+        :return: ps aux 輸出行
+        """
+        output = await self.run(f"ps aux | grep '{cmdline}' | grep -v grep")
+        return [p for p in output.split('\n') if p]
+
+    def watch(self, pid: str) -> asyncio.Queue:
+        """
+        開始監控進程
+        :param pid: 進程 ID
+        :return: 接收 ProcessEvent 的隊列
+        """
+        queue = asyncio.Queue()
+        self.watchers.setdefault(pid, set()).add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.poll(), name=f"process_monitor_{self.hostname}")
+        return queue
+
+    def unwatch(self, pid: str, queue: asyncio.Queue) -> None:
+        """
+        停止監控進程
+        """
+        queues = self.watchers.get(pid)
+        if queues is None:
+            return
+        queues.discard(queue)
+        if not queues:
+            del self.watchers[pid]
+            self.states.pop(pid, None)
+
+    async def poll(self) -> None:
+        """
+        每個週期批量查詢所有被監控進程的狀態，沒有監控的進程時結束
+        """
+        while self.watchers:
+            pids = list(self.watchers)
+            try:
+                output = await self.run(f"ps -o pid=,%cpu=,%mem= -p {','.join(pids)}")
+            except (paramiko.SSHException, OSError) as e:
+                logger.error(f"主機：{self.hostname}，查詢進程狀態失敗：{e}")
+                await asyncio.sleep(self.interval)
+                continue
+            running = {}
+            for line in output.split('\n'):
+                parts = line.split()
+                if len(parts) == 3:
+                    running[parts[0]] = parts
+            for pid in pids:
+                if pid in running:
+                    event = ProcessEvent(pid, "running", running[pid][1], running[pid][2])
+                else:
+                    event = ProcessEvent(pid, "exited")
+                if self.states.get(pid) != event.state:
+                    self.states[pid] = event.state
+                    for queue in self.watchers.get(pid, ()):
+                        queue.put_nowait(event)
+            await asyncio.sleep(self.interval)
+
+    def close(self) -> None:
+        """
+        關閉連接
+        """
+        if self.task:
+            self.task.cancel()
+        if self.ssh:
+            self.ssh.close()
+            self.ssh = None
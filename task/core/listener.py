@@ -1,78 +1,245 @@
 import datetime
 import json
+import threading
 
 import pytz
-from apscheduler.events import JobExecutionEvent
-
-from application.settings import SCHEDULER_TASK_RECORD, SCHEDULER_TASK
+from apscheduler.events import JobExecutionEvent, JobSubmissionEvent
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from application.settings import SCHEDULER_TASK_RECORD, SCHEDULER_TASK, SCHEDULER_RECORD_FLUSH_INTERVAL, \
+    SCHEDULER_RECORD_BATCH_SIZE, SCHEDULER_RECORD_BUFFER_SIZE
 from core.logger import logger
 from core.mongo import get_database
 
 Taipei_tz = pytz.timezone("Asia/Taipei")
-# 全局变量，用于存储记录ID
-record_ids = {}
-
-
-# 定義事件處理函數，在作業提交或執行前被調用
-def before_job_execution(event: JobExecutionEvent):
-    print(f'任務: {event.job_id} 準備開始執行。')
-    # 获取当前时间
-    start_time = datetime.datetime.now()
-
-    job_id = event.job_id
-    if "-temp-" in job_id:
-        job_id = job_id.split("-")[0]
-
-    result = {
-        "job_id": job_id,
-        "start_time": start_time.strftime("%Y-%m-%d %H:%M:%S"),
-        "end_time": '',
-        "process_time": '',
-        "retval": json.dumps('任務開始'),
-        "exception": '',
-        "traceback": ''
-    }
-
-    db = get_database()
-    try:
-        task = db.get_data(SCHEDULER_TASK, job_id, is_object_id=True)
-        result["job_class"] = task.get("job_class", None)
-        result["name"] = task.get("name", None)
-        result["group"] = task.get("group", None)
-        result["exec_strategy"] = task.get("exec_strategy", None)
-        result["expression"] = task.get("expression", None)
-    except ValueError as e:
-        result["exception"] = str(e)
-        logger.error(f"任務編號：{event.job_id}，抱錯：{e}")
-
-    # 新增任務紀錄
-    new_id = db.create_data(SCHEDULER_TASK_RECORD, result)
-
-    # 新增ID 到全局 讓執行完後 可以更新紀錄
-    record_ids[event.job_id] = str(new_id.inserted_id)
-
-
-# 定义事件处理函数，在作业执行完成后被调用
-def after_job_execution(event: JobExecutionEvent):
-    print(f'任務 {event.job_id} 執行完成。')
-    # 計算時間
-    start_time = event.scheduled_run_time.astimezone(Taipei_tz)
-    end_time = datetime.datetime.now(Taipei_tz)
-    process_time = (end_time - start_time).total_seconds()
-
-    # 获取任务的 new_id
-    record_id = record_ids.get(event.job_id, None)
-
-    # 更新任務完成後的結果
-    db = get_database()
-
-    result = {
-        "end_time": end_time.strftime("%Y-%m-%d %H:%M:%S"),
-        "process_time": process_time,
-        "retval": json.dumps(event.retval.get('retval', '任務失敗')),
-        "exception": event.retval.get('exception', None),
-        "traceback": event.retval.get('traceback', None),
-    }
-
-    # 更新返回的任務紀錄
-    db.put_data(SCHEDULER_TASK_RECORD, _id=record_id, data=result, is_object_id=True)
+
+
+class JobRunRecorder:
+    """
+    任务执行记录
+
+    任务开始与完成事件先合并到内存缓冲区，由后台线程按时间间隔或批量大小使用 bulk_write 写入，
+    每次执行以 任务编号 + 计划执行时间 作为唯一标识 upsert，同一批次内的开始与完成只写入一次。
+    缓冲区超过 SCHEDULER_RECORD_BUFFER_SIZE 时丢弃最早的记录，内存占用有上限。
+    """
+
+    def __init__(
+            self,
+            flush_interval: float = SCHEDULER_RECORD_FLUSH_INTERVAL,
+            batch_size: int = SCHEDULER_RECORD_BATCH_SIZE,
+            buffer_size: int = SCHEDULER_RECORD_BUFFER_SIZE
+    ):
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.buffer_size = buffer_size
+        # (任务编号, 计划执行时间) -> 待写入的字段，dict 保持插入顺序，最早的记录在最前面
+        self.buffer: dict[tuple[str, datetime.datetime], dict] = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread: threading.Thread | None = None
+        # 因缓冲区已满丢弃的记录数
+        self.dropped = 0
+        # 写入失败丢弃的记录数
+        self.failed = 0
+
+    def start(self) -> None:
+        """
+        创建索引并启动后台写入线程
+        :return:
+        """
+        collection = get_database().db[SCHEDULER_TASK_RECORD]
+        collection.create_index(
+            [("job_id", 1), ("scheduled_run_time", 1)],
+            unique=True,
+            partialFilterExpression={"scheduled_run_time": {"$exists": True}}
+        )
+        self.stopped.clear()
+        self.thread = threading.Thread(target=self.run, name="job_run_recorder", daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        """
+        停止后台写入线程，并写入缓冲区中剩余的记录
+        :return:
+        """
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread:
+            self.thread.join()
+            self.thread = None
+        self.flush()
+
+    def before_job_execution(self, event: JobSubmissionEvent) -> None:
+        """
+        任务提交执行时调用
+        :param event:
+        :return:
+        """
+        print(f'任務: {event.job_id} 準備開始執行。')
+        start_time = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for run_time in event.scheduled_run_times:
+            self.put(event.job_id, run_time, {
+                "start_time": start_time,
+                "end_time": '',
+                "process_time": '',
+                "retval": json.dumps('任務開始'),
+                "exception": '',
+                "traceback": ''
+            }, start=True)
+
+    def after_job_execution(self, event: JobExecutionEvent) -> None:
+        """
+        任务执行完成或执行报错时调用
+        :param event:
+        :return:
+        """
+        print(f'任務 {event.job_id} 執行完成。')
+        start_time = event.scheduled_run_time.astimezone(Taipei_tz)
+        end_time = datetime.datetime.now(Taipei_tz)
+        if event.exception:
+            retval = {"retval": "任務失敗", "exception": str(event.exception), "traceback": event.traceback}
+        else:
+            retval = event.retval if isinstance(event.retval, dict) else {"retval": event.retval}
+        self.put(event.job_id, event.scheduled_run_time, {
+            "end_time": end_time.strftime("%Y-%m-%d %H:%M:%S"),
+            "process_time": (end_time - start_time).total_seconds(),
+            "retval": json.dumps(retval.get('retval', '任務失敗'), default=str),
+            "exception": retval.get('exception', None),
+            "traceback": retval.get('traceback', None),
+        })
+
+    def put(self, job_id: str, run_time: datetime.datetime, data: dict, start: bool = False) -> None:
+        """
+        添加记录到缓冲区，同一次执行的字段合并
+        :param job_id: APScheduler 任务编号
+        :param run_time: 计划执行时间
+        :param data: 记录字段
+        :param start: 是否为开始记录，完成记录先到达时不覆盖完成字段
+        :return:
+        """
+        key = (job_id, run_time)
+        with self.lock:
+            fields = self.buffer.get(key)
+            if fields is None:
+                if len(self.buffer) >= self.buffer_size:
+                    self.buffer.pop(next(iter(self.buffer)))
+                    self.dropped += 1
+                    logger.warning(f"任务执行记录缓冲区已满，丢弃最早的记录，累计丢弃：{self.dropped}")
+                self.buffer[key] = dict(data)
+            elif start:
+                self.buffer[key] = {**data, **fields}
+            else:
+                fields.update(data)
+            size = len(self.buffer)
+        if size >= self.batch_size:
+            self.wakeup.set()
+
+    def run(self) -> None:
+        """
+        后台写入线程
+        :return:
+        """
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                # 写入线程退出后缓冲区写满只会丢弃记录，任何异常都不能让线程退出
+                logger.exception(f"任务执行记录写入线程异常：{e}")
+
+    def flush(self) -> None:
+        """
+        写入缓冲区中的记录
+        :return:
+        """
+        while True:
+            with self.lock:
+                if not self.buffer:
+                    return
+                keys = list(self.buffer)[:self.batch_size]
+                batch = [(key, self.buffer.pop(key)) for key in keys]
+            try:
+                self.write(batch)
+            except PyMongoError as e:
+                # 数据库不可用，剩余记录留到下次写入
+                self.failed += len(batch)
+                logger.error(f"批量写入任务执行记录失败，丢弃 {len(batch)} 条记录：{e}")
+                return
+            except Exception as e:
+                # 记录无法编码（如 retval 中包含无法保存的对象）等，逐条重新写入，只丢弃出错的记录
+                logger.exception(f"批量写入任务执行记录失败，逐条重新写入：{e}")
+                self.write_each(batch)
+
+    def write_each(self, batch: list[tuple[tuple[str, datetime.datetime], dict]]) -> None:
+        """
+        逐条写入，upsert 可以重复执行，已写入的记录不会重复
+        :param batch:
+        :return:
+        """
+        for item in batch:
+            try:
+                self.write([item])
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"任务编号：{item[0][0]}，写入任务执行记录失败，已丢弃：{e}")
+
+    @staticmethod
+    def get_task_id(job_id: str) -> str:
+        """
+        立即执行一次的任务编号为 {任务编号}-temp-{随机数}
+        :param job_id: APScheduler 任务编号
+        :return: 任务编号
+        """
+        if "-temp-" in job_id:
+            return job_id.split("-")[0]
+        return job_id
+
+    def write(self, batch: list[tuple[tuple[str, datetime.datetime], dict]]) -> None:
+        """
+        使用 bulk_write 批量 upsert，任务信息每批查询一次
+        :param batch:
+        :return:
+        """
+        db = get_database().db
+        task_ids = set()
+        for (job_id, _), _ in batch:
+            try:
+                task_ids.add(ObjectId(self.get_task_id(job_id)))
+            except InvalidId:
+                pass
+        tasks = {
+            str(task["_id"]): task
+            for task in db[SCHEDULER_TASK].find(
+                {"_id": {"$in": list(task_ids)}},
+                {"job_class": 1, "name": 1, "group": 1, "exec_strategy": 1, "expression": 1}
+            )
+        }
+        now = datetime.datetime.now()
+        operations = []
+        for (job_id, run_time), fields in batch:
+            task_id = self.get_task_id(job_id)
+            task = tasks.get(task_id, {})
+            on_insert = {
+                "job_class": task.get("job_class", None),
+                "name": task.get("name", None),
+                "group": task.get("group", None),
+                "exec_strategy": task.get("exec_strategy", None),
+                "expression": task.get("expression", None),
+                "create_datetime": now
+            }
+            if not task:
+                logger.error(f"任務編號：{job_id}，抱錯：未找到任务信息")
+            operations.append(UpdateOne(
+                {"job_id": task_id, "scheduled_run_time": run_time},
+                {"$set": {**fields, "update_datetime": now}, "$setOnInsert": on_insert},
+                upsert=True
+            ))
+        db[SCHEDULER_TASK_RECORD].bulk_write(operations, ordered=False)
+
+
+recorder = JobRunRecorder()
@@ -40,12 +40,17 @@ class RedisManage:
         """
         self.rd.close()
 
-    def subscribe(self, channel: str):
+    def create_group(self, stream: str, group: str) -> None:
         """
-        订阅
-        :param channel: 频道
+        创建消息流消费者组，消息流不存在时自动创建，消费者组已存在时忽略
+
+        消费者组从消息流的第一条消息开始读取，任务程序首次启动前发送的消息同样会被处理
+        :param stream: 消息流
+        :param group: 消费者组
         :return:
         """
-        pubsub = self.rd.pubsub()
-        pubsub.subscribe(channel)
-        return pubsub
+        try:
+            self.rd.xgroup_create(stream, group, id="0", mkstream=True)
+        except redis.exceptions.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
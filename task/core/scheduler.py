@@ -6,47 +6,81 @@
 # @IDE            : PyCharm
 # @desc           : 简要说明
 
+import asyncio
 import datetime
 import importlib
+import inspect
 import re
 from typing import List
 
-from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ADDED, EVENT_JOB_SUBMITTED
+from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ADDED, EVENT_JOB_SUBMITTED, EVENT_JOB_ERROR
+from apscheduler.executors.asyncio import AsyncIOExecutor
+from apscheduler.executors.base import BaseExecutor
+from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
 from apscheduler.job import Job
 from apscheduler.jobstores.base import JobLookupError
 from apscheduler.jobstores.mongodb import MongoDBJobStore
-from apscheduler.schedulers.background import BackgroundScheduler
+from apscheduler.schedulers.asyncio import AsyncIOScheduler
+from apscheduler.schedulers.base import BaseScheduler
 from apscheduler.triggers.cron import CronTrigger
 from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
-from application.settings import MONGO_DB_NAME, SCHEDULER_TASK_JOBS, TASKS_ROOT
+from application.settings import MONGO_DB_NAME, SCHEDULER_TASK_JOBS, TASKS_ROOT, SCHEDULER_EXECUTORS, \
+    SCHEDULER_JOB_DEFAULTS, SCHEDULER_JOB_POLICIES
 from core.mongo import get_database
-from .listener import before_job_execution, after_job_execution
+from .listener import recorder
 
 
 class Scheduler:
     TASK_DIR = TASKS_ROOT
     COLLECTION = SCHEDULER_TASK_JOBS
+    # 协程任务使用的执行器名称
+    ASYNCIO_EXECUTOR = "asyncio"
 
     def __init__(self):
         self.scheduler = None
+        self.asyncio_executor = None
         self.db = None
+        self.listener = False
 
-    def start(self, listener: bool = True) -> None:
+    def start(self, listener: bool = True, event_loop: asyncio.AbstractEventLoop = None) -> None:
         """
-        创建调度器
+        创建调度器，需要在事件循环中调用
         :param listener: 是否注册事件监听器
+        :param event_loop: 调度器使用的事件循环，默认为当前事件循环
         :return:
         """
-        self.scheduler = BackgroundScheduler()
-        if listener:
-            # 注册事件监听器
-            self.scheduler.add_listener(before_job_execution, EVENT_JOB_SUBMITTED)
-            self.scheduler.add_listener(after_job_execution, EVENT_JOB_EXECUTED)
+        self.scheduler = AsyncIOScheduler(
+            event_loop=event_loop or asyncio.get_running_loop(),
+            executors=self.__get_executors(),
+            job_defaults=SCHEDULER_JOB_DEFAULTS
+        )
         self.scheduler.add_jobstore(self.__get_mongodb_job_store())
+        if listener:
+            # 注册事件监听器，执行记录批量写入
+            recorder.start()
+            self.listener = True
+            self.scheduler.add_listener(recorder.before_job_execution, EVENT_JOB_SUBMITTED)
+            self.scheduler.add_listener(recorder.after_job_execution, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR)
         self.scheduler.start()
 
+    def __get_executors(self) -> dict[str, BaseExecutor]:
+        """
+        根据配置创建执行器
+        :return:
+        """
+        self.asyncio_executor = AsyncIOExecutor()
+        executors = {self.ASYNCIO_EXECUTOR: self.asyncio_executor}
+        for alias, config in SCHEDULER_EXECUTORS.items():
+            if config["type"] == "thread":
+                executors[alias] = ThreadPoolExecutor(config["max_workers"])
+            elif config["type"] == "process":
+                executors[alias] = ProcessPoolExecutor(config["max_workers"])
+            else:
+                raise ValueError(f"无效的执行器类型：{config['type']}")
+        return executors
+
     def __get_mongodb_job_store(self) -> MongoDBJobStore:
         """
         获取 MongoDB Job Store
@@ -70,12 +104,31 @@ class Scheduler:
         :param name: 任务名称
         :return:
         """
+        policy = self.get_job_policy(job_class)
         job_class = self.__import_module(job_class)
         if job_class:
-            return self.scheduler.add_job(job_class.main, trigger=trigger, args=args, kwargs=kwargs, id=name)
+            if inspect.iscoroutinefunction(job_class.main):
+                policy["executor"] = self.ASYNCIO_EXECUTOR
+            return self.scheduler.add_job(
+                job_class.main,
+                trigger=trigger,
+                args=args,
+                kwargs=kwargs,
+                id=name,
+                **policy
+            )
         else:
             raise ValueError(f"添加任务失败，未找到該模块下的方法：{job_class}")
 
+    def get_job_policy(self, expression: str) -> dict:
+        """
+        获取任务类配置的执行器与执行策略
+        :param expression: 类路径，可以带初始化参数
+        :return: 未配置的项不返回，使用调度器默认策略
+        """
+        module, _ = self.__parse_string_to_class(expression)
+        return dict(SCHEDULER_JOB_POLICIES.get(module, {}))
+
     def add_cron_job(
             self,
             job_class: str,
@@ -173,7 +226,9 @@ class Scheduler:
         :return: 类实例
         """
         job_class = self.__import_module(job_class)
-        job_class.main(*args, **kwargs)
+        result = job_class.main(*args, **kwargs)
+        if inspect.isawaitable(result):
+            asyncio.run(result)
 
     def remove_job(self, name: str) -> None:
         """
@@ -325,9 +380,28 @@ class Scheduler:
 
         return arguments
 
-    def shutdown(self) -> None:
+    async def shutdown(self) -> None:
         """
-        关闭调度器
+        关闭调度器，等待执行中的任务完成，需要在调度器的事件循环中调用
+
+        AsyncIOScheduler.shutdown 只是通过 call_soon_threadsafe 排队，返回时调度器并未关闭，
+        并且 AsyncIOExecutor 关闭时会直接取消未完成的协程任务，所以这里分步关闭：
+        1. 暂停调度，不再提交新的任务
+        2. 在事件循环中等待 asyncio 执行器中未完成的任务
+        3. 在线程中调用 BaseScheduler.shutdown(wait=True)，等待线程、进程执行器中的任务完成，不阻塞事件循环
+        4. 所有任务完成后再停止执行记录写入线程，写入最后一批记录
         :return:
         """
-        self.scheduler.shutdown()
+        if self.scheduler.running:
+            self.scheduler.pause()
+            # AsyncIOExecutor 没有提供等待任务完成的接口，只能读取其未完成的任务
+            pending = list(self.asyncio_executor._pending_futures)
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, BaseScheduler.shutdown, self.scheduler, True)
+            self.scheduler._stop_timer()
+        if self.listener:
+            # 调度器关闭后不再产生新的记录
+            recorder.stop()
+            self.listener = False
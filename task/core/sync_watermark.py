@@ -0,0 +1,51 @@
+import datetime
+
+from application.settings import ERP_SYNC_WATERMARK, ERP_SYNC_INITIAL_START, ERP_SYNC_OVERLAP
+from core.mongo import get_database
+
+
+class SyncWatermark:
+    """
+    表同步水位
+
+    每张表（同步接口 + api_code）记录上次成功同步的开始时间，下次只同步该时间之后变更的数据，
+    同步接口返回成功后才推进水位，失败时下次从原水位重新同步
+    """
+
+    FORMAT = "%Y%m%d%H%M%S"
+
+    def __init__(self, endpoint: str, api_code: str):
+        self.endpoint = endpoint
+        self.api_code = api_code
+
+    @property
+    def id(self) -> str:
+        return f"{self.endpoint}:{self.api_code}"
+
+    def get_start_date(self) -> str:
+        """
+        獲取本次同步的開始時間：水位向前重疊 ERP_SYNC_OVERLAP 秒，沒有水位時使用 ERP_SYNC_INITIAL_START
+        :return: 格式 %Y%m%d%H%M%S
+        """
+        db = get_database()
+        record = db.db[ERP_SYNC_WATERMARK].find_one({"_id": self.id})
+        if not record:
+            return ERP_SYNC_INITIAL_START
+        watermark = datetime.datetime.strptime(record["watermark"], self.FORMAT)
+        return (watermark - datetime.timedelta(seconds=ERP_SYNC_OVERLAP)).strftime(self.FORMAT)
+
+    def save(self, run_time: datetime.datetime) -> None:
+        """
+        同步成功後推進水位，水位只前進不後退
+        :param run_time: 本次同步的開始時間
+        :return:
+        """
+        db = get_database()
+        db.db[ERP_SYNC_WATERMARK].update_one(
+            {"_id": self.id},
+            {
+                "$max": {"watermark": run_time.strftime(self.FORMAT)},
+                "$set": {"api_code": self.api_code, "endpoint": self.endpoint, "update_datetime": run_time}
+            },
+            upsert=True
+        )
@@ -1,13 +1,20 @@
-import atexit
+import asyncio
 import datetime
 import json
+import os
+import queue
 import random
+import socket
+import threading
+import zlib
 from enum import Enum
 
+import redis
 from apscheduler.jobstores.base import ConflictingIdError
 
-from application.settings import MONGO_DB_NAME, MONGO_DB_URL, REDIS_DB_URL, SUBSCRIBE, SCHEDULER_TASK, \
-    SCHEDULER_TASK_RECORD
+from application.settings import MONGO_DB_NAME, MONGO_DB_URL, REDIS_DB_URL, SCHEDULER_TASK, \
+    SCHEDULER_TASK_RECORD, TASK_STREAM, TASK_STREAM_GROUP, TASK_STREAM_CONSUMERS, TASK_STREAM_COUNT, \
+    TASK_STREAM_BLOCK, TASK_STREAM_CLAIM_IDLE, TASK_STREAM_CLAIM_INTERVAL, TASK_STREAM_MAX_DELIVERIES
 from core.logger import logger
 from core.mongo import get_database as get_mongo
 from core.redis import get_database as get_redis
@@ -26,12 +33,23 @@ class ScheduledTask:
         self.mongo = None
         self.scheduler = None
         self.rd = None
+        # 消费者名称，同一消费者组中每个消费者名称唯一，程序重启后的旧消费者由 remove_idle_consumers 删除
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.reader: threading.Thread | None = None
+        # 工作线程及其消息队列，同一任务的消息始终分配到同一工作线程，按消息流中的顺序处理
+        self.workers: list[threading.Thread] = []
+        self.queues: list[queue.Queue] = []
+        # 本进程已分配给工作线程、尚未处理完成的消息，认领未确认消息时跳过
+        self.processing: set[bytes] = set()
+        self.processing_lock = threading.Lock()
+        self.stopped = threading.Event()
 
-    def add_job(self, exec_strategy: str, job_params: dict) -> None:
+    def add_job(self, exec_strategy: str, job_params: dict, redelivered: bool = False) -> None:
         """
         添加定时任务
         :param exec_strategy: 执行策略
         :param job_params: 执行参数
+        :param redelivered: 是否为重新投递的消息，重新投递时任务编号已存在视为已处理
         :return:
         """
         name = job_params.get("name", None)
@@ -50,6 +68,10 @@ class ScheduledTask:
             else:
                 raise ValueError("无效的触发器")
         except ConflictingIdError as e:
+            if redelivered:
+                # 上次处理成功但未来得及确认消息
+                logger.info(f"任务编号：{name}，任务已存在，忽略重新投递的消息")
+                return
             # 任务编号已存在，重复添加报错
             error_info = "任务编号已存在"
         except ValueError as e:
@@ -90,33 +112,212 @@ class ScheduledTask:
 
     def run(self) -> None:
         """
-        启動监听订阅消息（阻塞）
+        启動程序（阻塞）
         :return:
         """
+        asyncio.run(self.serve())
+
+    async def serve(self) -> None:
+        """
+        在事件循环中运行调度器，消费者线程读取消息后按任务编号分配给工作线程处理，任务在执行器中执行，
+        消息处理不会等待任务执行，任务执行也不会阻塞调度
+        定期认领失效消费者以及本消费者处理失败的未确认消息，并删除已失效的消费者
+        :return:
+        """
+        loop = asyncio.get_running_loop()
         self.start_mongo()
         self.start_scheduler()
         self.start_redis()
 
         assert isinstance(self.rd, RedisManage)
 
-        pubsub = self.rd.subscribe(SUBSCRIBE)
+        self.rd.create_group(TASK_STREAM, TASK_STREAM_GROUP)
+        self.start_workers()
+        self.reader = threading.Thread(target=self.consume, name=self.consumer, daemon=True)
+        self.reader.start()
 
         logger.info("已成功启動程序，等待接收消息...")
         print("已成功启動程序，等待接收消息...")
 
-        # 处理接收到的消息
-        for message in pubsub.listen():
-            if message['type'] == 'message':
-                data = json.loads(message['data'].decode('utf-8'))
-                operation = data.get("operation")
-                task = data.get("task")
-                content = f"接收到任务：任务操作方式({operation})，任务详情：{task}"
-                logger.info(content)
-                print(content)
-                # 動態執行FUN
-                getattr(self, operation)(**task)
-            else:
-                print("意外", message)
+        try:
+            while not self.stopped.is_set():
+                await asyncio.sleep(TASK_STREAM_CLAIM_INTERVAL)
+                try:
+                    await loop.run_in_executor(None, self.reclaim)
+                    await loop.run_in_executor(None, self.remove_idle_consumers)
+                except redis.exceptions.RedisError as e:
+                    logger.error(f"认领未确认消息失败：{e}")
+        finally:
+            await self.close()
+
+    def start_workers(self) -> None:
+        """
+        启動工作线程，每个工作线程按顺序处理自己队列中的消息
+        队列长度有限，工作线程处理不过来时消费者暂停读取新消息
+        :return:
+        """
+        for index in range(TASK_STREAM_CONSUMERS):
+            self.queues.append(queue.Queue(maxsize=TASK_STREAM_COUNT))
+            thread = threading.Thread(target=self.work, args=(index,), name=f"{self.consumer}-{index}", daemon=True)
+            thread.start()
+            self.workers.append(thread)
+
+    def work(self, index: int) -> None:
+        """
+        工作线程：处理队列中的消息，程序关闭时未处理的消息不确认，由其他消费者认领后重新处理
+        :param index: 工作线程序号
+        :return:
+        """
+        messages = self.queues[index]
+        while not self.stopped.is_set():
+            try:
+                message_id, data, redelivered = messages.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                self.handle_message(message_id, data, redelivered)
+            finally:
+                with self.processing_lock:
+                    self.processing.discard(message_id)
+
+    def consume(self) -> None:
+        """
+        消费者：先读取本消费者名下未确认的消息，再阻塞读取新消息，按任务编号分配给工作线程
+        :return:
+        """
+        last_id = "0"
+        while not self.stopped.is_set():
+            try:
+                response = self.rd.rd.xreadgroup(
+                    TASK_STREAM_GROUP,
+                    self.consumer,
+                    {TASK_STREAM: last_id},
+                    count=TASK_STREAM_COUNT,
+                    block=TASK_STREAM_BLOCK
+                )
+            except redis.exceptions.RedisError as e:
+                logger.error(f"消费者：{self.consumer}，读取消息失败：{e}")
+                self.stopped.wait(1)
+                continue
+            messages = response[0][1] if response else []
+            if last_id == "0" and not messages:
+                # 未确认的消息已处理完毕，开始读取新消息
+                last_id = ">"
+                continue
+            for message_id, fields in messages:
+                self.dispatch(message_id, fields, redelivered=last_id == "0")
+
+    def reclaim(self) -> None:
+        """
+        认领空闲超过 TASK_STREAM_CLAIM_IDLE 仍未确认的消息并分配给工作线程处理：
+        其他消费者（已失效）名下的消息，以及本消费者名下处理失败、已不在工作线程中的消息
+        本消费者正在排队或处理中的消息不认领，避免执行时间较长的任务被重复处理
+        超过最大投递次数的消息直接确认，避免无法处理的消息反复投递
+        :return:
+        """
+        start_id = "-"
+        while True:
+            pending = self.rd.rd.xpending_range(
+                TASK_STREAM,
+                TASK_STREAM_GROUP,
+                min=start_id,
+                max="+",
+                count=TASK_STREAM_COUNT,
+                idle=TASK_STREAM_CLAIM_IDLE
+            )
+            for entry in pending:
+                message_id = entry["message_id"]
+                consumer = entry["consumer"]
+                consumer = consumer.decode('utf-8') if isinstance(consumer, bytes) else consumer
+                if consumer == self.consumer and self.is_processing(message_id):
+                    continue
+                if entry["times_delivered"] >= TASK_STREAM_MAX_DELIVERIES:
+                    logger.error(f"消息：{message_id}，超过最大投递次数，不再处理")
+                    self.rd.rd.xack(TASK_STREAM, TASK_STREAM_GROUP, message_id)
+                    continue
+                # XCLAIM 会再次检查空闲时间，其他进程已认领的消息不会重复认领
+                claimed = self.rd.rd.xclaim(
+                    TASK_STREAM, TASK_STREAM_GROUP, self.consumer, TASK_STREAM_CLAIM_IDLE, [message_id]
+                )
+                for claimed_id, fields in claimed:
+                    self.dispatch(claimed_id, fields, redelivered=True)
+            if len(pending) < TASK_STREAM_COUNT:
+                break
+            message_id = pending[-1]["message_id"]
+            start_id = f"({message_id.decode('utf-8') if isinstance(message_id, bytes) else message_id}"
+
+    def is_processing(self, message_id: bytes) -> bool:
+        """
+        消息是否在本进程的工作线程队列中或正在处理
+        :param message_id: 消息 ID
+        :return:
+        """
+        with self.processing_lock:
+            return message_id in self.processing
+
+    def remove_idle_consumers(self) -> None:
+        """
+        删除已失效的消费者：没有未确认的消息，且空闲超过 TASK_STREAM_CLAIM_IDLE
+        消费者名称包含进程号，程序重启后旧的消费者不会再读取消息，其未确认的消息由 reclaim 认领后才会删除
+        正常运行的消费者最多阻塞 TASK_STREAM_BLOCK 毫秒就会再次读取消息，不会被删除
+        :return:
+        """
+        for consumer in self.rd.rd.xinfo_consumers(TASK_STREAM, TASK_STREAM_GROUP):
+            name = consumer["name"]
+            name = name.decode('utf-8') if isinstance(name, bytes) else name
+            if name == self.consumer or consumer["pending"] > 0 or consumer["idle"] < TASK_STREAM_CLAIM_IDLE:
+                continue
+            self.rd.rd.xgroup_delconsumer(TASK_STREAM, TASK_STREAM_GROUP, name)
+            logger.info(f"已删除失效的消费者：{name}")
+
+    def dispatch(self, message_id: bytes, fields: dict, redelivered: bool = False) -> None:
+        """
+        解析消息，按任务编号分配给工作线程，同一任务的消息按读取顺序依次处理
+        工作线程队列已满时等待，程序关闭时放弃分配，消息保持未确认状态
+        :param message_id: 消息 ID
+        :param fields: 消息内容
+        :param redelivered: 是否为重新投递的消息
+        :return:
+        """
+        try:
+            data = json.loads(fields[b"data"].decode('utf-8'))
+            name = str(data["task"]["job_params"]["name"])
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"消息：{message_id}，无法解析，已丢弃：{e}")
+            self.rd.rd.xack(TASK_STREAM, TASK_STREAM_GROUP, message_id)
+            return
+        messages = self.queues[zlib.crc32(name.encode('utf-8')) % len(self.queues)]
+        with self.processing_lock:
+            self.processing.add(message_id)
+        while not self.stopped.is_set():
+            try:
+                messages.put((message_id, data, redelivered), timeout=1)
+                return
+            except queue.Full:
+                continue
+        with self.processing_lock:
+            self.processing.discard(message_id)
+
+    def handle_message(self, message_id: bytes, data: dict, redelivered: bool = False) -> None:
+        """
+        处理消息，处理成功后确认消息，处理异常时不确认，等待重新投递
+        :param message_id: 消息 ID
+        :param data: 消息内容
+        :param redelivered: 是否为重新投递的消息
+        :return:
+        """
+        operation = data.get("operation")
+        task = data.get("task")
+        content = f"接收到任务：任务操作方式({operation})，任务详情：{task}"
+        logger.info(content)
+        print(content)
+        try:
+            # 動態執行FUN
+            getattr(self, operation)(**task, redelivered=redelivered)
+        except Exception as e:
+            logger.exception(f"消息：{message_id}，处理失败，等待重新投递：{e}")
+            return
+        self.rd.rd.xack(TASK_STREAM, TASK_STREAM_GROUP, message_id)
 
     def start_mongo(self) -> None:
         """
@@ -128,7 +329,7 @@ class ScheduledTask:
 
     def start_scheduler(self) -> None:
         """
-        启動定时任务
+        启動定时任务，需要在事件循环中调用
         :return:
         """
         self.scheduler = Scheduler()
@@ -143,21 +344,36 @@ class ScheduledTask:
         self.rd = get_redis()
         self.rd.connect_to_database(REDIS_DB_URL)
 
-    def close(self) -> None:
+    async def close(self) -> None:
         """
         # pycharm 执行停止，該函数无法正常被执行，怀疑是因为阻塞导致或 pycharm 的强制退出导致
         # 报错导致得退出，会被执行
-        关闭程序
+        关闭程序，在 serve 的 finally 中调用，Ctrl+C 退出时 asyncio.run 会取消 serve 并执行到这里
+        先停止消费者，再关闭调度器并等待执行中的任务完成、写入剩余的任务执行记录，最后关闭 mongo 与 redis
         :return:
         """
-        self.mongo.close_database_connection()
+        if self.stopped.is_set():
+            return
+        self.stopped.set()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.join_consumers)
         if self.scheduler:
-            self.scheduler.shutdown()
+            await self.scheduler.shutdown()
+        self.mongo.close_database_connection()
         if self.rd:
             self.rd.close_database_connection()
 
+    def join_consumers(self) -> None:
+        """
+        等待消费者与工作线程退出，消费者最多阻塞 TASK_STREAM_BLOCK 毫秒读取消息
+        :return:
+        """
+        if self.reader:
+            self.reader.join(TASK_STREAM_BLOCK / 1000 + 1)
+        for thread in self.workers:
+            thread.join()
+
 
 if __name__ == '__main__':
     main = ScheduledTask()
-    atexit.register(main.close)
     main.run()
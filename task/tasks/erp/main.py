@@ -1,19 +1,24 @@
+import asyncio
 import datetime
 import json
-import time
 
-import redis
 import requests
+from redis import asyncio as aioredis
 
 from application.settings import REDIS_DB_IP, APS_API_LOCK_KEY, APS_TASK_LOCK_KEY, APS_JOB_ID, APS_RUN_TIMEOUT, \
-    APS_JOB_CODE, API_URL, SCHEDULER_TASK_RECORD, T100_ENV
-from core.T100_SSH import RemoteProcessMonitor
+    APS_JOB_CODE, API_URL, SCHEDULER_TASK_RECORD, T100_ENV, T100_MONITOR_INTERVAL, ERP_SYNC_PAGE_SIZE, \
+    ERP_SYNC_TIMEOUT
+from core.T100_SSH import RemoteProcessMonitor, ProcessMonitorHub
 from core.mongo import get_database
+from core.sync_watermark import SyncWatermark
 
 
 class T100ApsGetStat:
     """
     這是讀取T100 的模擬APS501 讀取APS執行狀態
+
+    main 為協程函數，由調度器的 asyncio 執行器執行，進程狀態由 ProcessMonitorHub 批量查詢後以事件通知，
+    等待期間不佔用線程
     """
     def __init__(self, api_endpoint):
         self.base_date = None
@@ -26,12 +31,12 @@ class T100ApsGetStat:
             "traceback": '請洽IT'
         }
 
-    def main(self) -> dict:
+    async def main(self) -> dict:
         # 初始化返回結果
 
         # 連接到 Redis 資料庫，並檢索存儲的 JSON 資料
-        self.redis_client = redis.StrictRedis(host=REDIS_DB_IP, port=6379, db=1)
-        stored_data = json.loads(self.redis_client.get(f'{APS_JOB_ID}_params'))
+        self.redis_client = aioredis.StrictRedis(host=REDIS_DB_IP, port=6379, db=1)
+        stored_data = json.loads(await self.redis_client.get(f'{APS_JOB_ID}_params'))
         self.aps_no = stored_data.get('aps_no', None)
         self.base_date = stored_data.get('base_date', None)
 
@@ -39,21 +44,23 @@ class T100ApsGetStat:
         print('{}, APS進度,定時任務開始，參數為: {}, {}'.format(datetime.datetime.now(), self.aps_no, self.base_date))
 
         # 檢查 Redis 鎖是否存在
-        lock_status = self.redis_client.exists(APS_TASK_LOCK_KEY)
+        lock_status = await self.redis_client.exists(APS_TASK_LOCK_KEY)
         if lock_status:
             self.result['exception'] = f'{APS_TASK_LOCK_KEY}鎖定中'
             self.result['retval'] = '任務失敗'
             self.result['traceback'] = 'APS鎖定中不重複執行'
             # print('APS鎖定中')
+            await self.redis_client.close()
             return self.result
 
         # 設置 Redis 鎖，避免任務重複執行
-        lock_acquired = self.redis_client.set(APS_TASK_LOCK_KEY, "locked", nx=True, ex=APS_RUN_TIMEOUT)
+        lock_acquired = await self.redis_client.set(APS_TASK_LOCK_KEY, "locked", nx=True, ex=APS_RUN_TIMEOUT)
         if not lock_acquired:
             self.result['exception'] = f'{APS_TASK_LOCK_KEY}無法鎖定'
             self.result['retval'] = '任務失敗'
             self.result['traceback'] = '無法鎖定APS鎖, 請洽IT'
             # print('無法獲取鎖')
+            await self.redis_client.close()
             return self.result
 
         try:
@@ -62,60 +69,56 @@ class T100ApsGetStat:
                 # print(f"執行任務: {datetime.datetime.now()}")
                 cmdline = f'fglrun /u1/{T100_ENV}/erp/aps/42r/apsp500'
 
-                # 連接到 T100 主機
-                monitor = RemoteProcessMonitor(cmdline)
-                monitor.connect()
+                # T100 主機共用的持久連接
+                monitor = ProcessMonitorHub.get()
 
-                try:
-                    no_process_count = 0
-                    no_process_limit = 10  # 未找到進程的最大次數
-                    no_process_status = False  # APSP500 狀態
-                    while not no_process_status:
-                        # 查找匹配的進程
-                        processes = monitor.find_process_by_cmdline()
-                        if processes:
-                            for process in processes:
-                                # print(f"找到進程: {process}")
-                                parts = process.split()
-                                if len(parts) > 1:
-                                    pid = parts[1]
-                                    # 解析命令行參數
-                                    cmd_params = monitor.parse_cmdline(process)
-                                    if cmd_params:
-                                        # print(f"解析命令行參數: {cmd_params}")
-                                        # 如果是MES發的 才做監控
-                                        # TODO ENT 跟SITE 可能要用傳的
-                                        if (cmd_params['parentprog'] == APS_JOB_CODE and
-                                                cmd_params['param'][0] == '1' and
-                                                cmd_params['param'][1] == 'BD01' and
-                                                cmd_params['param'][2] == self.aps_no and
-                                                cmd_params['param'][3] == self.base_date):
-                                            # print("符合MES條件，進行監控")
-                                            st = self.monitor_and_update(monitor, pid)
-                                            # 代表已經找到並結束所以可以直接結束
-                                            if st:
-                                                no_process_status = True
-                                                no_process_count = 0  # 重置未找到進程計數器
-                                                self.result['retval'] = '任務完成'
-                                                self.result['traceback'] = f'APS版本:{self.aps_no},行動基準日:{self.base_date}'
-                                            else:
-                                                self.result['traceback'] = '發生異常,請洽IT'
-                                                self.result['retval'] = '任務失敗'
+                no_process_count = 0
+                no_process_limit = 10  # 未找到進程的最大次數
+                no_process_status = False  # APSP500 狀態
+                while not no_process_status:
+                    # 查找匹配的進程
+                    processes = await monitor.find_processes(cmdline)
+                    if processes:
+                        for process in processes:
+                            # print(f"找到進程: {process}")
+                            parts = process.split()
+                            if len(parts) > 1:
+                                pid = parts[1]
+                                # 解析命令行參數
+                                cmd_params = RemoteProcessMonitor.parse_cmdline(process)
+                                if cmd_params:
+                                    # print(f"解析命令行參數: {cmd_params}")
+                                    # 如果是MES發的 才做監控
+                                    # TODO ENT 跟SITE 可能要用傳的
+                                    if (cmd_params['parentprog'] == APS_JOB_CODE and
+                                            cmd_params['param'][0] == '1' and
+                                            cmd_params['param'][1] == 'BD01' and
+                                            cmd_params['param'][2] == self.aps_no and
+                                            cmd_params['param'][3] == self.base_date):
+                                        # print("符合MES條件，進行監控")
+                                        st = await self.monitor_and_update(monitor, pid)
+                                        # 代表已經找到並結束所以可以直接結束
+                                        if st:
+                                            no_process_status = True
+                                            no_process_count = 0  # 重置未找到進程計數器
+                                            self.result['retval'] = '任務完成'
+                                            self.result['traceback'] = f'APS版本:{self.aps_no},行動基準日:{self.base_date}'
                                         else:
-                                            print("不符合MES條件，跳過")
-                        else:
-                            no_process_count += 1
-                            print(f"未找到匹配的進程。嘗試 {no_process_count}/{no_process_limit}")
-                            if no_process_count >= no_process_limit:
-                                print("在指定次數內未找到匹配的進程。退出。")
-                                self.result['exception'] = f'超過次數:{no_process_limit}次'
-                                self.result['retval'] = '任務失敗'
-                                self.result['traceback'] = '逾時找不到APS進程, 請洽IT'
-                                break
-                        # 暫停一段時間再進行下一次檢查
-                        time.sleep(5)
-                finally:
-                    monitor.disconnect()
+                                            self.result['traceback'] = '發生異常,請洽IT'
+                                            self.result['retval'] = '任務失敗'
+                                    else:
+                                        print("不符合MES條件，跳過")
+                    else:
+                        no_process_count += 1
+                        print(f"未找到匹配的進程。嘗試 {no_process_count}/{no_process_limit}")
+                        if no_process_count >= no_process_limit:
+                            print("在指定次數內未找到匹配的進程。退出。")
+                            self.result['exception'] = f'超過次數:{no_process_limit}次'
+                            self.result['retval'] = '任務失敗'
+                            self.result['traceback'] = '逾時找不到APS進程, 請洽IT'
+                            break
+                    # 暫停一段時間再進行下一次檢查
+                    await asyncio.sleep(5)
             else:
                 self.result["exception"] = 'APS版本與行動基準日參數異常'
                 self.result["traceback"] = '參數異常'
@@ -126,46 +129,50 @@ class T100ApsGetStat:
             self.result['retval'] = '任務失敗'
         finally:
             # 釋放 Redis 鎖
-            self.redis_client.delete(APS_TASK_LOCK_KEY)
-            self.redis_client.delete(APS_API_LOCK_KEY)
+            await self.redis_client.delete(APS_TASK_LOCK_KEY)
+            await self.redis_client.delete(APS_API_LOCK_KEY)
+            await self.redis_client.close()
             print('任務完成,鎖已釋放')
             return self.result
 
-    def monitor_and_update(self, monitor, pid):
+    async def monitor_and_update(self, monitor: ProcessMonitorHub, pid: str) -> bool:
+        """
+        等待進程結束，每個監控週期更新一次 APS 進度，超過 APS_RUN_TIMEOUT 視為逾時
+        :param monitor: 主機進程監控
+        :param pid: 進程 ID
+        :return: 進程是否已結束
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + APS_RUN_TIMEOUT
+        queue = monitor.watch(pid)
         try:
-            try_count = 0
-            try_max_count = 360
             while True:
-                try_count += 1
-                stdin, stdout, stderr = monitor.ssh.exec_command(f"ps -p {pid} -o %cpu,%mem")
-                output = stdout.read().decode().strip().split('\n')
+                try:
+                    event = await asyncio.wait_for(queue.get(), T100_MONITOR_INTERVAL)
+                    if event.state == "exited":
+                        # print("進程已終止。")
+                        return True
+                    print(f"CPU 使用率: {event.cpu}% | 記憶體使用率: {event.mem}%")
+                except asyncio.TimeoutError:
+                    pass
                 start_time = datetime.datetime.now()
-                if len(output) > 1:
-                    cpu, mem = output[1].split()
-                    print(f"CPU 使用率: {cpu}% | 記憶體使用率: {mem}%")
-                    # 更新進度到任務記錄檔
-                    update_status = self.update_aps_status()
-                    self.result['exception'] = update_status['exception']
-                    self.result['retval'] = json.dumps(update_status['retval'])
-                    self.result['traceback'] = update_status['traceback'] + ',最後執行時間: ' + start_time.strftime(
-                        "%Y-%m-%d %H:%M:%S")
-                    print(f"更新狀態: {update_status}")
-                    self.update_aps_task_status()
-                else:
-                    # print("進程已終止。")
-                    return True
+                # 更新進度到任務記錄檔
+                update_status = await asyncio.to_thread(self.update_aps_status)
+                self.result['exception'] = update_status['exception']
+                self.result['retval'] = json.dumps(update_status['retval'])
+                self.result['traceback'] = update_status['traceback'] + ',最後執行時間: ' + start_time.strftime(
+                    "%Y-%m-%d %H:%M:%S")
+                print(f"更新狀態: {update_status}")
+                await asyncio.to_thread(self.update_aps_task_status)
 
-                if try_count > try_max_count:
+                if loop.time() > deadline:
                     self.result['exception'] = update_status['exception']
                     self.result['retval'] = json.dumps('任務失敗')
                     self.result['traceback'] = 'APS引擎執逾時30分鐘無回應' + ',最後執行時間: ' + start_time.strftime(
                         "%Y-%m-%d %H:%M:%S")
                     return False
-
-                time.sleep(5)
-        except KeyboardInterrupt:
-            # print("監控已停止。")
-            return False
+        finally:
+            monitor.unwatch(pid, queue)
 
     def update_aps_status(self):
         try:
@@ -218,10 +225,13 @@ class T100ApsGetStat:
 class T100TableRsync:
     """
     同步T100
+
+    按水位增量同步，见 core.sync_watermark.SyncWatermark
     """
     def __init__(self, api_code, endpoint):
         self.api_code = api_code
         self.endpoint = endpoint
+        self.watermark = SyncWatermark(endpoint, api_code)
         self.result = {
             "exception": '請洽IT',
             "retval": '任務失敗',
@@ -231,27 +241,31 @@ class T100TableRsync:
     def main(self) -> dict:
         # 打印任務開始信息
         print(f'{datetime.datetime.now()}, 同步ERP進度,定時任務開始, 參數{self.api_code}')
-        time.sleep(1)
 
         try:
+            # 本次同步的開始時間，同步成功後作為新的水位
+            run_time = datetime.datetime.now()
+            start_date = self.watermark.get_start_date()
+
             # 定義請求參數
             parameter = {
                 'api_code': [self.api_code],
-                'start_date': ['20230618102000'],
+                'start_date': [start_date],
                 'sync_type': [1],
-                'page_size': [1000],
+                'page_size': [ERP_SYNC_PAGE_SIZE],
 
             }
 
             # 發送 GET 請求
-            response = requests.get(f'{API_URL}/{self.endpoint}', params=parameter)
+            response = requests.get(f'{API_URL}/{self.endpoint}', params=parameter, timeout=ERP_SYNC_TIMEOUT)
             # 處理回應
             if response.status_code == 200:
                 data = response.json()
                 if data['code'] == 200:
+                    self.watermark.save(run_time)
                     self.result['exception'] = f''
                     self.result['retval'] = '任務成功'
-                    self.result['traceback'] = ''
+                    self.result['traceback'] = f'同步開始時間: {start_date}'
                 else:
                     self.result['exception'] = f'錯誤訊息: {data["message"]}'
                     self.result['retval'] = '任務失敗'
@@ -6,9 +6,10 @@ import redis
 import requests
 
 from application.settings import REDIS_DB_IP, APS_API_LOCK_KEY, APS_TASK_LOCK_KEY, APS_JOB_ID, APS_RUN_TIMEOUT, \
-    APS_JOB_CODE, API_URL, SCHEDULER_TASK_RECORD, T100_ENV
+    APS_JOB_CODE, API_URL, SCHEDULER_TASK_RECORD, T100_ENV, ERP_SYNC_PAGE_SIZE, ERP_SYNC_TIMEOUT
 from core.T100_SSH import RemoteProcessMonitor
 from core.mongo import get_database
+from core.sync_watermark import SyncWatermark
 
 
 class T100ApsGetStat:
@@ -218,10 +219,13 @@ class T100ApsGetStat:
 class T100TableRsync:
     """
     同步T100
+
+    按水位增量同步，见 core.sync_watermark.SyncWatermark
     """
     def __init__(self, api_code, endpoint):
         self.api_code = api_code
         self.endpoint = endpoint
+        self.watermark = SyncWatermark(endpoint, api_code)
         self.result = {
             "exception": '請洽IT',
             "retval": '任務失敗',
@@ -231,27 +235,31 @@ class T100TableRsync:
     def main(self) -> dict:
         # 打印任務開始信息
         print(f'{datetime.datetime.now()}, 同步ERP進度,定時任務開始, 參數{self.api_code}')
-        time.sleep(1)
 
         try:
+            # 本次同步的開始時間，同步成功後作為新的水位
+            run_time = datetime.datetime.now()
+            start_date = self.watermark.get_start_date()
+
             # 定義請求參數
             parameter = {
                 'api_code': [self.api_code],
-                'start_date': ['20230618102000'],
+                'start_date': [start_date],
                 'sync_type': [1],
-                'page_size': [1000],
+                'page_size': [ERP_SYNC_PAGE_SIZE],
 
             }
 
             # 發送 GET 請求
-            response = requests.get(f'{API_URL}/{self.endpoint}', params=parameter)
+            response = requests.get(f'{API_URL}/{self.endpoint}', params=parameter, timeout=ERP_SYNC_TIMEOUT)
             # 處理回應
             if response.status_code == 200:
                 data = response.json()
                 if data['code'] == 200:
+                    self.watermark.save(run_time)
                     self.result['exception'] = f''
                     self.result['retval'] = '任務成功'
-                    self.result['traceback'] = ''
+                    self.result['traceback'] = f'同步開始時間: {start_date}'
                 else:
                     self.result['exception'] = f'錯誤訊息: {data["message"]}'
                     self.result['retval'] = '任務失敗'
@@ -268,5 +276,3 @@ class T100TableRsync:
             self.result['traceback'] = 'API讀取發生系統異常'
         finally:
             return self.result
-
-
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 21:30
+# @File           : conftest.py
+# @IDE            : PyCharm
+# @desc           : 测试公共夹具
+
+"""
+依赖安装：pip install -r tests/requirements.txt
+运行测试：在 task 目录下执行 python -m pytest tests
+
+MongoDB 使用 mongomock 代替，Redis 使用 fakeredis 代替，不需要启动任何外部服务。
+"""
+
+import os
+import sys
+
+import mongomock
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.mongo.mongo_manage import MongoManage  # noqa: E402
+
+
+@pytest.fixture
+def mongo(monkeypatch):
+    """
+    替换 core.mongo.get_database 返回的数据库
+    """
+    import core.listener
+    import core.scheduler
+    manage = MongoManage()
+    manage.client = mongomock.MongoClient()
+    manage.db = manage.client["kinit_task_test"]
+    monkeypatch.setattr(core.listener, "get_database", lambda: manage)
+    monkeypatch.setattr(core.scheduler, "get_database", lambda: manage)
+    yield manage
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/19 01:30
+# @File           : fake_sync.py
+# @IDE            : PyCharm
+# @desc           : 本地模擬 ERP 表同步接口
+
+"""
+在本地线程中运行的 ERP 表同步接口，记录每次請求的路径与查詢参數，
+按 responses 依次返回指定的狀態碼与响应内容，用完后返回同步成功
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+SUCCESS = (200, {"code": 200, "message": "同步成功"})
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "FakeSyncServer"
+
+    def do_GET(self) -> None:
+        parts = urlsplit(self.path)
+        with self.server.lock:
+            self.server.requests.append((parts.path, parse_qs(parts.query)))
+            status, data = self.server.responses.pop(0) if self.server.responses else SUCCESS
+        content = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+class FakeSyncServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, responses: list[tuple[int, dict]] = None):
+        """
+        :param responses: 依次返回的 (狀態碼, 响应内容)
+        """
+        super().__init__(("127.0.0.1", 0), Handler)
+        self.responses = list(responses or [])
+        self.lock = threading.Lock()
+        self.requests = []
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self) -> "FakeSyncServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
@@ -0,0 +1,144 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 22:30
+# @File           : test_consumer.py
+# @IDE            : PyCharm
+# @desc           : 任务消息消费顺序与失效消费者清理
+
+import json
+import random
+import threading
+import time
+
+import fakeredis
+import pytest
+
+import main
+from application.settings import TASK_STREAM, TASK_STREAM_GROUP
+from core.redis.redis_manage import RedisManage
+
+
+@pytest.fixture
+def task(monkeypatch):
+    monkeypatch.setattr(main, "TASK_STREAM_BLOCK", 100)
+    task = main.ScheduledTask()
+    task.rd = RedisManage()
+    task.rd.rd = fakeredis.FakeRedis()
+    task.rd.create_group(TASK_STREAM, TASK_STREAM_GROUP)
+    yield task
+    task.stopped.set()
+    task.join_consumers()
+
+
+def send(task: main.ScheduledTask, name: str, expression: str) -> None:
+    message = {"operation": "add_job", "task": {"exec_strategy": "cron", "job_params": {"name": name, "expression": expression}}}
+    task.rd.rd.xadd(TASK_STREAM, {"data": json.dumps(message).encode('utf-8')})
+
+
+def test_messages_of_same_job_handled_in_order(task, monkeypatch):
+    handled = {}
+    lock = threading.Lock()
+
+    def add_job(exec_strategy, job_params, redelivered=False):
+        time.sleep(random.random() / 100)
+        with lock:
+            handled.setdefault(job_params["name"], []).append(job_params["expression"])
+
+    monkeypatch.setattr(task, "add_job", add_job)
+    jobs = [f"job-{i}" for i in range(8)]
+    for index in range(10):
+        for name in jobs:
+            send(task, name, str(index))
+
+    task.start_workers()
+    task.reader = threading.Thread(target=task.consume, daemon=True)
+    task.reader.start()
+    deadline = time.time() + 10
+    while sum(map(len, handled.values())) < 80 and time.time() < deadline:
+        time.sleep(0.05)
+
+    assert handled == {name: [str(i) for i in range(10)] for name in jobs}
+    assert task.rd.rd.xpending(TASK_STREAM, TASK_STREAM_GROUP)["pending"] == 0
+
+
+def test_remove_idle_consumers(task, monkeypatch):
+    monkeypatch.setattr(main, "TASK_STREAM_CLAIM_IDLE", 0)
+    rd = task.rd.rd
+    send(task, "a", "0")
+    send(task, "b", "0")
+    # 已处理完所有消息后退出的旧进程
+    message_id = rd.xreadgroup(TASK_STREAM_GROUP, "host-1", {TASK_STREAM: ">"}, count=1)[0][1][0][0]
+    rd.xack(TASK_STREAM, TASK_STREAM_GROUP, message_id)
+    # 仍有未确认消息的消费者，需要等待认领
+    rd.xreadgroup(TASK_STREAM_GROUP, "host-2", {TASK_STREAM: ">"}, count=1)
+    rd.xreadgroup(TASK_STREAM_GROUP, task.consumer, {TASK_STREAM: ">"}, count=1)
+    time.sleep(0.01)
+
+    task.remove_idle_consumers()
+
+    names = sorted(i["name"].decode() for i in rd.xinfo_consumers(TASK_STREAM, TASK_STREAM_GROUP))
+    assert names == sorted(["host-2", task.consumer])
+
+
+def test_running_message_not_reclaimed(task, monkeypatch):
+    monkeypatch.setattr(main, "TASK_STREAM_CLAIM_IDLE", 10)
+    handled = []
+    running = threading.Event()
+
+    def add_job(exec_strategy, job_params, redelivered=False):
+        running.set()
+        # 执行时间超过认领空闲时间
+        time.sleep(0.3)
+        handled.append((job_params["name"], redelivered))
+
+    monkeypatch.setattr(task, "add_job", add_job)
+    send(task, "slow", "0")
+    task.start_workers()
+    # 代替消费者线程读取并分配消息
+    message_id, fields = task.rd.rd.xreadgroup(TASK_STREAM_GROUP, task.consumer, {TASK_STREAM: ">"}, count=1)[0][1][0]
+    task.dispatch(message_id, fields)
+    assert running.wait(5)
+    for _ in range(5):
+        time.sleep(0.05)
+        task.reclaim()
+    deadline = time.time() + 5
+    while task.rd.rd.xpending(TASK_STREAM, TASK_STREAM_GROUP)["pending"] and time.time() < deadline:
+        time.sleep(0.05)
+
+    assert handled == [("slow", False)]
+    assert task.rd.rd.xpending(TASK_STREAM, TASK_STREAM_GROUP)["pending"] == 0
+
+
+def test_reclaim_dead_consumer_and_failed_messages(task, monkeypatch):
+    monkeypatch.setattr(main, "TASK_STREAM_CLAIM_IDLE", 10)
+    rd = task.rd.rd
+    xpending_range = rd.xpending_range
+    deliveries = {}
+
+    def pending_with_deliveries(*args, **kwargs):
+        # fakeredis 不记录投递次数
+        return [{**i, "times_delivered": deliveries.get(i["message_id"], 1)} for i in xpending_range(*args, **kwargs)]
+
+    monkeypatch.setattr(rd, "xpending_range", pending_with_deliveries)
+    handled = []
+    monkeypatch.setattr(task, "add_job", lambda exec_strategy, job_params, redelivered=False: handled.append(
+        (job_params["name"], redelivered)
+    ))
+    for name in ("dead", "failed", "poison"):
+        send(task, name, "0")
+    rd.xreadgroup(TASK_STREAM_GROUP, "host-1", {TASK_STREAM: ">"}, count=1)
+    # 本消费者处理失败、已不在工作线程中的消息
+    rd.xreadgroup(TASK_STREAM_GROUP, task.consumer, {TASK_STREAM: ">"}, count=1)
+    poison = rd.xreadgroup(TASK_STREAM_GROUP, "host-1", {TASK_STREAM: ">"}, count=1)[0][1][0][0]
+    deliveries[poison] = main.TASK_STREAM_MAX_DELIVERIES
+    time.sleep(0.05)
+
+    task.start_workers()
+    task.reclaim()
+    deadline = time.time() + 5
+    while rd.xpending(TASK_STREAM, TASK_STREAM_GROUP)["pending"] and time.time() < deadline:
+        time.sleep(0.05)
+
+    assert sorted(handled) == [("dead", True), ("failed", True)]
+    assert rd.xpending(TASK_STREAM, TASK_STREAM_GROUP)["pending"] == 0
@@ -0,0 +1,83 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/19 01:40
+# @File           : test_erp_sync.py
+# @IDE            : PyCharm
+# @desc           : ERP 与 SRM 表按水位增量同步
+
+import datetime
+
+import pytest
+
+from application.settings import ERP_SYNC_INITIAL_START, ERP_SYNC_OVERLAP, ERP_SYNC_PAGE_SIZE, ERP_SYNC_WATERMARK
+from core import sync_watermark
+from tasks.erp import main as erp
+from tasks.srm import main as srm
+from tests.fake_sync import FakeSyncServer
+
+
+@pytest.fixture(params=[erp, srm], ids=["erp", "srm"])
+def module(request):
+    return request.param
+
+
+@pytest.fixture
+def sync(mongo, monkeypatch, module):
+    monkeypatch.setattr(sync_watermark, "get_database", lambda: mongo)
+
+    def start(responses: list = None) -> FakeSyncServer:
+        server = FakeSyncServer(responses)
+        monkeypatch.setattr(module, "API_URL", server.url)
+        return server
+
+    return start
+
+
+def start_dates(server: FakeSyncServer) -> list[str]:
+    return [params["start_date"][0] for _, params in server.requests]
+
+
+def test_watermark_advances_after_success(sync, mongo, module):
+    task = module.T100TableRsync("ima_t", "erp/sync")
+    with sync() as server:
+        before = datetime.datetime.now().replace(microsecond=0)
+        assert task.main()["retval"] == "任務成功"
+        assert task.main()["retval"] == "任務成功"
+
+    path, params = server.requests[0]
+    assert path == "/erp/sync"
+    assert params["api_code"] == ["ima_t"]
+    assert params["page_size"] == [str(ERP_SYNC_PAGE_SIZE)]
+
+    watermark = mongo.db[ERP_SYNC_WATERMARK].find_one({"_id": "erp/sync:ima_t"})["watermark"]
+    assert datetime.datetime.strptime(watermark, "%Y%m%d%H%M%S") >= before
+    first, second = start_dates(server)
+    assert first == ERP_SYNC_INITIAL_START
+    # 第二次從第一次的開始時間向前重疊 ERP_SYNC_OVERLAP 秒
+    assert datetime.datetime.strptime(second, "%Y%m%d%H%M%S") >= before - datetime.timedelta(seconds=ERP_SYNC_OVERLAP)
+    assert second < watermark
+
+
+@pytest.mark.parametrize("response", [(200, {"code": 500, "message": "ERP 連線失敗"}), (502, {})])
+def test_failed_sync_keeps_watermark(sync, mongo, module, response):
+    task = module.T100TableRsync("ima_t", "erp/sync")
+    with sync([response]) as server:
+        assert task.main()["retval"] == "任務失敗"
+        assert mongo.db[ERP_SYNC_WATERMARK].count_documents({}) == 0
+        # 失敗後從原水位重新同步
+        assert task.main()["retval"] == "任務成功"
+
+    assert start_dates(server) == [ERP_SYNC_INITIAL_START, ERP_SYNC_INITIAL_START]
+
+
+def test_watermark_per_table(sync, mongo, module):
+    with sync() as server:
+        module.T100TableRsync("ima_t", "erp/sync").main()
+        module.T100TableRsync("imaa_t", "erp/sync").main()
+        module.T100TableRsync("ima_t", "erp/sync").main()
+
+    first, other, again = start_dates(server)
+    assert first == other == ERP_SYNC_INITIAL_START
+    assert again != ERP_SYNC_INITIAL_START
+    assert mongo.db[ERP_SYNC_WATERMARK].count_documents({}) == 2
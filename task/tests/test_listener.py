@@ -0,0 +1,41 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 21:45
+# @File           : test_listener.py
+# @IDE            : PyCharm
+# @desc           : 任务执行记录批量写入
+
+import datetime
+
+from application.settings import SCHEDULER_TASK_RECORD
+from core.listener import JobRunRecorder
+
+
+def test_unencodable_record_is_dropped_alone(mongo):
+    recorder = JobRunRecorder(flush_interval=60)
+    recorder.start()
+    run_time = datetime.datetime.now()
+    recorder.put("good", run_time, {"end_time": "2026-10-18 21:45:00"})
+    recorder.put("bad", run_time, {"exception": object()})
+    recorder.flush()
+
+    assert recorder.thread.is_alive()
+    assert recorder.failed == 1
+    assert [i["job_id"] for i in mongo.db[SCHEDULER_TASK_RECORD].find()] == ["good"]
+
+    recorder.put("next", run_time, {"end_time": "2026-10-18 21:46:00"})
+    recorder.stop()
+    assert mongo.db[SCHEDULER_TASK_RECORD].count_documents({}) == 2
+
+
+def test_merge_start_and_finish(mongo):
+    recorder = JobRunRecorder(flush_interval=60)
+    recorder.start()
+    run_time = datetime.datetime.now()
+    recorder.put("job", run_time, {"end_time": "done", "retval": "1"})
+    recorder.put("job", run_time, {"start_time": "start", "end_time": "", "retval": "0"}, start=True)
+    recorder.stop()
+
+    record = mongo.db[SCHEDULER_TASK_RECORD].find_one({"job_id": "job"})
+    assert (record["start_time"], record["end_time"], record["retval"]) == ("start", "done", "1")
@@ -0,0 +1,54 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+# @version        : 1.0
+# @Create Time    : 2026/10/18 21:30
+# @File           : test_scheduler_shutdown.py
+# @IDE            : PyCharm
+# @desc           : 关闭调度器时等待执行中的任务完成并写入执行记录
+
+import asyncio
+import datetime
+import threading
+import time
+
+import pytest
+
+from application.settings import SCHEDULER_TASK_RECORD
+from core.scheduler import Scheduler
+
+finished = []
+started = threading.Event()
+
+
+async def coroutine_job():
+    started.set()
+    await asyncio.sleep(0.5)
+    finished.append("coroutine")
+    return {"retval": "coroutine"}
+
+
+def thread_job():
+    started.set()
+    time.sleep(0.5)
+    finished.append("thread")
+    return {"retval": "thread"}
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("func, executor", [(coroutine_job, "asyncio"), (thread_job, "default")])
+async def test_shutdown_waits_for_running_jobs(mongo, func, executor):
+    finished.clear()
+    started.clear()
+    scheduler = Scheduler()
+    scheduler.start()
+    scheduler.scheduler.add_job(func, "date", run_date=datetime.datetime.now(), id="job", executor=executor)
+    while not started.is_set():
+        await asyncio.sleep(0.01)
+
+    await scheduler.shutdown()
+
+    assert finished == [func.__name__.split("_")[0]]
+    assert not scheduler.scheduler.running
+    records = list(mongo.db[SCHEDULER_TASK_RECORD].find({"job_id": "job"}))
+    assert len(records) == 1
+    assert records[0]["end_time"]